@@ -0,0 +1,603 @@
+#!/usr/bin/env python3
+"""
+📈 PRUEBA DE CARGA: latencia y throughput de /shortestpath
+
+attack_4_dos_tsp.py envía una petición a la vez y mide su duración. Este
+script mide el servicio bajo concurrencia, que es lo que importa para
+dimensionar el despliegue:
+
+- Clientes asyncio que envían peticiones a una tasa fija (constante o
+  Poisson), sin esperar a que terminen las anteriores
+- Mezcla de viajes por número de ubicaciones, p. ej. 70% de 5, 30% de 10
+- Percentiles p50/p95/p99 y throughput, con histogramas HDR si `hdrh`
+  está instalado
+- Reportes JSON/CSV que se pueden comparar entre builds
+- Desglose por etapa del servidor (header Server-Timing) con --server-timing
+- Un servidor simulado local para probar el propio script
+
+La latencia se mide desde el momento en que la petición debía salir, no
+desde que salió: si el servidor (o el límite de concurrencia) retrasa a
+los clientes, ese retraso aparece en los percentiles.
+
+Uso:
+    python3 load_test.py run --rate 20 --duration 60 --mix 5:0.7,10:0.3 \\
+        --label main --json main.json --csv main.csv
+    python3 load_test.py run --stub --rate 50 --duration 10
+    python3 load_test.py stub --port 8001
+    python3 load_test.py compare main.json rama.json
+
+⚠️  IMPORTANTE: Solo usar contra despliegues propios
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import math
+import os
+import random
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import aiohttp
+    from aiohttp import web
+except ImportError:
+    sys.exit("❌ Falta aiohttp: pip install aiohttp")
+
+try:
+    from hdrh.histogram import HdrHistogram
+except ImportError:
+    HdrHistogram = None
+
+# Configuración
+BASE_URL = "http://localhost:8000"
+
+# Zona de Bogotá cubierta por el grafo de calles
+LAT_RANGE = (4.57, 4.75)
+LNG_RANGE = (-74.16, -74.04)
+
+# Rango de latencias registrables en el histograma: 1 µs a 2 min
+HISTOGRAM_MAX_US = 120_000_000
+HISTOGRAM_DIGITS = 3
+
+# Header con el que se pide al backend el desglose de tiempos
+TIMING_REQUEST_HEADER = "X-Server-Timing"
+
+PERCENTILES = (50, 95, 99)
+CSV_FIELDS = [
+    "label", "locations", "requests", "ok", "errors", "throughput_rps",
+    "p50_ms", "p95_ms", "p99_ms", "max_ms", "mean_ms",
+    "timeouts", "p95_with_timeouts_ms", "p99_with_timeouts_ms",
+]
+
+
+# ---------------------------------------------------------------------------
+# Peticiones
+# ---------------------------------------------------------------------------
+
+def parse_mix(text: str) -> List[Tuple[int, float]]:
+    """Convierte "5:0.7,10:0.3" en [(5, 0.7), (10, 0.3)] con pesos normalizados"""
+    mix = []
+    for item in text.split(","):
+        count, _, weight = item.partition(":")
+        mix.append((int(count), float(weight or 1)))
+    total = sum(weight for _, weight in mix)
+    if not mix or total <= 0 or any(count < 2 or weight < 0 for count, weight in mix):
+        raise ValueError(f"Mezcla inválida: {text}")
+    return [(count, weight / total) for count, weight in mix]
+
+
+def generate_locations(count: int, rng: random.Random) -> List[Dict]:
+    """Genera ubicaciones aleatorias en Bogotá con el formato de /shortestpath"""
+    locations = []
+    for i in range(count):
+        lat = rng.uniform(*LAT_RANGE)
+        lng = rng.uniform(*LNG_RANGE)
+        locations.append({
+            "address": f"Location {i+1}",
+            "address_complement": "",
+            "coordinates": {"lat": lat, "lng": lng, "id": i},
+            "place_id": f"load-{i}",
+            "id": i,
+        })
+    return locations
+
+
+def build_payload(count: int, rng: random.Random, index: int) -> Dict:
+    return {
+        "title": f"Load test {index}",
+        "back_to_start": False,
+        "locations": generate_locations(count, rng),
+    }
+
+
+async def get_auth_token(session: aiohttp.ClientSession, base_url: str) -> str:
+    """Crea un usuario de prueba y devuelve su token (sin preguntar, a diferencia de attack_4)"""
+    timestamp = int(time.time() * 1000)
+    async with session.post(f"{base_url}/signup", json={
+        "name": "Load Test",
+        "username": f"load{timestamp}",
+        "email": f"load{timestamp}@test.com",
+        "password": "LoadPass123",
+    }) as response:
+        body = await response.json(content_type=None)
+        if response.status != 200 or not body.get("token"):
+            raise RuntimeError(f"No se pudo crear el usuario de prueba: {response.status} {body}")
+        return body["token"]
+
+
+# ---------------------------------------------------------------------------
+# Métricas
+# ---------------------------------------------------------------------------
+
+class LatencyRecorder:
+    """Latencias en ms. Usa un histograma HDR (memoria constante, precisión
+    de 3 cifras) si `hdrh` está instalado, o la lista de valores si no."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = HdrHistogram(1, HISTOGRAM_MAX_US, HISTOGRAM_DIGITS) if HdrHistogram else None
+        self.values: List[float] = []
+
+    def record(self, ms: float):
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+        if self.histogram is not None:
+            self.histogram.record_value(min(max(int(ms * 1000), 1), HISTOGRAM_MAX_US))
+        else:
+            self.values.append(ms)
+
+    def merge(self, other: "LatencyRecorder"):
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        if self.histogram is not None:
+            self.histogram.add(other.histogram)
+        else:
+            self.values.extend(other.values)
+
+    def percentile(self, p: float) -> float:
+        if self.count == 0:
+            return 0.0
+        if self.histogram is not None:
+            return self.histogram.get_value_at_percentile(p) / 1000
+        ordered = sorted(self.values)
+        # rango más cercano, igual que HdrHistogram
+        return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class Bucket:
+    """Resultados de las peticiones con un mismo número de ubicaciones"""
+
+    def __init__(self):
+        self.latency = LatencyRecorder()
+        # respuestas correctas y timeouts: los timeouts son las peticiones
+        # más lentas, y sin ellos una corrida saturada parece más rápida
+        self.with_timeouts = LatencyRecorder()
+        self.status: Counter = Counter()
+        # etapa del servidor -> sus duraciones, de Server-Timing
+        self.stages: Dict[str, LatencyRecorder] = {}
+
+    def record(self, status: str, ms: float, stages: Optional[Dict[str, float]] = None):
+        self.status[status] += 1
+        # solo las respuestas correctas cuentan para los percentiles; un
+        # 503 inmediato haría ver al servidor más rápido de lo que es
+        if status == "200":
+            self.latency.record(ms)
+            for name, stage_ms in (stages or {}).items():
+                self.stages.setdefault(name, LatencyRecorder()).record(stage_ms)
+        if status in ("200", "timeout"):
+            self.with_timeouts.record(ms)
+
+    def merge(self, other: "Bucket"):
+        self.status.update(other.status)
+        self.latency.merge(other.latency)
+        self.with_timeouts.merge(other.with_timeouts)
+        for name, recorder in other.stages.items():
+            self.stages.setdefault(name, LatencyRecorder()).merge(recorder)
+
+    def report(self, window: float) -> Dict:
+        requests = sum(self.status.values())
+        ok = self.status.get("200", 0)
+        return {
+            "requests": requests,
+            "ok": ok,
+            "errors": requests - ok,
+            "throughput_rps": round(ok / window, 3) if window > 0 else 0.0,
+            "latency_ms": {
+                **{f"p{p}": round(self.latency.percentile(p), 3) for p in PERCENTILES},
+                "max": round(self.latency.max, 3),
+                "mean": round(self.latency.mean(), 3),
+            },
+            "latency_with_timeouts_ms": {
+                **{f"p{p}": round(self.with_timeouts.percentile(p), 3) for p in PERCENTILES},
+                "max": round(self.with_timeouts.max, 3),
+            },
+            "status": dict(sorted(self.status.items())),
+            "stages_ms": {
+                name: {
+                    **{f"p{p}": round(recorder.percentile(p), 3) for p in PERCENTILES},
+                    "mean": round(recorder.mean(), 3),
+                }
+                for name, recorder in sorted(self.stages.items())
+            },
+        }
+
+
+# ---------------------------------------------------------------------------
+# Generador de carga
+# ---------------------------------------------------------------------------
+
+def arrival_times(rate: float, duration: float, poisson: bool, rng: random.Random) -> List[float]:
+    """Segundos, desde el inicio, en que sale cada petición"""
+    times = []
+    t = 0.0
+    while True:
+        t += rng.expovariate(rate) if poisson else 1 / rate
+        if t >= duration:
+            return times
+        times.append(t)
+
+
+def parse_server_timing(value: str) -> Dict[str, float]:
+    """Convierte "snap;dur=1.5, total;dur=4" en {"snap": 1.5, "total": 4.0}"""
+    stages = {}
+    for metric in value.split(","):
+        name, *params = [part.strip() for part in metric.split(";")]
+        for param in params:
+            key, _, duration = param.partition("=")
+            if name and key == "dur":
+                try:
+                    stages[name] = float(duration)
+                except ValueError:
+                    pass
+    return stages
+
+
+async def send(
+    session: aiohttp.ClientSession,
+    url: str,
+    headers: Dict[str, str],
+    payload: Dict,
+    limit: asyncio.Semaphore,
+    timeout: float,
+) -> Tuple[str, Dict[str, float]]:
+    """Envía una petición y devuelve su estado (el código HTTP, "timeout" o
+    "error") y las etapas de su header Server-Timing, si lo trae"""
+    async with limit:
+        try:
+            async with session.post(
+                url,
+                json=payload,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=timeout),
+            ) as response:
+                await response.read()
+                return str(response.status), parse_server_timing(response.headers.get("Server-Timing", ""))
+        except asyncio.TimeoutError:
+            return "timeout", {}
+        except aiohttp.ClientError:
+            return "error", {}
+
+
+async def run_load(args: argparse.Namespace, base_url: str) -> Dict:
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    counts = [count for count, _ in mix]
+    weights = [weight for _, weight in mix]
+    schedule = arrival_times(args.rate, args.warmup + args.duration, args.arrivals == "poisson", rng)
+    # los viajes se generan antes de empezar para no medir su construcción
+    plan = []
+    for index, at in enumerate(schedule):
+        count = rng.choices(counts, weights)[0]
+        plan.append((at, count, build_payload(count, rng, index)))
+
+    url = f"{base_url}/shortestpath"
+    if args.format == "polyline":
+        url += "?format=polyline"
+    buckets: Dict[int, Bucket] = {count: Bucket() for count in counts}
+    limit = asyncio.Semaphore(args.concurrency)
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        token = args.token or os.environ.get("TSP_TOKEN") or await get_auth_token(session, base_url)
+        headers = {"Authorization": f"Bearer {token}"}
+        if args.server_timing:
+            headers[TIMING_REQUEST_HEADER] = "1"
+
+        async def one(at: float, count: int, payload: Dict):
+            status, stages = await send(session, url, headers, payload, limit, args.timeout)
+            if at >= args.warmup:
+                latency_ms = (time.perf_counter() - (start + at)) * 1000
+                buckets[count].record(status, latency_ms, stages)
+
+        print(f"🚀 {len(plan)} peticiones a {url} ({args.rate}/s, {args.arrivals}, "
+              f"máx. {args.concurrency} en curso, {args.warmup}s de calentamiento)")
+        start = time.perf_counter()
+        tasks = []
+        for at, count, payload in plan:
+            delay = start + at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(one(at, count, payload)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    # la ventana medida termina cuando acaba la última respuesta
+    window = max(elapsed - args.warmup, 1e-9)
+    total = Bucket()
+    for bucket in buckets.values():
+        total.merge(bucket)
+
+    return {
+        "label": args.label,
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "histogram": "hdr" if HdrHistogram else "exact",
+        "config": {
+            "url": url,
+            "rate": args.rate,
+            "arrivals": args.arrivals,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "mix": args.mix,
+            "format": args.format,
+            "seed": args.seed,
+            "server_timing": args.server_timing,
+        },
+        "window_seconds": round(window, 3),
+        "summary": total.report(window),
+        "by_locations": {str(count): bucket.report(window) for count, bucket in sorted(buckets.items())},
+    }
+
+
+# ---------------------------------------------------------------------------
+# Reportes
+# ---------------------------------------------------------------------------
+
+def report_rows(report: Dict) -> List[Dict]:
+    rows = []
+    groups = [("all", report["summary"])] + list(report["by_locations"].items())
+    for locations, stats in groups:
+        rows.append({
+            "label": report["label"],
+            "locations": locations,
+            "requests": stats["requests"],
+            "ok": stats["ok"],
+            "errors": stats["errors"],
+            "throughput_rps": stats["throughput_rps"],
+            **{f"{key}_ms": value for key, value in stats["latency_ms"].items()},
+            "timeouts": stats["status"].get("timeout", 0),
+            # los reportes anteriores no tienen la latencia con timeouts
+            "p95_with_timeouts_ms": stats.get("latency_with_timeouts_ms", stats["latency_ms"])["p95"],
+            "p99_with_timeouts_ms": stats.get("latency_with_timeouts_ms", stats["latency_ms"])["p99"],
+        })
+    return rows
+
+
+def write_json(report: Dict, path: str):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def write_csv(report: Dict, path: str):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        writer.writerows(report_rows(report))
+
+
+def print_report(report: Dict):
+    print("\n" + "="*115)
+    print(f"📊 RESULTADOS: {report['label']} ({report['window_seconds']}s medidos, histograma {report['histogram']})")
+    print("="*115)
+    print(f"{'Ubicaciones':<12} | {'Peticiones':>10} | {'Errores':>8} | {'Timeouts':>8} | {'req/s':>8} | "
+          f"{'p50 ms':>9} | {'p95 ms':>9} | {'p99 ms':>9} | {'p99+t/o ms':>10}")
+    print("-"*115)
+    for row in report_rows(report):
+        print(f"{row['locations']:<12} | {row['requests']:>10} | {row['errors']:>8} | {row['timeouts']:>8} | "
+              f"{row['throughput_rps']:>8.2f} | {row['p50_ms']:>9.1f} | {row['p95_ms']:>9.1f} | {row['p99_ms']:>9.1f} | "
+              f"{row['p99_with_timeouts_ms']:>10.1f}")
+    print("-"*115)
+    print("p99+t/o: p99 de las respuestas correctas y los timeouts, que cuentan con su tiempo de espera")
+    print(f"Estados: {report['summary']['status']}")
+
+    stages = report["summary"]["stages_ms"]
+    if stages:
+        print(f"\n{'Etapa del servidor':<20} | {'media ms':>9} | {'p50 ms':>9} | {'p95 ms':>9} | {'p99 ms':>9}")
+        print("-"*68)
+        for name, stats in stages.items():
+            print(f"{name:<20} | {stats['mean']:>9.2f} | {stats['p50']:>9.2f} | {stats['p95']:>9.2f} | {stats['p99']:>9.2f}")
+
+
+def compare_reports(base: Dict, new: Dict):
+    """Imprime el cambio de cada métrica entre dos reportes JSON"""
+    print(f"\n📊 {base['label']} → {new['label']}")
+    print(f"{'Ubicaciones':<12} | {'Métrica':<20} | {'Antes':>10} | {'Después':>10} | {'Cambio':>8}")
+    print("-"*71)
+    base_rows = {row["locations"]: row for row in report_rows(base)}
+    for row in report_rows(new):
+        before = base_rows.get(row["locations"])
+        if before is None:
+            continue
+        for metric in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "p99_with_timeouts_ms", "timeouts", "errors"):
+            old, current = before[metric], row[metric]
+            change = f"{(current - old) / old * 100:+.1f}%" if old else "-"
+            print(f"{row['locations']:<12} | {metric:<20} | {old:>10} | {current:>10} | {change:>8}")
+
+
+# ---------------------------------------------------------------------------
+# Servidor simulado
+# ---------------------------------------------------------------------------
+
+def create_stub_app(workers: int, queue: int, base_ms: float, per_location_ms: float) -> web.Application:
+    """Imita la API: /signup devuelve un token y /shortestpath tarda según el
+    número de ubicaciones, con `workers` cálculos a la vez y hasta `queue`
+    en espera; el resto recibe 503 con Retry-After, como el backend."""
+    compute = asyncio.Semaphore(workers)
+    waiting = 0
+
+    async def signup(request: web.Request) -> web.Response:
+        body = await request.json()
+        return web.json_response({"message": "User created", "token": "stub-token", "username": body.get("username")})
+
+    async def shortestpath(request: web.Request) -> web.Response:
+        nonlocal waiting
+        arrived = time.perf_counter()
+        if request.headers.get("Authorization") != "Bearer stub-token":
+            return web.json_response({"message": "Invalid Token"}, status=401)
+        trip = await request.json()
+        locations = trip.get("locations", [])
+        if not 2 <= len(locations) <= 200:
+            return web.json_response({"message": "Between 2 and 200 locations are required"}, status=400)
+        if waiting >= queue:
+            return web.json_response({"message": "Server is busy, try again later"}, status=503,
+                                     headers={"Retry-After": "1"})
+        waiting += 1
+        try:
+            async with compute:
+                started = time.perf_counter()
+                queued_ms = (started - arrived) * 1000
+                await asyncio.sleep((base_ms + per_location_ms * len(locations)) / 1000)
+                solve_ms = (time.perf_counter() - started) * 1000
+        finally:
+            waiting -= 1
+        path = [location["coordinates"] for location in locations]
+        headers = {}
+        if TIMING_REQUEST_HEADER in request.headers:
+            total_ms = (time.perf_counter() - arrived) * 1000
+            headers["Server-Timing"] = (f"compute_queue;dur={queued_ms:.3f}, held_karp;dur={solve_ms:.3f}, "
+                                        f"total;dur={total_ms:.3f}")
+        return web.json_response({"title": trip.get("title"), "path": path, "distance": 1000.0 * len(path)},
+                                 headers=headers)
+
+    app = web.Application()
+    app.router.add_post("/signup", signup)
+    app.router.add_post("/shortestpath", shortestpath)
+    return app
+
+
+async def start_stub(args: argparse.Namespace, port: int) -> Tuple[web.AppRunner, str]:
+    runner = web.AppRunner(create_stub_app(args.stub_workers, args.stub_queue, args.stub_base_ms, args.stub_per_location_ms))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    # con el puerto 0 el sistema asigna uno libre
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+async def serve_stub(args: argparse.Namespace):
+    runner, url = await start_stub(args, args.port)
+    print(f"🧪 Servidor simulado en {url} (Ctrl+C para salir)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def run_command(args: argparse.Namespace) -> Dict:
+    runner = None
+    base_url = args.base_url
+    if args.stub:
+        runner, base_url = await start_stub(args, 0)
+        print(f"🧪 Usando servidor simulado en {base_url}")
+    try:
+        return await run_load(args, base_url)
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def add_stub_options(parser: argparse.ArgumentParser):
+    parser.add_argument("--stub-workers", type=int, default=4, help="cálculos simultáneos del servidor simulado")
+    parser.add_argument("--stub-queue", type=int, default=64, help="cálculos en espera antes de responder 503")
+    parser.add_argument("--stub-base-ms", type=float, default=20.0, help="tiempo fijo por viaje")
+    parser.add_argument("--stub-per-location-ms", type=float, default=2.0, help="tiempo adicional por ubicación")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Prueba de carga de /shortestpath")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="genera carga y reporta latencias")
+    run.add_argument("--base-url", default=BASE_URL)
+    run.add_argument("--token", help="token JWT; por defecto TSP_TOKEN o un usuario nuevo")
+    run.add_argument("--rate", type=float, default=10.0, help="peticiones por segundo")
+    run.add_argument("--duration", type=float, default=30.0, help="segundos medidos")
+    run.add_argument("--warmup", type=float, default=5.0, help="segundos iniciales que no se miden")
+    run.add_argument("--arrivals", choices=["constant", "poisson"], default="poisson")
+    run.add_argument("--concurrency", type=int, default=256, help="máximo de peticiones en curso")
+    run.add_argument("--mix", default="5:0.6,10:0.3,20:0.1", help="ubicaciones:peso separados por comas")
+    run.add_argument("--format", choices=["json", "polyline"], default="json", help="formato de la ruta pedida")
+    run.add_argument("--server-timing", action="store_true",
+                     help="pide el desglose por etapa (Server-Timing) y lo incluye en el reporte")
+    run.add_argument("--timeout", type=float, default=30.0, help="segundos por petición")
+    run.add_argument("--seed", type=int, default=1)
+    run.add_argument("--label", default="run", help="nombre del build en los reportes")
+    run.add_argument("--json", help="archivo del reporte JSON")
+    run.add_argument("--csv", help="archivo del reporte CSV")
+    run.add_argument("--stub", action="store_true", help="prueba contra un servidor simulado local")
+    add_stub_options(run)
+
+    stub = commands.add_parser("stub", help="levanta solo el servidor simulado")
+    stub.add_argument("--port", type=int, default=8001)
+    add_stub_options(stub)
+
+    compare = commands.add_parser("compare", help="compara dos reportes JSON")
+    compare.add_argument("base")
+    compare.add_argument("new")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        if args.rate <= 0 or args.duration <= 0 or args.concurrency < 1:
+            parser.error("--rate, --duration y --concurrency deben ser positivos")
+        try:
+            parse_mix(args.mix)
+        except ValueError as e:
+            parser.error(str(e))
+    return args
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    if args.command == "compare":
+        with open(args.base) as f_base, open(args.new) as f_new:
+            compare_reports(json.load(f_base), json.load(f_new))
+        return
+    if args.command == "stub":
+        try:
+            asyncio.run(serve_stub(args))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if HdrHistogram is None:
+        print("ℹ️  hdrh no está instalado; los percentiles se calculan con todas las muestras")
+    report = asyncio.run(run_command(args))
+    print_report(report)
+    if args.json:
+        write_json(report, args.json)
+        print(f"📝 Reporte JSON: {args.json}")
+    if args.csv:
+        write_csv(report, args.csv)
+        print(f"📝 Reporte CSV: {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
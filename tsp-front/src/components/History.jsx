@@ -16,11 +16,11 @@ import { FaSortAmountDown } from "react-icons/fa";
 const History = () => {
     const { local, endpoint, url_paths, message, setMessage, setLoading, repeatTrack } = useContext(GlobalContext);
     const [ trips, setTrips ] = useState([]);
-    const [ page, setPage ] = useState(0);
+    const [ cursor, setCursor ] = useState(null);
     const [ loadMore, setLoadMore ] = useState(true);
     const [ details, setDetails] = useState(false);
 
-    const getTrips = async (page) => {
+    const getTrips = async (cursor) => {
         setLoading(true);
         const config = {
             headers: {
@@ -28,7 +28,8 @@ const History = () => {
             }
         };
         
-        const { status, response} = await get(endpoint + url_paths.history + `${page}`, config);
+        const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+        const { status, response} = await get(endpoint + url_paths.history + query, config);
         if(status != 200) {
             setMessage(response.message);
             setTimeout(() => {
@@ -36,9 +37,8 @@ const History = () => {
             }, 3000);
         } else {
             let data = await response.data;
-            if(data.length == 0) {
-                setLoadMore(false);
-            }
+            setLoadMore(response.next != null);
+            setCursor(response.next);
             data = trips.concat(data);
 
             setTrips(data);
@@ -48,13 +48,12 @@ const History = () => {
 
     const onClickLoadMore = (e) => {
         e.preventDefault();
-        getTrips(page+1);
-        setPage(page+1);
+        getTrips(cursor);
     };
     
     useEffect(() => {
         if(local?.token) {
-            getTrips(page);
+            getTrips(null);
         }
         
     }, [local]);
@@ -2,19 +2,36 @@ import { useContext } from "react";
 import { GlobalContext } from "../context/GlobalContext";
 import { HeaderText } from "./HeaderText";
 import { FaRedo, FaTimes } from "react-icons/fa";
+import { get } from "../utilities/get";
 
 const HistoryTripDetails = ({ details, setDetails }) => {
     const locations = [...details.locations];
     locations.pop();
 
-    const { setRepeatTrack } = useContext(GlobalContext);
+    const { local, endpoint, url_paths, setRepeatTrack, setMessage, setLoading } = useContext(GlobalContext);
 
     const onClickClose = () => {
         setDetails(false);
     };
 
-    const onClickRepeatTrip = () => {
-        setRepeatTrack(details.path);
+    // the history only lists summaries; the route is loaded when it is needed
+    const onClickRepeatTrip = async () => {
+        setLoading(true);
+        const config = {
+            headers: {
+                "Authorization": `Bearer ${local.token}`,
+            }
+        };
+        const { status, response } = await get(endpoint + url_paths.history + `/trip/${details.id}`, config);
+        setLoading(false);
+        if(status != 200) {
+            setMessage(response.message);
+            setTimeout(() => {
+                setMessage(null);
+            }, 3000);
+            return;
+        }
+        setRepeatTrack(response.data.path);
     };
 
     return (
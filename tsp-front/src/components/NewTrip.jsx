@@ -6,10 +6,14 @@ import { ListLocations } from "./ListLocations";
 import { saveToLocal } from "../utilities/saveToLocal";
 import { Message } from "./Message";
 import { post } from "../utilities/post";
+import { decodePolyline } from "../utilities/polyline";
+import { parseServerTiming } from "../utilities/serverTiming";
 import { TripTrack } from "./TripTrack";
 import { useEffect } from 'react';
 import { FaPen, FaCheck } from "react-icons/fa";
 
+const showServerTiming = import.meta.env.VITE_SERVER_TIMING === "true";
+
 const NewTrip = () => {
     const { tripPlanning, saveItem, local, message, setMessage, endpoint, url_paths, track, setTrack, setLoading } = useContext(GlobalContext);
 
@@ -17,14 +21,20 @@ const NewTrip = () => {
         setLoading(true);
         const config = {
             headers: {
-                "Authorization": `Bearer ${local.token}`
+                "Authorization": `Bearer ${local.token}`,
+                // asks the server for the time spent in each stage
+                ...(showServerTiming && { "X-Server-Timing": "1" })
             }
         };
         const data = {
             ...tripPlanning
         };
 
-        const { status, response } = await post(endpoint+url_paths.shortestpath, data, config);
+        // the route comes as an encoded polyline, much smaller than the coordinates
+        const { status, response, headers } = await post(endpoint+url_paths.shortestpath+"?format=polyline", data, config);
+        if (showServerTiming && headers?.["server-timing"]) {
+            console.table(parseServerTiming(headers["server-timing"]));
+        }
 
         if (status === 401) {
             setMessage(response.message);
@@ -35,8 +45,10 @@ const NewTrip = () => {
                 setMessage(null);
             }, 2000)
         } else if (status === 200 ) {
+            const { polyline, ...rest } = response;
             const newTrack = {
-                ...response,
+                ...rest,
+                path: decodePolyline(polyline),
             };
             setTrack(newTrack);
             const newLocal = {
@@ -30,7 +30,7 @@ const GlobalContextProvider = ( {children}) => {
         login: "/login",
         signup: "/signup",
         shortestpath: "/shortestpath",
-        history: "/history/",
+        history: "/history",
         user: "/user/",
     }
 
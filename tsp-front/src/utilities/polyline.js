@@ -0,0 +1,24 @@
+// Decodes an encoded polyline (five decimals) into [{ lat, lng }, ...]
+const decodePolyline = (polyline) => {
+    const points = [];
+    let index = 0, lat = 0, lng = 0;
+
+    const nextValue = () => {
+        let result = 0, shift = 0, byte;
+        do {
+            byte = polyline.charCodeAt(index++) - 63;
+            result |= (byte & 0x1f) << shift;
+            shift += 5;
+        } while (byte >= 0x20);
+        return (result & 1) ? ~(result >>> 1) : (result >>> 1);
+    };
+
+    while (index < polyline.length) {
+        lat += nextValue();
+        lng += nextValue();
+        points.push({ lat: lat / 1e5, lng: lng / 1e5 });
+    }
+    return points;
+};
+
+export { decodePolyline };
@@ -2,20 +2,22 @@
 import axios from "axios";
 
 const post = async (url, data, config = {}) => {
-    const { status, response } = await axios.post(url, data, config=config)
+    const { status, response, headers } = await axios.post(url, data, config=config)
         .then(response => {
             return ({
                 "status": response.status,
-                "response": response.data
+                "response": response.data,
+                "headers": response.headers
             })
         })
         .catch(error => {
             return ({
                 "status": error.response.status,
-                "response": error.response.data
+                "response": error.response.data,
+                "headers": error.response.headers
             })
         });
-    return { status, response };
+    return { status, response, headers };
 };
 
 export { post };
\ No newline at end of file
@@ -0,0 +1,19 @@
+// Parses a Server-Timing header into [{ stage, ms, runs }, ...]
+const parseServerTiming = (header) => {
+    return header.split(",").map(entry => {
+        const [stage, ...params] = entry.trim().split(";");
+        const timing = { stage, ms: null, runs: 1 };
+        params.forEach(param => {
+            const [key, value = ""] = param.trim().split("=");
+            if (key === "dur") {
+                timing.ms = Number(value);
+            } else if (key === "desc") {
+                const runs = value.replace(/"/g, "").match(/^x(\d+)$/);
+                if (runs) timing.runs = Number(runs[1]);
+            }
+        });
+        return timing;
+    });
+};
+
+export { parseServerTiming };
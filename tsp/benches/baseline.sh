@@ -0,0 +1,39 @@
+#!/bin/bash
+# Saves or compares criterion baselines. Criterion keeps them under
+# target/criterion, which is wiped by `cargo clean`, so saved baselines are
+# also copied to benches/baselines/<name>. Timings depend on the machine:
+# compare only against baselines recorded on the same host.
+#
+#   benches/baseline.sh save main          record the current tree as "main"
+#   benches/baseline.sh compare main       run and report changes against "main"
+set -e
+
+cd "$(dirname "$0")/.."
+command=$1
+name=${2:-main}
+shift $(( $# < 2 ? $# : 2 ))
+stored=benches/baselines/$name
+
+case "$command" in
+save)
+    cargo bench --bench routing --bench solver "$@" -- --save-baseline "$name"
+    rm -rf "$stored"
+    mkdir -p "$stored"
+    # only the baseline estimates, not the reports of every run
+    (cd target/criterion && find . -path "*/$name/*" -exec cp --parents {} "../../$stored" \;)
+    echo "Baseline $name stored in $stored"
+    ;;
+compare)
+    if [ ! -d "$stored" ]; then
+        echo "No baseline named $name in benches/baselines" >&2
+        exit 1
+    fi
+    mkdir -p target/criterion
+    cp -r "$stored"/. target/criterion/
+    cargo bench --bench routing --bench solver "$@" -- --baseline "$name"
+    ;;
+*)
+    echo "Usage: $0 save|compare [name] [cargo bench options]" >&2
+    exit 1
+    ;;
+esac
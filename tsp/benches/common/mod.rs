@@ -0,0 +1,89 @@
+// Shared setup of the benchmark suites. Every input is generated from a
+// fixed seed, so runs on different machines measure the same work.
+#![allow(dead_code)]
+
+use rand::{rngs::StdRng, Rng, SeedableRng};
+use std::{env, fs};
+use tsp::{
+    global::{Caches, Data},
+    utils::{
+        coordinate::Coordinate, synthetic::SyntheticNetwork, trip::Location, KdTree, SegmentIndex,
+        DEFAULT_CELL_SIZE,
+    },
+};
+
+pub const SEED: u64 = 7;
+
+/// Side of the square grid networks benchmarked, about 2.5k to 250k nodes.
+pub const GRID_SIDES: [usize; 3] = [50, 150, 500];
+
+/// Backend state over `net` without preprocessing or caches, so routing is
+/// measured rather than cache hits.
+pub fn data(net: &SyntheticNetwork) -> Data {
+    let map_id_to_coordinates = net.coordinate_table();
+    Data {
+        segments: SegmentIndex::build(&net.graph, &map_id_to_coordinates, DEFAULT_CELL_SIZE),
+        reverse: net.graph.reverse(),
+        graph: net.graph.clone(),
+        map_id_to_coordinates,
+        kd_tree: KdTree::new(net.coordinates.clone()),
+        ch: None,
+        landmarks: None,
+        caches: Caches::new(0),
+    }
+}
+
+/// `count` source and destination pairs drawn from `nodes`.
+pub fn query_pairs(nodes: usize, count: usize) -> Vec<(usize, usize)> {
+    let mut rng = StdRng::seed_from_u64(SEED);
+    (0..count)
+        .map(|_| (rng.gen_range(0..nodes), rng.gen_range(0..nodes)))
+        .collect()
+}
+
+/// Trip stops: `count` nodes of `net`, moved a few meters off the road.
+pub fn trip_locations(net: &SyntheticNetwork, count: usize) -> Vec<Location> {
+    let mut rng = StdRng::seed_from_u64(SEED);
+    (0..count)
+        .map(|id| {
+            let node = net.coordinates[rng.gen_range(0..net.coordinates.len())];
+            Location {
+                address: String::new(),
+                address_complement: String::new(),
+                coordinates: Coordinate {
+                    lat: node.lat + rng.gen_range(-2e-5..2e-5),
+                    lng: node.lng + rng.gen_range(-2e-5..2e-5),
+                    id,
+                },
+                place_id: String::new(),
+                id,
+            }
+        })
+        .collect()
+}
+
+/// Straight-line distance matrix between `count` points of a geometric
+/// network, the input shape of the tour solvers.
+pub fn distance_matrix(count: usize) -> Vec<Vec<f64>> {
+    let net = SyntheticNetwork::geometric(count, SEED);
+    let points = &net.coordinates;
+    points
+        .iter()
+        .map(|a| {
+            points
+                .iter()
+                .map(|b| ((a.lat - b.lat).powi(2) + (a.lng - b.lng).powi(2)).sqrt() * 111_320.0)
+                .collect()
+        })
+        .collect()
+}
+
+/// Text files of `net` in a scratch directory, returned as (nodes, edges).
+pub fn text_files(net: &SyntheticNetwork, name: &str) -> (String, String) {
+    let dir = env::temp_dir().join("tsp-bench");
+    fs::create_dir_all(&dir).unwrap();
+    let nodes = dir.join(format!("{}-nodes.txt", name)).to_string_lossy().to_string();
+    let edges = dir.join(format!("{}-edges.txt", name)).to_string_lossy().to_string();
+    net.write_text_files(&nodes, &edges).unwrap();
+    (nodes, edges)
+}
@@ -0,0 +1,104 @@
+//! Graph loading, point-to-point searches and nearest-node lookups on
+//! synthetic grid and geometric networks. Run with `cargo bench --bench
+//! routing`; see `benches/baseline.sh` to save and compare baselines.
+
+mod common;
+
+use common::{data, query_pairs, text_files, GRID_SIDES, SEED};
+use criterion::{black_box, criterion_group, criterion_main, BenchmarkId, Criterion, Throughput};
+use tsp::{
+    algo::shortest_paths::{astar, bidirectional_astar, bidirectional_dijkstra, dijkstra, harvesine_heuristic},
+    utils::{
+        create_adjacency_list_from_files, create_adjacency_list_from_snapshot,
+        create_id_to_coordinates_hashmap_from_file,
+        snapshot::{convert_text_files, Snapshot},
+        synthetic::SyntheticNetwork,
+        KdTree,
+    },
+};
+
+const QUERIES: usize = 20;
+
+fn graph_loading(c: &mut Criterion) {
+    let mut group = c.benchmark_group("load");
+    group.sample_size(10);
+    for side in GRID_SIDES {
+        let net = SyntheticNetwork::grid(side, side, SEED);
+        let name = format!("grid-{}", side);
+        let (nodes, edges) = text_files(&net, &name);
+        let snapshot = nodes.replace("-nodes.txt", ".snap");
+        convert_text_files(&nodes, &edges, &snapshot).unwrap();
+        group.throughput(Throughput::Elements(net.graph.num_edges() as u64));
+
+        group.bench_with_input(BenchmarkId::new("text", net.graph.num_nodes()), &(), |b, _| {
+            b.iter(|| {
+                let graph = create_adjacency_list_from_files(&nodes, &edges).unwrap();
+                let map = create_id_to_coordinates_hashmap_from_file(&nodes).unwrap();
+                (graph, map)
+            })
+        });
+        group.bench_with_input(BenchmarkId::new("snapshot", net.graph.num_nodes()), &(), |b, _| {
+            b.iter(|| create_adjacency_list_from_snapshot(&Snapshot::open(&snapshot).unwrap()).unwrap())
+        });
+    }
+    group.finish();
+}
+
+fn point_to_point(c: &mut Criterion) {
+    for (kind, net) in [
+        ("grid", SyntheticNetwork::grid(GRID_SIDES[1], GRID_SIDES[1], SEED)),
+        ("geometric", SyntheticNetwork::geometric(GRID_SIDES[1] * GRID_SIDES[1], SEED)),
+    ] {
+        let state = data(&net);
+        let (g, reverse, map) = (&state.graph, &state.reverse, &state.map_id_to_coordinates);
+        let pairs = query_pairs(g.num_nodes(), QUERIES);
+
+        let mut group = c.benchmark_group(format!("route/{}", kind));
+        group.sample_size(10);
+        group.throughput(Throughput::Elements(QUERIES as u64));
+        group.bench_function("dijkstra", |b| {
+            b.iter(|| pairs.iter().map(|&(s, t)| dijkstra(g, s, t).ok()).count())
+        });
+        group.bench_function("astar", |b| {
+            b.iter(|| pairs.iter().map(|&(s, t)| astar(g, map, s, t, &harvesine_heuristic).ok()).count())
+        });
+        group.bench_function("bidirectional_dijkstra", |b| {
+            b.iter(|| pairs.iter().map(|&(s, t)| bidirectional_dijkstra(g, reverse, s, t).ok()).count())
+        });
+        group.bench_function("bidirectional_astar", |b| {
+            b.iter(|| {
+                pairs
+                    .iter()
+                    .map(|&(s, t)| bidirectional_astar(g, reverse, map, s, t, &harvesine_heuristic).ok())
+                    .count()
+            })
+        });
+        group.finish();
+    }
+}
+
+fn nearest_nodes(c: &mut Criterion) {
+    let mut group = c.benchmark_group("kdtree");
+    for side in GRID_SIDES {
+        let net = SyntheticNetwork::grid(side, side, SEED);
+        let n = net.coordinates.len();
+        group.bench_with_input(BenchmarkId::new("build", n), &net.coordinates, |b, points| {
+            b.iter(|| KdTree::new(points.clone()))
+        });
+
+        let tree = KdTree::new(net.coordinates.clone());
+        let queries: Vec<_> = query_pairs(n, 100).into_iter().map(|(s, _)| net.coordinates[s]).collect();
+        group.bench_with_input(BenchmarkId::new("k_nearest_5", n), &queries, |b, queries| {
+            b.iter(|| {
+                queries
+                    .iter()
+                    .map(|q| black_box(tree.k_nearest(q.lat + 1e-4, q.lng - 1e-4, 5)).len())
+                    .sum::<usize>()
+            })
+        });
+    }
+    group.finish();
+}
+
+criterion_group!(benches, graph_loading, point_to_point, nearest_nodes);
+criterion_main!(benches);
@@ -0,0 +1,55 @@
+//! Tour solving by number of locations and whole-trip path building.
+//! Run with `cargo bench --bench solver`; see `benches/baseline.sh` to save and
+//! compare baselines.
+
+mod common;
+
+use common::{data, distance_matrix, trip_locations, SEED};
+use criterion::{criterion_group, criterion_main, BenchmarkId, Criterion};
+use std::time::Duration;
+use tsp::{
+    algo::{held_karp::held_karp, local_search::local_search_tour},
+    routes::shortestpath::build_path,
+    utils::synthetic::SyntheticNetwork,
+};
+
+fn exact_tours(c: &mut Criterion) {
+    let mut group = c.benchmark_group("held_karp");
+    group.sample_size(10);
+    for n in [8, 12, 16] {
+        let dists = distance_matrix(n);
+        group.bench_with_input(BenchmarkId::from_parameter(n), &dists, |b, dists| {
+            b.iter(|| held_karp(dists, usize::MAX).unwrap())
+        });
+    }
+    group.finish();
+}
+
+fn heuristic_tours(c: &mut Criterion) {
+    let mut group = c.benchmark_group("local_search");
+    group.sample_size(10);
+    for n in [50, 200] {
+        let dists = distance_matrix(n);
+        group.bench_with_input(BenchmarkId::from_parameter(n), &dists, |b, dists| {
+            b.iter(|| local_search_tour(dists, Duration::from_millis(50)))
+        });
+    }
+    group.finish();
+}
+
+fn trip_paths(c: &mut Criterion) {
+    let net = SyntheticNetwork::grid(150, 150, SEED);
+    let state = data(&net);
+    let mut group = c.benchmark_group("build_path");
+    group.sample_size(10);
+    for stops in [5, 20] {
+        let locations = trip_locations(&net, stops);
+        group.bench_with_input(BenchmarkId::from_parameter(stops), &locations, |b, locations| {
+            b.iter(|| build_path(locations, &state).unwrap())
+        });
+    }
+    group.finish();
+}
+
+criterion_group!(benches, exact_tours, heuristic_tours, trip_paths);
+criterion_main!(benches);
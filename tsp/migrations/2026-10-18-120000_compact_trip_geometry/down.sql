@@ -0,0 +1,9 @@
+-- This file should undo anything in `up.sql`
+-- The binary geometry can not be decoded here: trips stored that way keep
+-- their summary but lose the route.
+ALTER TABLE trips DROP CONSTRAINT trips_path_or_geometry;
+UPDATE trips
+SET path = json_build_object('title', title, 'path', '[]'::json, 'distance', distance, 'locations', '[]'::json)
+WHERE path IS NULL;
+ALTER TABLE trips ALTER COLUMN path SET NOT NULL;
+ALTER TABLE trips DROP COLUMN geometry;
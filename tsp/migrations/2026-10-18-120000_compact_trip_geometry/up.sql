@@ -0,0 +1,5 @@
+-- New trips keep their route in `geometry` (see utils::geometry) instead of
+-- the `path` JSON, which stays for trips stored before this migration.
+ALTER TABLE trips ADD COLUMN geometry BYTEA NULL;
+ALTER TABLE trips ALTER COLUMN path DROP NOT NULL;
+ALTER TABLE trips ADD CONSTRAINT trips_path_or_geometry CHECK (path IS NOT NULL OR geometry IS NOT NULL);
@@ -0,0 +1,2 @@
+-- This file should undo anything in `up.sql`
+DROP INDEX trips_user_created_on_id;
@@ -0,0 +1,2 @@
+-- Keyset pagination of a user's history, newest first
+CREATE INDEX trips_user_created_on_id ON trips (user_id, created_on DESC, id DESC);
@@ -0,0 +1,13 @@
+-- This file should undo anything in `up.sql`
+DO $$
+BEGIN
+    IF col_description('trips'::regclass, (
+        SELECT attnum FROM pg_attribute
+        WHERE attrelid = 'trips'::regclass AND attname = 'created_on'
+    )) = 'UTC' THEN
+        UPDATE trips
+        SET created_on = (created_on AT TIME ZONE 'UTC') AT TIME ZONE 'America/Bogota';
+        COMMENT ON COLUMN trips.created_on IS NULL;
+    END IF;
+END
+$$;
@@ -0,0 +1,17 @@
+-- trips.created_on holds UTC from now on: the trip writer stamps trips when
+-- they are queued, not with the database clock. Rows stored before this
+-- migration were stamped with `now` in the server's zone, Bogota's for the
+-- deployments so far; change the zone below if yours ran elsewhere. The
+-- column comment marks it as converted, so running this again is a no-op.
+DO $$
+BEGIN
+    IF col_description('trips'::regclass, (
+        SELECT attnum FROM pg_attribute
+        WHERE attrelid = 'trips'::regclass AND attname = 'created_on'
+    )) IS DISTINCT FROM 'UTC' THEN
+        UPDATE trips
+        SET created_on = (created_on AT TIME ZONE 'America/Bogota') AT TIME ZONE 'UTC';
+        COMMENT ON COLUMN trips.created_on IS 'UTC';
+    END IF;
+END
+$$;
@@ -0,0 +1,273 @@
+//! ALT: A* with landmarks and the triangle inequality.
+//!
+//! Preprocessing picks a few landmarks spread over the network and stores
+//! the distances from every landmark to every node and back. For any node
+//! `v`, target `t` and landmark `L` both `d(L, t) - d(L, v)` and
+//! `d(v, L) - d(t, L)` are lower bounds on `d(v, t)`, and the largest of
+//! them is a much tighter A* heuristic than the straight-line distance.
+
+use crate::{
+    algo::search::with_workspace,
+    ds::{buffer::Buffer, graph::Graph},
+    utils::snapshot::{self, Section, Snapshot},
+};
+use rand::{rngs::StdRng, Rng, SeedableRng};
+use rayon::prelude::*;
+use std::error::Error;
+
+pub const DEFAULT_LANDMARKS: usize = 16;
+
+pub const LANDMARK_NODES: snapshot::Tag = *b"LM_NODES";
+pub const LANDMARK_FORWARD: snapshot::Tag = *b"LM_FWD\0\0";
+pub const LANDMARK_BACKWARD: snapshot::Tag = *b"LM_BWD\0\0";
+
+/// Landmark distance tables, node-major so the bounds of a node are read
+/// from one contiguous row: `forward[v * k + i]` is the distance from
+/// landmark `i` to `v` and `backward[v * k + i]` the distance from `v` to
+/// landmark `i`, infinite when there is no path.
+#[derive(Debug, Clone)]
+pub struct Landmarks {
+    nodes: Buffer<u32>,
+    forward: Buffer<f32>,
+    backward: Buffer<f32>,
+}
+
+impl Landmarks {
+    /// Chooses up to `count` landmarks by farthest-point selection: each
+    /// new landmark is the node farthest from the ones already chosen.
+    pub fn build(g: &Graph, count: usize) -> Self {
+        let n = g.num_nodes();
+        let mut nodes = vec![];
+        let mut from_landmarks: Vec<Vec<f32>> = vec![];
+        if n > 0 && count > 0 {
+            // the first landmark is the node farthest from a random start
+            let start = StdRng::seed_from_u64(n as u64).gen_range(0..n);
+            let mut closest = distances_from(g, start);
+            while nodes.len() < count.min(n) {
+                let next = (0..n)
+                    .filter(|&v| closest[v].is_finite() && !nodes.contains(&(v as u32)))
+                    .max_by(|&a, &b| closest[a].total_cmp(&closest[b]));
+                let next = match next {
+                    Some(next) => next,
+                    None => break,
+                };
+                let distances = distances_from(g, next);
+                if nodes.is_empty() {
+                    closest = distances.clone();
+                } else {
+                    for (c, d) in closest.iter_mut().zip(&distances) {
+                        *c = c.min(*d);
+                    }
+                }
+                nodes.push(next as u32);
+                from_landmarks.push(distances);
+            }
+        }
+
+        let reverse = g.reverse();
+        let to_landmarks: Vec<Vec<f32>> = nodes
+            .par_iter()
+            .map(|&landmark| distances_from(&reverse, landmark as usize))
+            .collect();
+
+        let k = nodes.len();
+        let mut forward = vec![f32::INFINITY; n * k];
+        let mut backward = vec![f32::INFINITY; n * k];
+        for i in 0..k {
+            for v in 0..n {
+                forward[v * k + i] = from_landmarks[i][v];
+                backward[v * k + i] = to_landmarks[i][v];
+            }
+        }
+        Self {
+            nodes: nodes.into(),
+            forward: forward.into(),
+            backward: backward.into(),
+        }
+    }
+
+    pub fn num_landmarks(&self) -> usize {
+        self.nodes.len()
+    }
+
+    pub fn num_nodes(&self) -> usize {
+        match self.nodes.len() {
+            0 => 0,
+            k => self.forward.len() / k,
+        }
+    }
+
+    pub fn landmarks(&self) -> &[u32] {
+        &self.nodes
+    }
+
+    /// Lower bound on the road distance from `v` to `t`.
+    #[inline]
+    pub fn lower_bound(&self, v: usize, t: usize) -> f64 {
+        let k = self.nodes.len();
+        let (from_v, from_t) = (&self.forward[v * k..][..k], &self.forward[t * k..][..k]);
+        let (to_v, to_t) = (&self.backward[v * k..][..k], &self.backward[t * k..][..k]);
+        let mut bound = 0f32;
+        for i in 0..k {
+            // infinite differences only say that t is unreachable; they
+            // are skipped rather than used to prune
+            let before = from_t[i] - from_v[i];
+            if before > bound && before.is_finite() {
+                bound = before;
+            }
+            let after = to_v[i] - to_t[i];
+            if after > bound && after.is_finite() {
+                bound = after;
+            }
+        }
+        bound as f64
+    }
+
+    pub fn save(&self, path: &str) -> Result<(), Box<dyn Error>> {
+        snapshot::write_snapshot(
+            path,
+            &[
+                Section::new(LANDMARK_NODES, &self.nodes),
+                Section::new(LANDMARK_FORWARD, &self.forward),
+                Section::new(LANDMARK_BACKWARD, &self.backward),
+            ],
+        )
+    }
+
+    pub fn open(path: &str) -> Result<Self, Box<dyn Error>> {
+        Self::from_snapshot(&Snapshot::open(path)?)
+    }
+
+    pub fn from_snapshot(snapshot: &Snapshot) -> Result<Self, Box<dyn Error>> {
+        let landmarks = Self {
+            nodes: snapshot.section(&LANDMARK_NODES)?,
+            forward: snapshot.section(&LANDMARK_FORWARD)?,
+            backward: snapshot.section(&LANDMARK_BACKWARD)?,
+        };
+        let k = landmarks.nodes.len();
+        if landmarks.forward.len() != landmarks.backward.len()
+            || (k == 0 && !landmarks.forward.is_empty())
+            || (k > 0 && landmarks.forward.len() % k != 0)
+        {
+            return Err("Inconsistent landmark sections".into());
+        }
+        Ok(landmarks)
+    }
+}
+
+// Distances from `src` to every node, infinite when unreachable.
+fn distances_from(g: &Graph, src: usize) -> Vec<f32> {
+    with_workspace(g.num_nodes(), |ws| {
+        ws.relax(src, 0.0, None, 0.0);
+        while let Some((node, dist)) = ws.pop() {
+            for (neighbour, weight) in g.neighbours(node) {
+                let alt = dist + weight;
+                ws.relax(neighbour, alt, Some(node), alt);
+            }
+        }
+        (0..g.num_nodes()).map(|v| ws.distance(v) as f32).collect()
+    })
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::algo::shortest_paths::{astar, dijkstra, harvesine_heuristic, GraphBuilder};
+    use crate::ds::coordinates::CoordinateTable;
+    use crate::utils::{create_adjacency_list_from_files, create_id_to_coordinates_hashmap_from_file};
+    use dotenvy::dotenv;
+    use std::{env, fs, time::Instant};
+
+    fn random_graph(n: usize, seed: u64) -> Graph {
+        let mut rng = StdRng::seed_from_u64(seed);
+        let mut g = GraphBuilder::new(n);
+        for u in 0..n {
+            for _ in 0..3 {
+                let v = rng.gen_range(0..n);
+                let w = rng.gen_range(1..100) as f64;
+                g.add_edge(u, v, w);
+                if rng.gen_range(0..4) > 0 {
+                    g.add_edge(v, u, w);
+                }
+            }
+        }
+        g.build()
+    }
+
+    #[test]
+    fn test_lower_bound_is_admissible() {
+        let g = random_graph(120, 5);
+        let landmarks = Landmarks::build(&g, 8);
+        assert_eq!(landmarks.num_landmarks(), 8);
+        assert_eq!(landmarks.num_nodes(), 120);
+        for v in 0..g.num_nodes() {
+            let exact = distances_from(&g, v);
+            for t in 0..g.num_nodes() {
+                assert!(landmarks.lower_bound(v, t) <= exact[t] as f64);
+            }
+        }
+        // a landmark bounds the distances to itself exactly
+        let l = landmarks.landmarks()[0] as usize;
+        let exact = distances_from(&g, 3);
+        if exact[l].is_finite() {
+            assert_eq!(landmarks.lower_bound(3, l), exact[l] as f64);
+        }
+    }
+
+    #[test]
+    fn test_alt_matches_dijkstra() {
+        let g = random_graph(200, 9);
+        let landmarks = Landmarks::build(&g, DEFAULT_LANDMARKS);
+        let map = CoordinateTable::from(vec![]);
+        let heuristic = |_: &CoordinateTable, v: usize, t: usize| landmarks.lower_bound(v, t);
+        for src in (0..g.num_nodes()).step_by(13) {
+            for dest in (0..g.num_nodes()).step_by(7) {
+                match dijkstra(&g, src, dest) {
+                    Ok((expected, _)) => {
+                        let (distance, path) = astar(&g, &map, src, dest, &heuristic).unwrap();
+                        assert!((distance - expected).abs() < 1e-6);
+                        assert_eq!((path[0], path[path.len() - 1]), (src, dest));
+                    }
+                    Err(_) => assert!(astar(&g, &map, src, dest, &heuristic).is_err()),
+                }
+            }
+        }
+    }
+
+    #[test]
+    fn test_landmarks_save_and_open() {
+        let g = random_graph(40, 2);
+        let landmarks = Landmarks::build(&g, 4);
+        let path = env::temp_dir()
+            .join(format!("tsp-{}-test.lm", std::process::id()))
+            .to_string_lossy()
+            .to_string();
+        landmarks.save(&path).unwrap();
+        let loaded = Landmarks::open(&path).unwrap();
+        assert_eq!(loaded.landmarks(), landmarks.landmarks());
+        assert_eq!(loaded.lower_bound(1, 30), landmarks.lower_bound(1, 30));
+        fs::remove_file(&path).unwrap();
+    }
+
+    #[test]
+    #[ignore = "performance test"]
+    fn compare_alt_and_haversine_astar_running_times() {
+        dotenv().ok();
+        let coordinates_file = env::var("COORDINATES_FILE").unwrap();
+        let arcs_file = env::var("ARCS_FILE").unwrap();
+        let g = create_adjacency_list_from_files(&coordinates_file, &arcs_file).unwrap();
+        let map = create_id_to_coordinates_hashmap_from_file(&coordinates_file).unwrap();
+        let landmarks = Landmarks::build(&g, DEFAULT_LANDMARKS);
+        let src = rand::thread_rng().gen_range(0..g.num_nodes());
+        let dest = rand::thread_rng().gen_range(0..g.num_nodes());
+
+        let start = Instant::now();
+        let expected = astar(&g, &map, src, dest, &harvesine_heuristic);
+        println!("A* time: {:?}", start.elapsed());
+
+        let start = Instant::now();
+        let found = astar(&g, &map, src, dest, &|_, v, t| landmarks.lower_bound(v, t));
+        println!("ALT time: {:?}", start.elapsed());
+        assert_eq!(found.map(|r| r.0).ok(), expected.map(|r| r.0).ok());
+    }
+}
@@ -0,0 +1,569 @@
+//! Contraction hierarchies.
+//!
+//! Preprocessing contracts the nodes one by one in order of importance and
+//! inserts a shortcut `u -> x` whenever the only shortest path between two
+//! neighbours of the contracted node `v` ran through `v`. Every arc then
+//! points from a lower to a higher ranked node (upward graph) or the
+//! opposite way (downward graph), and a query is a bidirectional Dijkstra
+//! that only climbs: forward on the upward graph, backward on the downward
+//! one. Shortcuts remember the node they bypass so paths can be unpacked.
+
+use crate::{
+    algo::search::{with_workspace, SearchWorkspace},
+    ds::{buffer::Buffer, graph::Graph},
+    utils::snapshot::{self, Section, Snapshot},
+};
+use std::{
+    cmp::Reverse,
+    collections::{BinaryHeap, HashMap},
+    error::Error,
+};
+
+const NO_MIDDLE: u32 = u32::MAX;
+// bound on the nodes settled by a witness search; a failed search only
+// costs an unnecessary shortcut, never a wrong answer
+const WITNESS_SETTLE_LIMIT: usize = 500;
+
+pub const RANKS: snapshot::Tag = *b"CH_RANK\0";
+pub const UP_OFFSETS: snapshot::Tag = *b"CH_UPOFF";
+pub const UP_TARGETS: snapshot::Tag = *b"CH_UPTGT";
+pub const UP_WEIGHTS: snapshot::Tag = *b"CH_UPWGT";
+pub const UP_MIDDLES: snapshot::Tag = *b"CH_UPMID";
+pub const DOWN_OFFSETS: snapshot::Tag = *b"CH_DNOFF";
+pub const DOWN_SOURCES: snapshot::Tag = *b"CH_DNSRC";
+pub const DOWN_WEIGHTS: snapshot::Tag = *b"CH_DNWGT";
+pub const DOWN_MIDDLES: snapshot::Tag = *b"CH_DNMID";
+
+#[derive(Debug, Clone)]
+pub struct ContractionHierarchy {
+    rank: Buffer<u32>,
+    // arcs u -> v with rank[u] < rank[v], stored at u
+    up: Graph,
+    up_middle: Buffer<u32>,
+    // arcs u -> v with rank[u] > rank[v], stored at v and pointing back to u
+    down: Graph,
+    down_middle: Buffer<u32>,
+}
+
+impl ContractionHierarchy {
+    /// Contracts every node of `g`. This is an offline step: it runs a few
+    /// local witness searches per node and takes minutes on a country-sized
+    /// network.
+    pub fn build(g: &Graph) -> Self {
+        let n = g.num_nodes();
+        let mut contractor = Contractor::new(g);
+        let mut queue = BinaryHeap::with_capacity(n);
+        for v in 0..n {
+            queue.push(Reverse((contractor.priority(v), v as u32)));
+        }
+
+        let mut rank = vec![0u32; n];
+        let mut up_arcs = vec![];
+        let mut down_arcs = vec![];
+        let mut next_rank = 0;
+        while let Some(Reverse((priority, v))) = queue.pop() {
+            let v = v as usize;
+            if contractor.contracted[v] {
+                continue;
+            }
+            // lazy update: priorities of unaffected nodes may be stale
+            let shortcuts = contractor.shortcuts(v);
+            let current = contractor.priority_with(v, shortcuts.len());
+            if current > priority {
+                if let Some(Reverse((next, _))) = queue.peek() {
+                    if current > *next {
+                        queue.push(Reverse((current, v as u32)));
+                        continue;
+                    }
+                }
+            }
+
+            rank[v] = next_rank;
+            next_rank += 1;
+            for neighbour in contractor.contract(v, shortcuts, &mut up_arcs, &mut down_arcs) {
+                queue.push(Reverse((contractor.priority(neighbour), neighbour as u32)));
+            }
+        }
+
+        let (up, up_middle) = pack(n, up_arcs);
+        let (down, down_middle) = pack(n, down_arcs);
+        Self {
+            rank: rank.into(),
+            up,
+            up_middle: up_middle.into(),
+            down,
+            down_middle: down_middle.into(),
+        }
+    }
+
+    pub fn num_nodes(&self) -> usize {
+        self.rank.len()
+    }
+
+    pub fn num_arcs(&self) -> usize {
+        self.up.num_edges() + self.down.num_edges()
+    }
+
+    /// Shortest distance and unpacked node path from `src` to `dest`.
+    pub fn query(&self, src: usize, dest: usize) -> Result<(f64, Vec<usize>), Box<dyn Error>> {
+        if src == dest {
+            return Ok((0.0, vec![src]));
+        }
+        let n = self.num_nodes();
+        let meeting = with_workspace(n, |forward| {
+            with_workspace(n, |backward| {
+                let (distance, meeting) = self.search(forward, backward, src, dest)?;
+                let mut packed = forward.path_to(meeting);
+                let mut down_path = backward.path_to(meeting);
+                down_path.pop();
+                packed.extend(down_path.into_iter().rev());
+                Some((distance, packed))
+            })
+        });
+
+        match meeting {
+            Some((distance, packed)) => {
+                let mut path = vec![src];
+                for pair in packed.windows(2) {
+                    self.unpack(pair[0], pair[1], &mut path);
+                }
+                Ok((distance, path))
+            }
+            None => Err("No path found".into()),
+        }
+    }
+
+    /// `table[i][j]` is the distance from `sources[i]` to `targets[j]`. One
+    /// backward upward search per target leaves `(j, distance)` buckets at
+    /// the nodes it settles, and one forward upward search per source scans
+    /// them.
+    pub fn distance_table(&self, sources: &[usize], targets: &[usize]) -> Vec<Vec<f64>> {
+        let n = self.num_nodes();
+        let mut buckets: HashMap<usize, Vec<(usize, f64)>> = HashMap::new();
+        for (j, &target) in targets.iter().enumerate() {
+            with_workspace(n, |ws| {
+                upward_search(ws, &self.down, target, |node, dist| {
+                    buckets.entry(node).or_default().push((j, dist))
+                })
+            });
+        }
+
+        sources
+            .iter()
+            .map(|&src| {
+                let mut row = vec![f64::INFINITY; targets.len()];
+                with_workspace(n, |ws| {
+                    upward_search(ws, &self.up, src, |node, dist| {
+                        for &(j, to_target) in buckets.get(&node).into_iter().flatten() {
+                            row[j] = row[j].min(dist + to_target);
+                        }
+                    })
+                });
+                row
+            })
+            .collect()
+    }
+
+    fn search(
+        &self,
+        forward: &mut SearchWorkspace,
+        backward: &mut SearchWorkspace,
+        src: usize,
+        dest: usize,
+    ) -> Option<(f64, usize)> {
+        forward.relax(src, 0.0, None, 0.0);
+        backward.relax(dest, 0.0, None, 0.0);
+        let mut best = f64::INFINITY;
+        let mut meeting = None;
+        loop {
+            let forward_key = forward.peek_key().unwrap_or(f64::INFINITY);
+            let backward_key = backward.peek_key().unwrap_or(f64::INFINITY);
+            // unlike plain bidirectional search, each side must run until its
+            // own queue passes the best distance found so far
+            if forward_key.min(backward_key) >= best {
+                break;
+            }
+            let (ws, other, graph) = if forward_key <= backward_key {
+                (&mut *forward, &*backward, &self.up)
+            } else {
+                (&mut *backward, &*forward, &self.down)
+            };
+            let (node, _) = ws.pop()?;
+            let dist = ws.distance(node);
+            let total = dist + other.distance(node);
+            if total < best {
+                best = total;
+                meeting = Some(node);
+            }
+            for (next, weight) in graph.neighbours(node) {
+                ws.relax(next, dist + weight, Some(node), dist + weight);
+            }
+        }
+        meeting.map(|m| (best, m))
+    }
+
+    // Appends the original nodes of arc `from -> to` after `from`.
+    fn unpack(&self, from: usize, to: usize, path: &mut Vec<usize>) {
+        let mut stack = vec![(from, to)];
+        while let Some((u, v)) = stack.pop() {
+            match self.middle(u, v) {
+                Some(middle) => {
+                    stack.push((middle, v));
+                    stack.push((u, middle));
+                }
+                None => path.push(v),
+            }
+        }
+    }
+
+    fn middle(&self, u: usize, v: usize) -> Option<usize> {
+        let (graph, middles, at, other) = if self.rank[u] < self.rank[v] {
+            (&self.up, &self.up_middle, u, v)
+        } else {
+            (&self.down, &self.down_middle, v, u)
+        };
+        let range = graph.offsets()[at] as usize..graph.offsets()[at + 1] as usize;
+        let arc = range
+            .filter(|&i| graph.targets()[i] as usize == other)
+            .min_by(|&a, &b| graph.weights()[a].total_cmp(&graph.weights()[b]))
+            .expect("Missing hierarchy arc");
+        match middles[arc] {
+            NO_MIDDLE => None,
+            middle => Some(middle as usize),
+        }
+    }
+
+    pub fn save(&self, path: &str) -> Result<(), Box<dyn Error>> {
+        snapshot::write_snapshot(
+            path,
+            &[
+                Section::new(RANKS, &self.rank),
+                Section::new(UP_OFFSETS, self.up.offsets()),
+                Section::new(UP_TARGETS, self.up.targets()),
+                Section::new(UP_WEIGHTS, self.up.weights()),
+                Section::new(UP_MIDDLES, &self.up_middle),
+                Section::new(DOWN_OFFSETS, self.down.offsets()),
+                Section::new(DOWN_SOURCES, self.down.targets()),
+                Section::new(DOWN_WEIGHTS, self.down.weights()),
+                Section::new(DOWN_MIDDLES, &self.down_middle),
+            ],
+        )
+    }
+
+    pub fn open(path: &str) -> Result<Self, Box<dyn Error>> {
+        Self::from_snapshot(&Snapshot::open(path)?)
+    }
+
+    pub fn from_snapshot(snapshot: &Snapshot) -> Result<Self, Box<dyn Error>> {
+        let hierarchy = Self {
+            rank: snapshot.section(&RANKS)?,
+            up: Graph::from_csr(
+                snapshot.section(&UP_OFFSETS)?,
+                snapshot.section(&UP_TARGETS)?,
+                snapshot.section(&UP_WEIGHTS)?,
+            )?,
+            up_middle: snapshot.section(&UP_MIDDLES)?,
+            down: Graph::from_csr(
+                snapshot.section(&DOWN_OFFSETS)?,
+                snapshot.section(&DOWN_SOURCES)?,
+                snapshot.section(&DOWN_WEIGHTS)?,
+            )?,
+            down_middle: snapshot.section(&DOWN_MIDDLES)?,
+        };
+        if hierarchy.up.num_nodes() != hierarchy.num_nodes()
+            || hierarchy.down.num_nodes() != hierarchy.num_nodes()
+            || hierarchy.up_middle.len() != hierarchy.up.num_edges()
+            || hierarchy.down_middle.len() != hierarchy.down.num_edges()
+        {
+            return Err("Inconsistent contraction hierarchy sections".into());
+        }
+        Ok(hierarchy)
+    }
+}
+
+#[derive(Copy, Clone)]
+struct Link {
+    node: u32,
+    weight: f64,
+    middle: u32,
+}
+
+// (stored at, other endpoint, weight, middle)
+type PackedArc = (u32, u32, f32, u32);
+
+struct Contractor {
+    out: Vec<Vec<Link>>,
+    inc: Vec<Vec<Link>>,
+    contracted: Vec<bool>,
+    deleted_neighbours: Vec<u32>,
+    ws: SearchWorkspace,
+}
+
+impl Contractor {
+    fn new(g: &Graph) -> Self {
+        let n = g.num_nodes();
+        let mut contractor = Self {
+            out: vec![vec![]; n],
+            inc: vec![vec![]; n],
+            contracted: vec![false; n],
+            deleted_neighbours: vec![0; n],
+            ws: SearchWorkspace::new(n),
+        };
+        for u in 0..n {
+            for (v, w) in g.neighbours(u) {
+                if u != v {
+                    contractor.add_link(u, v, w, NO_MIDDLE);
+                }
+            }
+        }
+        contractor
+    }
+
+    // keeps a single, shortest arc between any two nodes
+    fn add_link(&mut self, u: usize, v: usize, weight: f64, middle: u32) {
+        if let Some(link) = self.out[u].iter_mut().find(|l| l.node as usize == v) {
+            if link.weight <= weight {
+                return;
+            }
+            link.weight = weight;
+            link.middle = middle;
+            let link = self.inc[v].iter_mut().find(|l| l.node as usize == u).unwrap();
+            link.weight = weight;
+            link.middle = middle;
+            return;
+        }
+        self.out[u].push(Link {
+            node: v as u32,
+            weight,
+            middle,
+        });
+        self.inc[v].push(Link {
+            node: u as u32,
+            weight,
+            middle,
+        });
+    }
+
+    // Shortcuts `(u, x, weight)` that contracting `v` requires.
+    fn shortcuts(&mut self, v: usize) -> Vec<(usize, usize, f64)> {
+        let Contractor { out, inc, ws, .. } = self;
+        let mut shortcuts = vec![];
+        for incoming in &inc[v] {
+            let u = incoming.node as usize;
+            let max_distance = out[v]
+                .iter()
+                .filter(|l| l.node as usize != u)
+                .map(|l| incoming.weight + l.weight)
+                .fold(f64::NEG_INFINITY, f64::max);
+            if max_distance == f64::NEG_INFINITY {
+                continue;
+            }
+
+            // witness search from u on the remaining graph without v, until
+            // every target is settled or too far away
+            let mut targets_left = out[v].iter().filter(|l| l.node as usize != u).count();
+            ws.reset();
+            ws.relax(u, 0.0, None, 0.0);
+            while let Some((node, dist)) = ws.pop() {
+                if dist > max_distance || ws.settled_count() > WITNESS_SETTLE_LIMIT {
+                    break;
+                }
+                if node != u && out[v].iter().any(|l| l.node as usize == node) {
+                    targets_left -= 1;
+                    if targets_left == 0 {
+                        break;
+                    }
+                }
+                for link in &out[node] {
+                    if link.node as usize != v {
+                        let alt = dist + link.weight;
+                        ws.relax(link.node as usize, alt, Some(node), alt);
+                    }
+                }
+            }
+
+            for outgoing in &out[v] {
+                let x = outgoing.node as usize;
+                let via_v = incoming.weight + outgoing.weight;
+                if x != u && ws.distance(x) > via_v {
+                    shortcuts.push((u, x, via_v));
+                }
+            }
+        }
+        shortcuts
+    }
+
+    fn priority(&mut self, v: usize) -> i64 {
+        let added = self.shortcuts(v).len();
+        self.priority_with(v, added)
+    }
+
+    fn priority_with(&self, v: usize, added: usize) -> i64 {
+        let removed = self.out[v].len() + self.inc[v].len();
+        2 * (added as i64 - removed as i64) + self.deleted_neighbours[v] as i64
+    }
+
+    // Contracts `v`, moving its remaining arcs to the hierarchy. Returns the
+    // neighbours whose priority changed.
+    fn contract(
+        &mut self,
+        v: usize,
+        shortcuts: Vec<(usize, usize, f64)>,
+        up_arcs: &mut Vec<PackedArc>,
+        down_arcs: &mut Vec<PackedArc>,
+    ) -> Vec<usize> {
+        let out = std::mem::take(&mut self.out[v]);
+        let inc = std::mem::take(&mut self.inc[v]);
+        let mut neighbours = vec![];
+
+        for link in &out {
+            let x = link.node as usize;
+            up_arcs.push((v as u32, link.node, link.weight as f32, link.middle));
+            self.inc[x].retain(|l| l.node as usize != v);
+            neighbours.push(x);
+        }
+        for link in &inc {
+            let u = link.node as usize;
+            down_arcs.push((v as u32, link.node, link.weight as f32, link.middle));
+            self.out[u].retain(|l| l.node as usize != v);
+            neighbours.push(u);
+        }
+        self.contracted[v] = true;
+
+        for (u, x, weight) in shortcuts {
+            self.add_link(u, x, weight, v as u32);
+        }
+
+        neighbours.sort_unstable();
+        neighbours.dedup();
+        for &neighbour in &neighbours {
+            self.deleted_neighbours[neighbour] += 1;
+        }
+        neighbours
+    }
+}
+
+// Settles the whole search space of `src` in one direction of the hierarchy.
+fn upward_search(
+    ws: &mut SearchWorkspace,
+    graph: &Graph,
+    src: usize,
+    mut visit: impl FnMut(usize, f64),
+) {
+    ws.relax(src, 0.0, None, 0.0);
+    while let Some((node, dist)) = ws.pop() {
+        visit(node, dist);
+        for (next, weight) in graph.neighbours(node) {
+            ws.relax(next, dist + weight, Some(node), dist + weight);
+        }
+    }
+}
+
+fn pack(n: usize, arcs: Vec<PackedArc>) -> (Graph, Vec<u32>) {
+    let mut offsets = vec![0u32; n + 1];
+    for &(at, _, _, _) in &arcs {
+        offsets[at as usize + 1] += 1;
+    }
+    for i in 0..n {
+        offsets[i + 1] += offsets[i];
+    }
+    let mut cursor = offsets[..n].to_vec();
+    let mut targets = vec![0u32; arcs.len()];
+    let mut weights = vec![0f32; arcs.len()];
+    let mut middles = vec![0u32; arcs.len()];
+    for (at, other, weight, middle) in arcs {
+        let i = cursor[at as usize] as usize;
+        targets[i] = other;
+        weights[i] = weight;
+        middles[i] = middle;
+        cursor[at as usize] += 1;
+    }
+    let graph = Graph::from_csr(offsets.into(), targets.into(), weights.into()).unwrap();
+    (graph, middles)
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::algo::shortest_paths::dijkstra;
+    use crate::ds::graph::GraphBuilder;
+    use rand::{rngs::StdRng, Rng, SeedableRng};
+    use std::{env, fs};
+
+    fn random_graph(n: usize, seed: u64) -> Graph {
+        let mut rng = StdRng::seed_from_u64(seed);
+        let mut g = GraphBuilder::new(n);
+        for u in 0..n {
+            for _ in 0..3 {
+                let v = rng.gen_range(0..n);
+                let w = rng.gen_range(1..100) as f64;
+                g.add_edge(u, v, w);
+                if rng.gen_range(0..4) > 0 {
+                    g.add_edge(v, u, w);
+                }
+            }
+        }
+        g.build()
+    }
+
+    fn path_length(g: &Graph, path: &[usize]) -> f64 {
+        path.windows(2)
+            .map(|pair| {
+                g.neighbours(pair[0])
+                    .filter(|&(v, _)| v == pair[1])
+                    .map(|(_, w)| w)
+                    .fold(f64::INFINITY, f64::min)
+            })
+            .sum()
+    }
+
+    #[test]
+    fn test_ch_matches_dijkstra() {
+        let g = random_graph(80, 7);
+        let ch = ContractionHierarchy::build(&g);
+        for src in 0..g.num_nodes() {
+            for dest in (0..g.num_nodes()).step_by(7) {
+                match dijkstra(&g, src, dest) {
+                    Ok((expected, _)) => {
+                        let (distance, path) = ch.query(src, dest).unwrap();
+                        assert!((distance - expected).abs() < 1e-6);
+                        assert_eq!(path.first(), Some(&src));
+                        assert_eq!(path.last(), Some(&dest));
+                        assert!((path_length(&g, &path) - expected).abs() < 1e-6);
+                    }
+                    Err(_) => assert!(ch.query(src, dest).is_err()),
+                }
+            }
+        }
+    }
+
+    #[test]
+    fn test_ch_distance_table() {
+        let g = random_graph(60, 3);
+        let ch = ContractionHierarchy::build(&g);
+        let sources = [0, 5, 17, 42];
+        let targets = [3, 5, 29, 59, 0];
+        let table = ch.distance_table(&sources, &targets);
+        for (i, &src) in sources.iter().enumerate() {
+            for (j, &dest) in targets.iter().enumerate() {
+                let expected = dijkstra(&g, src, dest).map_or(f64::INFINITY, |r| r.0);
+                assert!(table[i][j] == expected || (table[i][j] - expected).abs() < 1e-6);
+            }
+        }
+    }
+
+    #[test]
+    fn test_ch_save_and_open() {
+        let g = random_graph(30, 11);
+        let ch = ContractionHierarchy::build(&g);
+        let path = env::temp_dir()
+            .join(format!("tsp-{}-test.ch", std::process::id()))
+            .to_string_lossy()
+            .to_string();
+        ch.save(&path).unwrap();
+        let loaded = ContractionHierarchy::open(&path).unwrap();
+        assert_eq!(loaded.num_arcs(), ch.num_arcs());
+        assert_eq!(loaded.query(0, 29).ok(), ch.query(0, 29).ok());
+        fs::remove_file(&path).unwrap();
+    }
+}
@@ -0,0 +1,160 @@
+//! Strongly connected components of the road network.
+//!
+//! A node outside the largest component can't reach, or can't be reached
+//! from, most of the network, so a search to or from it only fails after
+//! settling everything reachable.
+
+use crate::ds::graph::Graph;
+
+const UNVISITED: u32 = u32::MAX;
+
+/// Component of every node, numbered by decreasing size: component 0 is
+/// the largest. Ties go to the component holding the smallest node id.
+#[derive(Debug, Clone)]
+pub struct Components {
+    labels: Vec<u32>,
+    sizes: Vec<usize>,
+}
+
+impl Components {
+    pub fn of(&self, u: usize) -> u32 {
+        self.labels[u]
+    }
+
+    pub fn labels(&self) -> &[u32] {
+        &self.labels
+    }
+
+    pub fn count(&self) -> usize {
+        self.sizes.len()
+    }
+
+    pub fn size(&self, component: u32) -> usize {
+        self.sizes[component as usize]
+    }
+
+    pub fn largest_size(&self) -> usize {
+        self.sizes.first().copied().unwrap_or(0)
+    }
+}
+
+/// Tarjan's algorithm with an explicit stack, since road networks are deep
+/// enough to overflow the call stack.
+pub fn strongly_connected_components(g: &Graph) -> Components {
+    let n = g.num_nodes();
+    let offsets = g.offsets();
+    let targets = g.targets();
+
+    let mut index = vec![UNVISITED; n];
+    let mut lowlink = vec![0u32; n];
+    let mut on_stack = vec![false; n];
+    let mut stack: Vec<u32> = vec![];
+    // (node, next arc to look at)
+    let mut calls: Vec<(u32, u32)> = vec![];
+    let mut labels = vec![UNVISITED; n];
+    let mut sizes = vec![];
+    let mut next_index = 0u32;
+
+    for root in 0..n {
+        if index[root] != UNVISITED {
+            continue;
+        }
+        index[root] = next_index;
+        lowlink[root] = next_index;
+        next_index += 1;
+        stack.push(root as u32);
+        on_stack[root] = true;
+        calls.push((root as u32, offsets[root]));
+
+        while let Some(&mut (u, ref mut arc)) = calls.last_mut() {
+            let u = u as usize;
+            if *arc < offsets[u + 1] {
+                let v = targets[*arc as usize] as usize;
+                *arc += 1;
+                if index[v] == UNVISITED {
+                    index[v] = next_index;
+                    lowlink[v] = next_index;
+                    next_index += 1;
+                    stack.push(v as u32);
+                    on_stack[v] = true;
+                    calls.push((v as u32, offsets[v]));
+                } else if on_stack[v] {
+                    lowlink[u] = lowlink[u].min(index[v]);
+                }
+                continue;
+            }
+
+            calls.pop();
+            if let Some(&(parent, _)) = calls.last() {
+                let parent = parent as usize;
+                lowlink[parent] = lowlink[parent].min(lowlink[u]);
+            }
+            if lowlink[u] == index[u] {
+                let label = sizes.len() as u32;
+                let mut size = 0;
+                loop {
+                    let v = stack.pop().unwrap() as usize;
+                    on_stack[v] = false;
+                    labels[v] = label;
+                    size += 1;
+                    if v == u {
+                        break;
+                    }
+                }
+                sizes.push(size);
+            }
+        }
+    }
+
+    // renumber by decreasing size, then by first node
+    let mut first = vec![UNVISITED; sizes.len()];
+    for (u, &label) in labels.iter().enumerate() {
+        if first[label as usize] == UNVISITED {
+            first[label as usize] = u as u32;
+        }
+    }
+    let mut order: Vec<u32> = (0..sizes.len() as u32).collect();
+    order.sort_unstable_by_key(|&c| (std::cmp::Reverse(sizes[c as usize]), first[c as usize]));
+    let mut rank = vec![0u32; sizes.len()];
+    for (new, &old) in order.iter().enumerate() {
+        rank[old as usize] = new as u32;
+    }
+
+    Components {
+        labels: labels.iter().map(|&label| rank[label as usize]).collect(),
+        sizes: order.iter().map(|&c| sizes[c as usize]).collect(),
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::ds::graph::GraphBuilder;
+
+    #[test]
+    fn test_strongly_connected_components() {
+        // 0 <-> 1 -> 2 <-> 3 <-> 4, 5 alone, 6 -> 5
+        let mut builder = GraphBuilder::new(7);
+        for (u, v) in [(0, 1), (1, 0), (1, 2), (2, 3), (3, 2), (3, 4), (4, 3), (6, 5)] {
+            builder.add_edge(u, v, 1.0);
+        }
+        let components = strongly_connected_components(&builder.build());
+
+        assert_eq!(components.count(), 4);
+        assert_eq!(components.labels(), &[1, 1, 0, 0, 0, 2, 3]);
+        assert_eq!(components.largest_size(), 3);
+        assert_eq!(components.size(1), 2);
+    }
+
+    #[test]
+    fn test_long_cycle_does_not_overflow() {
+        let n = 200_000;
+        let mut builder = GraphBuilder::new(n);
+        for u in 0..n {
+            builder.add_edge(u, (u + 1) % n, 1.0);
+        }
+        let components = strongly_connected_components(&builder.build());
+        assert_eq!(components.count(), 1);
+        assert_eq!(components.largest_size(), n);
+    }
+}
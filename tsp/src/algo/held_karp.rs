@@ -0,0 +1,184 @@
+use rayon::prelude::*;
+use std::error::Error;
+
+// Each (subset, last node) state stores an f32 cost and a u8 parent.
+const BYTES_PER_STATE: usize = 5;
+
+/// Bytes the DP table needs for `n` nodes, `None` when it does not even fit
+/// in the address space.
+pub fn memory_needed(n: usize) -> Option<usize> {
+    let m = n.saturating_sub(1);
+    if m >= usize::BITS as usize || n > u8::MAX as usize {
+        return None;
+    }
+    (1usize << m).checked_mul(m)?.checked_mul(BYTES_PER_STATE)
+}
+
+/// Exact tour over the (possibly asymmetric) distance matrix `dists`,
+/// starting and ending at node 0. Returns the tour length and the node
+/// sequence, with 0 at both ends.
+///
+/// Node 0 is left out of the subsets, so the table has `2^(n-1) * (n-1)`
+/// entries indexed by `subset * (n-1) + (k-1)`. Subsets are processed in
+/// layers of equal size, enumerated with Gosper's hack, and every layer is
+/// computed in parallel since it only reads the previous one.
+pub fn held_karp(dists: &[Vec<f64>], memory_budget: usize) -> Result<(f64, Vec<usize>), Box<dyn Error>> {
+    let n = dists.len();
+    if n == 0 {
+        return Err("At least one node is required".into());
+    }
+    if n == 1 {
+        return Ok((0.0, vec![0, 0]));
+    }
+    match memory_needed(n) {
+        Some(bytes) if bytes <= memory_budget => {}
+        _ => return Err(format!("{} locations are too many for the exact solver", n).into()),
+    }
+
+    let m = n - 1;
+    let mut costs = vec![f32::INFINITY; (1usize << m) * m];
+    let mut parents = vec![0u8; (1usize << m) * m];
+    for k in 1..n {
+        costs[(1usize << (k - 1)) * m + k - 1] = dists[0][k] as f32;
+    }
+
+    let mut rows_cost = vec![];
+    let mut rows_parent = vec![];
+    for size in 2..=m {
+        let subsets = subsets_of_size(m, size);
+        rows_cost.clear();
+        rows_cost.resize(subsets.len() * m, f32::INFINITY);
+        rows_parent.clear();
+        rows_parent.resize(subsets.len() * m, 0u8);
+
+        let table = &costs;
+        rows_cost
+            .par_chunks_mut(m)
+            .zip(rows_parent.par_chunks_mut(m))
+            .zip(subsets.par_iter())
+            .with_min_len(64)
+            .for_each(|((row_cost, row_parent), &subset)| {
+                for k in 0..m {
+                    if subset & (1 << k) == 0 {
+                        continue;
+                    }
+                    let previous = &table[(subset ^ (1 << k)) * m..][..m];
+                    let mut best = f32::INFINITY;
+                    let mut argbest = 0;
+                    for j in 0..m {
+                        if j != k && subset & (1 << j) != 0 {
+                            let cost = previous[j] + dists[j + 1][k + 1] as f32;
+                            if cost < best {
+                                best = cost;
+                                argbest = j + 1;
+                            }
+                        }
+                    }
+                    row_cost[k] = best;
+                    row_parent[k] = argbest as u8;
+                }
+            });
+
+        for (i, &subset) in subsets.iter().enumerate() {
+            costs[subset * m..][..m].copy_from_slice(&rows_cost[i * m..][..m]);
+            parents[subset * m..][..m].copy_from_slice(&rows_parent[i * m..][..m]);
+        }
+    }
+
+    // close the tour back at the start
+    let full = (1usize << m) - 1;
+    let mut min_cost = f64::INFINITY;
+    let mut last = 0;
+    for k in 1..n {
+        let cost = costs[full * m + k - 1] as f64 + dists[k][0];
+        if cost < min_cost {
+            min_cost = cost;
+            last = k;
+        }
+    }
+
+    let mut tour = vec![0];
+    let mut subset = full;
+    while last != 0 {
+        tour.push(last);
+        let previous = parents[subset * m + last - 1] as usize;
+        subset ^= 1 << (last - 1);
+        last = previous;
+    }
+    tour.push(0);
+    tour.reverse();
+    Ok((min_cost, tour))
+}
+
+// All `m`-bit subsets with `size` bits set, in increasing order.
+fn subsets_of_size(m: usize, size: usize) -> Vec<usize> {
+    let mut subsets = vec![];
+    let mut subset = (1usize << size) - 1;
+    while subset < 1 << m {
+        subsets.push(subset);
+        // Gosper's hack: next integer with the same number of set bits
+        let lowest = subset & subset.wrapping_neg();
+        let ripple = subset + lowest;
+        subset = (((ripple ^ subset) >> 2) / lowest) | ripple;
+    }
+    subsets
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use rand::{rngs::StdRng, Rng, SeedableRng};
+
+    fn brute_force(dists: &[Vec<f64>]) -> f64 {
+        fn visit(dists: &[Vec<f64>], last: usize, left: &mut Vec<usize>, cost: f64, best: &mut f64) {
+            if left.is_empty() {
+                *best = best.min(cost + dists[last][0]);
+                return;
+            }
+            for i in 0..left.len() {
+                let next = left.remove(i);
+                visit(dists, next, left, cost + dists[last][next], best);
+                left.insert(i, next);
+            }
+        }
+        let mut best = f64::INFINITY;
+        visit(dists, 0, &mut (1..dists.len()).collect(), 0.0, &mut best);
+        best
+    }
+
+    #[test]
+    fn test_subsets_of_size() {
+        assert_eq!(subsets_of_size(4, 2), vec![0b0011, 0b0101, 0b0110, 0b1001, 0b1010, 0b1100]);
+        assert_eq!(subsets_of_size(3, 3), vec![0b111]);
+    }
+
+    #[test]
+    fn test_held_karp_matches_brute_force() {
+        let mut rng = StdRng::seed_from_u64(5);
+        for n in 2..9 {
+            let dists: Vec<Vec<f64>> = (0..n)
+                .map(|i| (0..n).map(|j| if i == j { 0.0 } else { rng.gen_range(1..1000) as f64 }).collect())
+                .collect();
+            let (cost, tour) = held_karp(&dists, usize::MAX).unwrap();
+            assert_eq!(cost, brute_force(&dists));
+
+            assert_eq!(tour.len(), n + 1);
+            assert_eq!((tour[0], tour[n]), (0, 0));
+            let mut visited = tour[..n].to_vec();
+            visited.sort_unstable();
+            assert_eq!(visited, (0..n).collect::<Vec<_>>());
+            let tour_cost: f64 = tour.windows(2).map(|w| dists[w[0]][w[1]]).sum();
+            assert_eq!(tour_cost, cost);
+        }
+    }
+
+    #[test]
+    fn test_held_karp_respects_memory_budget() {
+        let dists = vec![vec![1.0; 12]; 12];
+        let needed = memory_needed(12).unwrap();
+        assert_eq!(needed, 2048 * 11 * 5);
+        assert!(held_karp(&dists, needed - 1).is_err());
+        assert!(held_karp(&dists, needed).is_ok());
+        assert!(memory_needed(300).is_none());
+    }
+}
@@ -0,0 +1,254 @@
+use rand::{rngs::StdRng, Rng, SeedableRng};
+use std::time::{Duration, Instant};
+
+// Candidate endpoints considered by 2-opt for every node.
+const NEIGHBOURS: usize = 10;
+// Longest segment Or-opt tries to move.
+const MAX_SEGMENT: usize = 3;
+const EPSILON: f64 = 1e-9;
+
+/// Approximate tour over the (possibly asymmetric) distance matrix `dists`,
+/// starting and ending at node 0, found within `time_budget`.
+///
+/// A nearest-neighbour tour is improved with 2-opt restricted to neighbour
+/// lists and with Or-opt segment moves until neither finds an improvement.
+/// The remaining time is spent on double-bridge kicks followed by the same
+/// local search, keeping the best tour seen.
+pub fn local_search_tour(dists: &[Vec<f64>], time_budget: Duration) -> (f64, Vec<usize>) {
+    let deadline = Instant::now() + time_budget;
+    let n = dists.len();
+    if n <= 1 {
+        return (0.0, vec![0, 0]);
+    }
+
+    let neighbours = neighbour_lists(dists);
+    let mut tour = nearest_neighbour_tour(dists);
+    improve(dists, &neighbours, &mut tour, deadline);
+    let mut best_length = tour_length(dists, &tour);
+
+    // iterated local search; double bridges need at least 8 nodes
+    let mut rng = StdRng::seed_from_u64(n as u64);
+    while n >= 8 && Instant::now() < deadline {
+        let mut candidate = double_bridge(&tour, &mut rng);
+        improve(dists, &neighbours, &mut candidate, deadline);
+        let length = tour_length(dists, &candidate);
+        if length < best_length - EPSILON {
+            best_length = length;
+            tour = candidate;
+        }
+    }
+
+    tour.push(0);
+    (best_length, tour)
+}
+
+fn tour_length(dists: &[Vec<f64>], tour: &[usize]) -> f64 {
+    let n = tour.len();
+    (0..n).map(|i| dists[tour[i]][tour[(i + 1) % n]]).sum()
+}
+
+fn neighbour_lists(dists: &[Vec<f64>]) -> Vec<Vec<usize>> {
+    let n = dists.len();
+    (0..n)
+        .map(|i| {
+            let mut others: Vec<usize> = (0..n).filter(|&j| j != i).collect();
+            others.sort_by(|&a, &b| dists[i][a].total_cmp(&dists[i][b]));
+            others.truncate(NEIGHBOURS);
+            others
+        })
+        .collect()
+}
+
+fn nearest_neighbour_tour(dists: &[Vec<f64>]) -> Vec<usize> {
+    let n = dists.len();
+    let mut visited = vec![false; n];
+    let mut tour = vec![0];
+    visited[0] = true;
+    for _ in 1..n {
+        let last = *tour.last().unwrap();
+        let next = (0..n)
+            .filter(|&j| !visited[j])
+            .min_by(|&a, &b| dists[last][a].total_cmp(&dists[last][b]))
+            .unwrap();
+        visited[next] = true;
+        tour.push(next);
+    }
+    tour
+}
+
+// Runs both move types until neither improves the tour. Node 0 stays at
+// position 0 throughout.
+fn improve(dists: &[Vec<f64>], neighbours: &[Vec<usize>], tour: &mut Vec<usize>, deadline: Instant) {
+    loop {
+        let improved = two_opt(dists, neighbours, tour) | or_opt(dists, tour);
+        if !improved || Instant::now() >= deadline {
+            break;
+        }
+    }
+}
+
+// Reverses `tour[i + 1..=j]` when that shortens the tour. On asymmetric
+// matrices the reversed segment changes length too, so both directions of
+// the tour are kept as prefix sums.
+fn two_opt(dists: &[Vec<f64>], neighbours: &[Vec<usize>], tour: &mut Vec<usize>) -> bool {
+    let n = tour.len();
+    let mut improved = false;
+    let mut position = vec![0; n];
+    let mut forward = vec![0.0; n];
+    let mut backward = vec![0.0; n];
+    let mut dirty = true;
+
+    for i in 0..n.saturating_sub(2) {
+        if dirty {
+            for (p, &node) in tour.iter().enumerate() {
+                position[node] = p;
+            }
+            for p in 1..n {
+                forward[p] = forward[p - 1] + dists[tour[p - 1]][tour[p]];
+                backward[p] = backward[p - 1] + dists[tour[p]][tour[p - 1]];
+            }
+            dirty = false;
+        }
+
+        let (a, b) = (tour[i], tour[i + 1]);
+        for &c in &neighbours[a] {
+            let j = position[c];
+            if j <= i + 1 {
+                continue;
+            }
+            let e = tour[(j + 1) % n];
+            let delta = dists[a][c] + dists[b][e] - dists[a][b] - dists[c][e]
+                + (backward[j] - backward[i + 1])
+                - (forward[j] - forward[i + 1]);
+            if delta < -EPSILON {
+                tour[i + 1..=j].reverse();
+                improved = true;
+                dirty = true;
+                break;
+            }
+        }
+    }
+    improved
+}
+
+// Moves a segment of up to `MAX_SEGMENT` nodes, keeping its direction, to
+// the cheapest other place in the tour.
+fn or_opt(dists: &[Vec<f64>], tour: &mut Vec<usize>) -> bool {
+    let n = tour.len();
+    let mut improved = false;
+    for len in 1..=MAX_SEGMENT.min(n.saturating_sub(2)) {
+        let mut i = 1;
+        while i + len <= n {
+            let (first, last) = (tour[i], tour[i + len - 1]);
+            let (before, after) = (tour[i - 1], tour[(i + len) % n]);
+            let removal = dists[before][first] + dists[last][after] - dists[before][after];
+
+            let mut best = (-EPSILON, None);
+            for q in 0..n {
+                if q + 1 >= i && q < i + len {
+                    continue;
+                }
+                let (x, y) = (tour[q], tour[(q + 1) % n]);
+                let delta = dists[x][first] + dists[last][y] - dists[x][y] - removal;
+                if delta < best.0 {
+                    best = (delta, Some(q));
+                }
+            }
+
+            if let Some(q) = best.1 {
+                let segment: Vec<usize> = tour.drain(i..i + len).collect();
+                let at = if q < i { q + 1 } else { q + 1 - len };
+                tour.splice(at..at, segment);
+                improved = true;
+            }
+            i += 1;
+        }
+    }
+    improved
+}
+
+// Cuts the tour in four parts A B C D and reconnects them as A C B D.
+fn double_bridge(tour: &[usize], rng: &mut StdRng) -> Vec<usize> {
+    let n = tour.len();
+    let mut cuts = [
+        rng.gen_range(1..n - 2),
+        rng.gen_range(1..n - 2),
+        rng.gen_range(1..n - 2),
+    ];
+    cuts.sort_unstable();
+    let (p1, p2, p3) = (cuts[0], cuts[1] + 1, cuts[2] + 2);
+    let mut kicked = Vec::with_capacity(n);
+    kicked.extend_from_slice(&tour[..p1]);
+    kicked.extend_from_slice(&tour[p2..p3]);
+    kicked.extend_from_slice(&tour[p1..p2]);
+    kicked.extend_from_slice(&tour[p3..]);
+    kicked
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::algo::held_karp::held_karp;
+
+    fn random_matrix(n: usize, seed: u64, symmetric: bool) -> Vec<Vec<f64>> {
+        let mut rng = StdRng::seed_from_u64(seed);
+        let points: Vec<(f64, f64)> = (0..n)
+            .map(|_| (rng.gen_range(0.0..1000.0), rng.gen_range(0.0..1000.0)))
+            .collect();
+        (0..n)
+            .map(|i| {
+                (0..n)
+                    .map(|j| {
+                        let (dx, dy) = (points[i].0 - points[j].0, points[i].1 - points[j].1);
+                        let detour = if symmetric || i < j { 1.0 } else { 1.3 };
+                        (dx * dx + dy * dy).sqrt() * detour
+                    })
+                    .collect()
+            })
+            .collect()
+    }
+
+    fn assert_valid_tour(dists: &[Vec<f64>], length: f64, tour: &[usize]) {
+        let n = dists.len();
+        assert_eq!(tour.len(), n + 1);
+        assert_eq!((tour[0], tour[n]), (0, 0));
+        let mut visited = tour[..n].to_vec();
+        visited.sort_unstable();
+        assert_eq!(visited, (0..n).collect::<Vec<_>>());
+        let sum: f64 = tour.windows(2).map(|w| dists[w[0]][w[1]]).sum();
+        assert!((sum - length).abs() < 1e-6);
+    }
+
+    #[test]
+    fn test_local_search_small_instances() {
+        for n in 1..5 {
+            let dists = random_matrix(n, 1, false);
+            let (length, tour) = local_search_tour(&dists, Duration::from_millis(10));
+            if n > 1 {
+                assert_valid_tour(&dists, length, &tour);
+            }
+        }
+    }
+
+    #[test]
+    fn test_local_search_close_to_optimal() {
+        for (seed, symmetric) in [(2, true), (3, false)] {
+            let dists = random_matrix(12, seed, symmetric);
+            let (optimal, _) = held_karp(&dists, usize::MAX).unwrap();
+            let (length, tour) = local_search_tour(&dists, Duration::from_millis(100));
+            assert_valid_tour(&dists, length, &tour);
+            assert!(length <= optimal * 1.05, "{} vs optimal {}", length, optimal);
+        }
+    }
+
+    #[test]
+    fn test_local_search_respects_time_budget() {
+        let dists = random_matrix(200, 4, false);
+        let start = Instant::now();
+        let (length, tour) = local_search_tour(&dists, Duration::from_millis(200));
+        assert!(start.elapsed() < Duration::from_secs(2));
+        assert_valid_tour(&dists, length, &tour);
+        let greedy_length = tour_length(&dists, &nearest_neighbour_tour(&dists));
+        assert!(length < greedy_length);
+    }
+}
@@ -0,0 +1,70 @@
+use crate::{algo::search::with_workspace, ds::graph::Graph, utils::trace};
+use rayon::prelude::*;
+use std::collections::HashSet;
+
+/// Road distances from `src` to every target, infinite for the unreachable
+/// ones. The search stops as soon as all targets are settled.
+pub fn one_to_many(g: &Graph, src: usize, targets: &[usize]) -> Vec<f64> {
+    if targets.is_empty() {
+        return vec![];
+    }
+    with_workspace(g.num_nodes(), |ws| {
+        // distinct targets still to settle; a stop can appear twice
+        let mut targets_left: HashSet<usize> = targets.iter().copied().collect();
+        ws.relax(src, 0.0, None, 0.0);
+        while let Some((node, _)) = ws.pop() {
+            if targets_left.remove(&node) && targets_left.is_empty() {
+                break;
+            }
+            let dist = ws.distance(node);
+            for (neighbour, weight) in g.neighbours(node) {
+                let alt = dist + weight;
+                ws.relax(neighbour, alt, Some(node), alt);
+            }
+        }
+        targets.iter().map(|&target| ws.distance(target)).collect()
+    })
+}
+
+/// `table[i][j]` is the road distance from `sources[i]` to `targets[j]`,
+/// computed with one search per source, in parallel.
+pub fn distance_table(g: &Graph, sources: &[usize], targets: &[usize]) -> Vec<Vec<f64>> {
+    let request_trace = trace::current();
+    sources
+        .par_iter()
+        .map(|&src| trace::scope(request_trace.clone(), || one_to_many(g, src, targets)))
+        .collect()
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::algo::shortest_paths::dijkstra;
+    use crate::ds::graph::GraphBuilder;
+
+    #[test]
+    fn test_distance_table_matches_dijkstra() {
+        let mut g = GraphBuilder::new(6);
+        g.add_edge(0, 1, 2.0);
+        g.add_edge(1, 2, 2.0);
+        g.add_edge(2, 0, 1.0);
+        g.add_edge(0, 3, 7.0);
+        g.add_edge(3, 4, 1.0);
+        g.add_edge(4, 1, 1.0);
+        g.add_edge(5, 4, 3.0);
+        let g = g.build();
+
+        let nodes = [0, 2, 4, 5];
+        let table = distance_table(&g, &nodes, &nodes);
+        for (i, &src) in nodes.iter().enumerate() {
+            for (j, &dest) in nodes.iter().enumerate() {
+                let expected = dijkstra(&g, src, dest).map_or(f64::INFINITY, |r| r.0);
+                assert_eq!(table[i][j], expected);
+            }
+        }
+        assert_eq!(table[0][3], f64::INFINITY);
+
+        // repeated targets get the same distance
+        assert_eq!(one_to_many(&g, 0, &[2, 4, 2]), vec![4.0, 8.0, 4.0]);
+    }
+}
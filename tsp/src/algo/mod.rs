@@ -1,2 +1,9 @@
+pub mod alt;
+pub mod ch;
+pub mod components;
+pub mod held_karp;
+pub mod local_search;
+pub mod many_to_many;
+pub mod search;
 pub mod shortest_paths;
 pub mod tsp_solver;
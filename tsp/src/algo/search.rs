@@ -0,0 +1,332 @@
+use crate::utils::{metrics::METRICS, trace};
+use std::cell::{Cell, RefCell};
+
+const NONE: u32 = u32::MAX;
+const SETTLED: u32 = u32::MAX - 1;
+
+#[derive(Copy, Clone)]
+struct NodeState {
+    dist: f64,
+    stamp: u32,
+    // index in the heap, `NONE` when never queued or `SETTLED` once popped
+    pos: u32,
+    prev: u32,
+    // cached heuristic value, NaN until computed
+    potential: f32,
+}
+
+/// Per-query state of a shortest path search over a graph of fixed size.
+///
+/// Node state is stamped with a generation number, so `reset` is O(1) and a
+/// query only pays for the nodes it touches. The priority queue inserts nodes
+/// lazily when they are first reached and keeps heap positions in the dense
+/// state array, so decrease-key needs no hashing.
+pub struct SearchWorkspace {
+    generation: u32,
+    nodes: Vec<NodeState>,
+    heap: Vec<(f64, u32)>,
+    settled: usize,
+}
+
+impl SearchWorkspace {
+    pub fn new(num_nodes: usize) -> Self {
+        Self {
+            generation: 1,
+            nodes: vec![
+                NodeState {
+                    dist: f64::INFINITY,
+                    stamp: 0,
+                    pos: NONE,
+                    prev: NONE,
+                    potential: f32::NAN,
+                };
+                num_nodes
+            ],
+            heap: vec![],
+            settled: 0,
+        }
+    }
+
+    pub fn num_nodes(&self) -> usize {
+        self.nodes.len()
+    }
+
+    pub fn reset(&mut self) {
+        self.generation = self.generation.wrapping_add(1);
+        if self.generation == 0 {
+            for node in self.nodes.iter_mut() {
+                node.stamp = 0;
+            }
+            self.generation = 1;
+        }
+        self.heap.clear();
+        self.settled = 0;
+    }
+
+    #[inline]
+    fn touch(&mut self, v: usize) -> &mut NodeState {
+        let generation = self.generation;
+        let node = &mut self.nodes[v];
+        if node.stamp != generation {
+            *node = NodeState {
+                dist: f64::INFINITY,
+                stamp: generation,
+                pos: NONE,
+                prev: NONE,
+                potential: f32::NAN,
+            };
+        }
+        node
+    }
+
+    #[inline]
+    fn state(&self, v: usize) -> Option<&NodeState> {
+        let node = &self.nodes[v];
+        if node.stamp == self.generation {
+            Some(node)
+        } else {
+            None
+        }
+    }
+
+    /// Tentative distance of `v`, infinite when it has not been reached.
+    #[inline]
+    pub fn distance(&self, v: usize) -> f64 {
+        self.state(v).map_or(f64::INFINITY, |node| node.dist)
+    }
+
+    pub fn is_reached(&self, v: usize) -> bool {
+        self.distance(v) < f64::INFINITY
+    }
+
+    pub fn is_settled(&self, v: usize) -> bool {
+        self.state(v).map_or(false, |node| node.pos == SETTLED)
+    }
+
+    pub fn parent(&self, v: usize) -> Option<usize> {
+        match self.state(v) {
+            Some(node) if node.prev != NONE => Some(node.prev as usize),
+            _ => None,
+        }
+    }
+
+    #[inline]
+    pub fn potential(&self, v: usize) -> Option<f64> {
+        match self.state(v) {
+            Some(node) if !node.potential.is_nan() => Some(node.potential as f64),
+            _ => None,
+        }
+    }
+
+    #[inline]
+    pub fn set_potential(&mut self, v: usize, potential: f64) {
+        self.touch(v).potential = potential as f32;
+    }
+
+    /// Number of nodes popped since the last reset.
+    pub fn settled_count(&self) -> usize {
+        self.settled
+    }
+
+    pub fn is_empty(&self) -> bool {
+        self.heap.is_empty()
+    }
+
+    pub fn peek_key(&self) -> Option<f64> {
+        self.heap.first().map(|&(key, _)| key)
+    }
+
+    /// Lowers the distance of `v` to `dist` if that is an improvement and
+    /// (re)queues it with priority `key`. Returns whether `v` was updated.
+    #[inline]
+    pub fn relax(&mut self, v: usize, dist: f64, parent: Option<usize>, key: f64) -> bool {
+        let node = self.touch(v);
+        if dist >= node.dist {
+            return false;
+        }
+        node.dist = dist;
+        node.prev = parent.map_or(NONE, |p| p as u32);
+        let pos = node.pos;
+        if pos == NONE || pos == SETTLED {
+            self.heap.push((key, v as u32));
+            let i = self.heap.len() - 1;
+            self.nodes[v].pos = i as u32;
+            self.sift_up(i);
+        } else {
+            self.heap[pos as usize].0 = key;
+            self.sift_up(pos as usize);
+        }
+        true
+    }
+
+    /// Removes the node with the smallest key and marks it settled.
+    #[inline]
+    pub fn pop(&mut self) -> Option<(usize, f64)> {
+        if self.heap.is_empty() {
+            return None;
+        }
+        let (key, v) = self.heap.swap_remove(0);
+        self.nodes[v as usize].pos = SETTLED;
+        if !self.heap.is_empty() {
+            let moved = self.heap[0].1 as usize;
+            self.nodes[moved].pos = 0;
+            self.sift_down(0);
+        }
+        self.settled += 1;
+        Some((v as usize, key))
+    }
+
+    /// Follows the parent pointers from `v` back to the source.
+    pub fn path_to(&self, v: usize) -> Vec<usize> {
+        let mut path = vec![v];
+        let mut current = v;
+        while let Some(parent) = self.parent(current) {
+            path.push(parent);
+            current = parent;
+        }
+        path.reverse();
+        path
+    }
+
+    fn sift_up(&mut self, mut i: usize) {
+        let entry = self.heap[i];
+        while i > 0 {
+            let parent = (i - 1) / 2;
+            if self.heap[parent].0 <= entry.0 {
+                break;
+            }
+            self.heap[i] = self.heap[parent];
+            self.nodes[self.heap[i].1 as usize].pos = i as u32;
+            i = parent;
+        }
+        self.heap[i] = entry;
+        self.nodes[entry.1 as usize].pos = i as u32;
+    }
+
+    fn sift_down(&mut self, mut i: usize) {
+        let entry = self.heap[i];
+        let len = self.heap.len();
+        loop {
+            let left = 2 * i + 1;
+            if left >= len {
+                break;
+            }
+            let right = left + 1;
+            let child = if right < len && self.heap[right].0 < self.heap[left].0 {
+                right
+            } else {
+                left
+            };
+            if self.heap[child].0 >= entry.0 {
+                break;
+            }
+            self.heap[i] = self.heap[child];
+            self.nodes[self.heap[i].1 as usize].pos = i as u32;
+            i = child;
+        }
+        self.heap[i] = entry;
+        self.nodes[entry.1 as usize].pos = i as u32;
+    }
+}
+
+thread_local! {
+    // Workspaces are kept per thread and handed out one per active search,
+    // so nested searches (e.g. the two directions of a bidirectional query)
+    // each get their own.
+    static WORKSPACES: RefCell<Vec<SearchWorkspace>> = RefCell::new(vec![]);
+    // Workspaces in use and nodes they settled; nested searches are
+    // reported together as one when the outermost ends.
+    static ACTIVE_SEARCH: Cell<(usize, usize)> = Cell::new((0, 0));
+}
+
+// One workspace in use; leaves the active search when dropped, even if the
+// search panicked.
+struct SearchScope {
+    settled: usize,
+}
+
+impl SearchScope {
+    fn enter() -> Self {
+        ACTIVE_SEARCH.with(|active| active.set((active.get().0 + 1, active.get().1)));
+        Self { settled: 0 }
+    }
+}
+
+impl Drop for SearchScope {
+    fn drop(&mut self) {
+        ACTIVE_SEARCH.with(|active| {
+            let (depth, total) = active.get();
+            if depth == 1 {
+                METRICS.settled_nodes.observe((total + self.settled) as f64);
+                trace::add("settled_nodes", (total + self.settled) as u64);
+                active.set((0, 0));
+            } else {
+                active.set((depth - 1, total + self.settled));
+            }
+        });
+    }
+}
+
+/// Runs `f` with a reset workspace for a graph of `num_nodes` nodes, reusing
+/// the ones cached on the current thread.
+pub fn with_workspace<R>(num_nodes: usize, f: impl FnOnce(&mut SearchWorkspace) -> R) -> R {
+    let cached = WORKSPACES.with(|pool| {
+        let mut pool = pool.borrow_mut();
+        let i = pool.iter().position(|ws| ws.num_nodes() == num_nodes)?;
+        Some(pool.swap_remove(i))
+    });
+    let mut ws = cached.unwrap_or_else(|| SearchWorkspace::new(num_nodes));
+    ws.reset();
+    let mut scope = SearchScope::enter();
+    let result = f(&mut ws);
+    scope.settled = ws.settled_count();
+    WORKSPACES.with(|pool| pool.borrow_mut().push(ws));
+    result
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn test_workspace_queue_order() {
+        let mut ws = SearchWorkspace::new(6);
+        ws.relax(3, 5.0, None, 5.0);
+        ws.relax(4, 3.0, None, 3.0);
+        ws.relax(5, 4.0, None, 4.0);
+        ws.relax(1, 1.0, None, 1.0);
+        assert!(ws.relax(3, 0.5, Some(1), 0.5));
+        assert!(!ws.relax(4, 3.5, None, 3.5));
+
+        let order: Vec<usize> = std::iter::from_fn(|| ws.pop().map(|(v, _)| v)).collect();
+        assert_eq!(order, vec![3, 1, 4, 5]);
+        assert_eq!(ws.settled_count(), 4);
+        assert_eq!(ws.path_to(3), vec![1, 3]);
+    }
+
+    #[test]
+    fn test_workspace_reset_forgets_previous_query() {
+        let mut ws = SearchWorkspace::new(3);
+        ws.relax(0, 0.0, None, 0.0);
+        ws.relax(2, 7.0, Some(0), 7.0);
+        ws.set_potential(2, 1.0);
+        ws.reset();
+        assert_eq!(ws.distance(2), f64::INFINITY);
+        assert_eq!(ws.parent(2), None);
+        assert_eq!(ws.potential(2), None);
+        assert!(ws.is_empty());
+    }
+
+    #[test]
+    fn test_with_workspace_nested() {
+        let total = with_workspace(4, |outer| {
+            outer.relax(0, 1.0, None, 1.0);
+            with_workspace(4, |inner| {
+                assert_eq!(inner.distance(0), f64::INFINITY);
+                inner.relax(0, 2.0, None, 2.0);
+            });
+            outer.distance(0)
+        });
+        assert_eq!(total, 1.0);
+    }
+}
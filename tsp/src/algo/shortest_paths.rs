@@ -1,167 +1,194 @@
-pub use crate::ds::graph::Graph;
-pub use crate::ds::priority_queue::MinHeap;
-use crate::{
-    ds::priority_queue::Prioritiness,
-    utils::{
-        coordinate::{Coordinate, self}, create_adjacency_list_from_files,
-        create_id_to_coordinates_hashmap_from_file,
-    }, routes::shortestpath::approximate_coordinate, global::Data,
-};
-use dotenvy::dotenv;
+pub use crate::algo::search::{with_workspace, SearchWorkspace};
+pub use crate::ds::graph::{Graph, GraphBuilder};
+use crate::ds::coordinates::CoordinateTable;
 use geoutils::Location;
-use rand::Rng;
-use rocket::State;
-use std::{collections::HashMap, env, error::Error, time::Instant};
+use std::error::Error;
 
-const INFINITY: f64 = 9999999.0;
+// Both searches insert nodes into the queue only when they are reached and
+// run on the calling thread's cached workspace, so their cost depends on the
+// area explored rather than on the size of the graph. They return the
+// distance and the node path from `src` to `dest`.
 
-#[derive(Copy, Clone, Debug)]
-pub struct NodeInfo {
-    pub distance: f64,
-    pub id: usize,
+pub fn dijkstra(g: &Graph, src: usize, dest: usize) -> Result<(f64, Vec<usize>), Box<dyn Error>> {
+    with_workspace(g.num_nodes(), |ws| {
+        ws.relax(src, 0.0, None, 0.0);
+        while let Some((node, _)) = ws.pop() {
+            if node == dest {
+                return Ok((ws.distance(dest), ws.path_to(dest)));
+            }
+            let dist = ws.distance(node);
+            for (neighbour, weight) in g.neighbours(node) {
+                let alt = dist + weight;
+                ws.relax(neighbour, alt, Some(node), alt);
+            }
+        }
+        Err("No path found".into())
+    })
 }
 
-impl NodeInfo {
-    fn new(distance: f64, id: usize) -> Self {
-        Self { distance, id }
-    }
+pub fn astar(
+    g: &Graph,
+    map: &CoordinateTable,
+    src: usize,
+    dest: usize,
+    heuristic: &dyn Fn(&CoordinateTable, usize, usize) -> f64,
+) -> Result<(f64, Vec<usize>), Box<dyn Error>> {
+    with_workspace(g.num_nodes(), |ws| {
+        ws.relax(src, 0.0, None, heuristic(map, src, dest));
+        while let Some((node, _)) = ws.pop() {
+            if node == dest {
+                return Ok((ws.distance(dest), ws.path_to(dest)));
+            }
+            let dist = ws.distance(node);
+            for (neighbour, weight) in g.neighbours(node) {
+                let alt = dist + weight;
+                if alt >= ws.distance(neighbour) {
+                    continue;
+                }
+                // the heuristic is evaluated once per reached node
+                let h = match ws.potential(neighbour) {
+                    Some(h) => h,
+                    None => {
+                        let h = heuristic(map, neighbour, dest);
+                        ws.set_potential(neighbour, h);
+                        h
+                    }
+                };
+                ws.relax(neighbour, alt, Some(node), alt + h);
+            }
+        }
+        Err("No path found".into())
+    })
 }
 
-impl Prioritiness for NodeInfo {
-    fn priority(&self) -> f64 {
-        self.distance
-    }
-
-    fn change_priority(&mut self, new_p: f64) {
-        self.distance = new_p
-    }
-
-    fn id(&self) -> usize {
-        self.id
-    }
+/// Bidirectional Dijkstra: searches forward from `src` on `g` and backward
+/// from `dest` on `reverse` (see `Graph::reverse`), always expanding the
+/// side with the smaller queue head, and stops once the two heads together
+/// reach the best meeting distance found.
+pub fn bidirectional_dijkstra(
+    g: &Graph,
+    reverse: &Graph,
+    src: usize,
+    dest: usize,
+) -> Result<(f64, Vec<usize>), Box<dyn Error>> {
+    bidirectional(g, reverse, src, dest, &|_| 0.0)
 }
 
-pub fn dijkstra(
+/// Bidirectional A*. Both sides use the average potential
+/// `(h(v, dest) - h(src, v)) / 2`, which stays consistent in both
+/// directions, so the same stopping rule as the plain search applies to the
+/// queue keys. `heuristic` must be a lower bound in both arguments, as the
+/// haversine distance and the landmark bounds are.
+pub fn bidirectional_astar(
     g: &Graph,
+    reverse: &Graph,
+    map: &CoordinateTable,
     src: usize,
     dest: usize,
-) -> Result<(f64, Vec<Option<NodeInfo>>), Box<dyn Error>> {
-    let mut dist: Vec<f64> = vec![];
-    let mut prev = vec![];
-    let mut visited = vec![];
-    let mut q = MinHeap::new();
-    for i in 0..g.edges.len() {
-        dist.push(INFINITY);
-        prev.push(None);
-        visited.push(false);
-        if i == src {
-            dist[i] = 0.0;
-        }
-        q.insert(NodeInfo::new(dist[i], i));
-    }
-    while !q.is_empty() {
-        let node = q.extract_min();
-        if node.id == dest {
-            break;
-        }
-        visited[node.id] = true;
-        for (i, &neighbour) in g.edges[node.id].iter().enumerate() {
-            if visited[neighbour] {
-                continue;
-            }
-            let alt = dist[node.id] + g.weights[node.id][i];
-            if alt < dist[neighbour] {
-                dist[neighbour] = alt;
-                prev[neighbour] = Some(node);
-                q.change_priority(neighbour, alt);
-            }
-        }
-    }
-    if dist[dest] == INFINITY {
-        return Err("No path found".into());
-    }
-    Ok((dist[dest], prev))
+    heuristic: &dyn Fn(&CoordinateTable, usize, usize) -> f64,
+) -> Result<(f64, Vec<usize>), Box<dyn Error>> {
+    let potential = |v: usize| (heuristic(map, v, dest) - heuristic(map, src, v)) / 2.0;
+    bidirectional(g, reverse, src, dest, &potential)
 }
 
-pub fn astar(
+fn bidirectional<P: Fn(usize) -> f64>(
     g: &Graph,
-    map: &HashMap<usize, Coordinate>,
+    reverse: &Graph,
     src: usize,
     dest: usize,
-    heuristic: &dyn Fn(&HashMap<usize, Coordinate>, usize, usize) -> f64,
-) -> Result<(f64, Vec<Option<NodeInfo>>), Box<dyn Error>> {
-    let mut dist: Vec<f64> = vec![];
-    let mut prev = vec![];
-    let mut visited = vec![];
-    let mut q = MinHeap::new();
-    for i in 0..g.edges.len() {
-        dist.push(INFINITY);
-        prev.push(None);
-        visited.push(false);
-        if i == src {
-            dist[i] = 0.0;
-        }
-        q.insert(NodeInfo::new(dist[i], i));
+    potential: &P,
+) -> Result<(f64, Vec<usize>), Box<dyn Error>> {
+    if src == dest {
+        return Ok((0.0, vec![src]));
     }
-    while !q.is_empty() {
-        let node = q.extract_min();
-        if node.id == dest {
-            break;
-        }
-        visited[node.id] = true;
-        for (i, &neighbour) in g.edges[node.id].iter().enumerate() {
-            if visited[neighbour] {
-                continue;
+    with_workspace(g.num_nodes(), |forward| {
+        with_workspace(g.num_nodes(), |backward| {
+            forward.relax(src, 0.0, None, potential(src));
+            backward.relax(dest, 0.0, None, -potential(dest));
+            let mut best = f64::INFINITY;
+            let mut meeting = None;
+            while let (Some(forward_key), Some(backward_key)) = (forward.peek_key(), backward.peek_key()) {
+                if forward_key + backward_key >= best {
+                    break;
+                }
+                if forward_key <= backward_key {
+                    expand(g, forward, backward, |v| potential(v), &mut best, &mut meeting);
+                } else {
+                    expand(reverse, backward, forward, |v| -potential(v), &mut best, &mut meeting);
+                }
             }
-            let alt = dist[node.id] + g.weights[node.id][i] - heuristic(map, node.id, dest)
-                + heuristic(map, neighbour, dest);
-            if alt < dist[neighbour] {
-                dist[neighbour] = alt;
-                prev[neighbour] = Some(node);
-                q.change_priority(neighbour, alt);
+
+            // stitch src -> meeting with meeting -> dest
+            let meeting = meeting.ok_or("No path found")?;
+            let mut path = forward.path_to(meeting);
+            let mut tail = backward.path_to(meeting);
+            tail.pop();
+            path.extend(tail.into_iter().rev());
+            Ok((best, path))
+        })
+    })
+}
+
+// Settles the head of `ws` and relaxes its arcs, recording the best path
+// through any node the other side has already reached.
+fn expand<P: Fn(usize) -> f64>(
+    g: &Graph,
+    ws: &mut SearchWorkspace,
+    other: &SearchWorkspace,
+    potential: P,
+    best: &mut f64,
+    meeting: &mut Option<usize>,
+) {
+    let (node, _) = match ws.pop() {
+        Some(head) => head,
+        None => return,
+    };
+    let dist = ws.distance(node);
+    for (neighbour, weight) in g.neighbours(node) {
+        let alt = dist + weight;
+        if alt >= ws.distance(neighbour) {
+            continue;
+        }
+        let p = match ws.potential(neighbour) {
+            Some(p) => p,
+            None => {
+                let p = potential(neighbour);
+                ws.set_potential(neighbour, p);
+                p
             }
+        };
+        ws.relax(neighbour, alt, Some(node), alt + p);
+        let through = alt + other.distance(neighbour);
+        if through < *best {
+            *best = through;
+            *meeting = Some(neighbour);
         }
     }
-    if dist[dest] == INFINITY {
-        return Err("No path found".into());
-    }
-    Ok((dist[dest], prev))
 }
 
 pub fn harvesine_heuristic(
-    map_to_coordinates: &HashMap<usize, Coordinate>,
+    map_to_coordinates: &CoordinateTable,
     src: usize,
     dest: usize,
 ) -> f64 {
-    let src_coord = map_to_coordinates.get(&src).unwrap();
-    let dest_coord = map_to_coordinates.get(&dest).unwrap();
+    let src_coord = map_to_coordinates.get(src).unwrap();
+    let dest_coord = map_to_coordinates.get(dest).unwrap();
     let src_loc = Location::new(src_coord.lat, src_coord.lng);
     let dest_loc = Location::new(dest_coord.lat, dest_coord.lng);
     src_loc.haversine_distance_to(&dest_loc).meters()
 }
 
-pub fn reconstruct_path(
-    prev: Vec<Option<NodeInfo>>,
-    dest: usize,
-) -> Result<Vec<usize>, Box<dyn Error>> {
-    let mut path = vec![];
-    path.push(dest);
-    let mut current = dest;
-    while let Some(node) = prev[current] {
-        path.push(node.id);
-        current = node.id;
-    }
-    path.reverse();
-    Ok(path)
-}
-
 #[cfg(test)]
 mod tests {
     use super::*;
+    use crate::utils::{create_adjacency_list_from_files, create_id_to_coordinates_hashmap_from_file};
+    use dotenvy::dotenv;
+    use rand::{rngs::StdRng, Rng, SeedableRng};
+    use std::{env, time::Instant};
 
     #[test]
     fn test_dijkstra() {
-        let mut g = Graph::new(5);
+        let mut g = GraphBuilder::new(5);
         g.add_edge(0, 1, 1.0);
         g.add_edge(0, 2, 2.0);
         g.add_edge(1, 2, 1.0);
@@ -169,13 +196,14 @@ mod tests {
         g.add_edge(2, 3, 1.0);
         g.add_edge(2, 4, 2.0);
         g.add_edge(3, 4, 1.0);
+        let g = g.build();
         let prev = dijkstra(&g, 0, 4).unwrap();
         assert_eq!(prev.0, 4.0);
     }
 
     #[test]
     fn test_reconstruct_path() {
-        let mut g = Graph::new(5);
+        let mut g = GraphBuilder::new(5);
         g.add_edge(0, 1, 1.0);
         g.add_edge(0, 2, 2.0);
         g.add_edge(1, 2, 1.0);
@@ -183,23 +211,116 @@ mod tests {
         g.add_edge(2, 3, 1.0);
         g.add_edge(2, 4, 2.0);
         g.add_edge(3, 4, 1.0);
+        let g = g.build();
         let prev = dijkstra(&g, 0, 4).unwrap();
-        let path = reconstruct_path(prev.1, 4).unwrap();
+        let path = prev.1;
         assert_eq!(path, vec![0, 2, 4]);
     }
 
     #[test]
     fn test_reconstruct_path2() {
-        let mut g = Graph::new(4);
+        let mut g = GraphBuilder::new(4);
         g.add_edge(0, 1, 1.0);
         g.add_edge(0, 2, 5.0);
         g.add_edge(3, 0, 2.0);
         g.add_edge(1, 2, 2.0);
+        let g = g.build();
         let prev = dijkstra(&g, 0, 2).unwrap();
-        let path = reconstruct_path(prev.1, 2).unwrap();
+        let path = prev.1;
         assert_eq!(path, vec![0, 1, 2]);
     }
 
+    #[test]
+    fn test_unreachable_destination() {
+        let mut g = GraphBuilder::new(3);
+        g.add_edge(0, 1, 1.0);
+        g.add_edge(2, 0, 1.0);
+        let g = g.build();
+        assert!(dijkstra(&g, 0, 2).is_err());
+        // the cached workspace must not leak state into the next query
+        assert_eq!(dijkstra(&g, 2, 1).unwrap(), (2.0, vec![2, 0, 1]));
+    }
+
+    #[test]
+    fn test_astar_matches_dijkstra() {
+        let map = CoordinateTable::from(
+            (0..4)
+                .map(|id| crate::utils::coordinate::Coordinate {
+                    lat: 4.6 + id as f64 * 0.001,
+                    lng: -74.08,
+                    id,
+                })
+                .collect::<Vec<_>>(),
+        );
+        let mut g = GraphBuilder::new(4);
+        g.add_edge(0, 1, 120.0);
+        g.add_edge(1, 3, 240.0);
+        g.add_edge(0, 2, 250.0);
+        g.add_edge(2, 3, 120.0);
+        g.add_edge(0, 3, 500.0);
+        let g = g.build();
+        let expected = dijkstra(&g, 0, 3).unwrap();
+        assert_eq!(astar(&g, &map, 0, 3, &harvesine_heuristic).unwrap(), expected);
+        assert_eq!(expected, (360.0, vec![0, 1, 3]));
+    }
+
+    #[test]
+    fn test_bidirectional_matches_dijkstra() {
+        // random points joined by arcs at least as long as the straight line,
+        // so the haversine heuristic is a valid bound
+        let mut rng = StdRng::seed_from_u64(12);
+        let n = 200;
+        let map = CoordinateTable::from(
+            (0..n)
+                .map(|id| crate::utils::coordinate::Coordinate {
+                    lat: 4.6 + rng.gen_range(0.0..0.05),
+                    lng: -74.1 + rng.gen_range(0.0..0.05),
+                    id,
+                })
+                .collect::<Vec<_>>(),
+        );
+        let mut g = GraphBuilder::new(n);
+        for u in 0..n {
+            for _ in 0..3 {
+                let v = rng.gen_range(0..n);
+                let w = harvesine_heuristic(&map, u, v) * rng.gen_range(1.0..1.5) + 1.0;
+                g.add_edge(u, v, w);
+                if rng.gen_range(0..4) > 0 {
+                    g.add_edge(v, u, w);
+                }
+            }
+        }
+        let g = g.build();
+        let reverse = g.reverse();
+
+        for src in (0..n).step_by(11) {
+            for dest in (0..n).step_by(7) {
+                let expected = dijkstra(&g, src, dest);
+                let plain = bidirectional_dijkstra(&g, &reverse, src, dest);
+                let guided = bidirectional_astar(&g, &reverse, &map, src, dest, &harvesine_heuristic);
+                match expected {
+                    Ok((distance, _)) => {
+                        for (found, path) in [plain.unwrap(), guided.unwrap()] {
+                            assert!((found - distance).abs() < 1e-3, "{} vs {}", found, distance);
+                            assert_eq!((path[0], path[path.len() - 1]), (src, dest));
+                            let length: f64 = path
+                                .windows(2)
+                                .map(|pair| {
+                                    g.neighbours(pair[0])
+                                        .filter(|&(v, _)| v == pair[1])
+                                        .map(|(_, w)| w)
+                                        .fold(f64::INFINITY, f64::min)
+                                })
+                                .sum();
+                            assert!((length - found).abs() < 1e-3);
+                        }
+                    }
+                    Err(_) => assert!(plain.is_err() && guided.is_err()),
+                }
+            }
+        }
+    }
+
     #[test]
     #[ignore]
     fn test_dijstra_running_time() {
@@ -207,11 +328,11 @@ mod tests {
         let coordinates_file = env::var("COORDINATES_FILE").unwrap();
         let arcs_file = env::var("ARCS_FILE").unwrap();
         let g = create_adjacency_list_from_files(&coordinates_file, &arcs_file).unwrap();
-        let start_point = rand::thread_rng().gen_range(0..g.edges.len());
-        let end_point = rand::thread_rng().gen_range(0..g.edges.len());
+        let start_point = rand::thread_rng().gen_range(0..g.num_nodes());
+        let end_point = rand::thread_rng().gen_range(0..g.num_nodes());
         let start = Instant::now();
         let prev = dijkstra(&g, start_point, end_point).unwrap();
-        let _path = reconstruct_path(prev.1, 1).unwrap();
+        let _path = prev.1;
         println!("Time: {:?}", start.elapsed());
     }
 
@@ -223,13 +344,13 @@ mod tests {
         let arcs_file = env::var("ARCS_FILE").unwrap();
         let g = create_adjacency_list_from_files(&coordinates_file, &arcs_file).unwrap();
         let map = create_id_to_coordinates_hashmap_from_file(&coordinates_file).unwrap();
-        let src = rand::thread_rng().gen_range(0..g.edges.len());
-        let dest = rand::thread_rng().gen_range(0..g.edges.len());
+        let src = rand::thread_rng().gen_range(0..g.num_nodes());
+        let dest = rand::thread_rng().gen_range(0..g.num_nodes());
 
         let prev2 = dijkstra(&g, src, dest).unwrap();
         let prev = astar(&g, &map, src, dest, &harvesine_heuristic).unwrap();
-        let path = reconstruct_path(prev.1, dest).unwrap();
-        let path2 = reconstruct_path(prev2.1, dest).unwrap();
+        let path = prev.1;
+        let path2 = prev2.1;
         assert_eq!(path, path2);
     }
 
@@ -241,17 +362,28 @@ mod tests {
         let arcs_file = env::var("ARCS_FILE").unwrap();
         let g = create_adjacency_list_from_files(&coordinates_file, &arcs_file).unwrap();
         let map = create_id_to_coordinates_hashmap_from_file(&coordinates_file).unwrap();
-        let src = rand::thread_rng().gen_range(0..g.edges.len());
-        let dest = rand::thread_rng().gen_range(0..g.edges.len());
+        let src = rand::thread_rng().gen_range(0..g.num_nodes());
+        let dest = rand::thread_rng().gen_range(0..g.num_nodes());
 
         let start = Instant::now();
         let prev = dijkstra(&g, src, dest).unwrap();
-        let _path = reconstruct_path(prev.1, dest).unwrap();
+        let _path = prev.1;
         println!("Dijkstra time: {:?}", start.elapsed());
 
         let start = Instant::now();
         let prev = astar(&g, &map, src, dest, &harvesine_heuristic).unwrap();
-        let _path = reconstruct_path(prev.1, dest).unwrap();
+        let _path = prev.1;
         println!("A* time: {:?}", start.elapsed());
+
+        let reverse = g.reverse();
+        let start = Instant::now();
+        let prev = bidirectional_dijkstra(&g, &reverse, src, dest).unwrap();
+        let _path = prev.1;
+        println!("Bidirectional Dijkstra time: {:?}", start.elapsed());
+
+        let start = Instant::now();
+        let prev = bidirectional_astar(&g, &reverse, &map, src, dest, &harvesine_heuristic).unwrap();
+        let _path = prev.1;
+        println!("Bidirectional A* time: {:?}", start.elapsed());
     }
 }
@@ -1,113 +1,110 @@
-use crate::algo::shortest_paths::{astar, harvesine_heuristic, reconstruct_path};
-use crate::ds::graph::Graph;
-use crate::utils::coordinate::Coordinate;
+use crate::algo::{
+    held_karp::{held_karp, memory_needed},
+    local_search::local_search_tour,
+};
+use crate::global::Data;
+use crate::utils::{
+    coordinate::Coordinate,
+    metrics::{Stage, METRICS},
+    trip::Solver,
+};
 use geoutils::Location;
-use std::{collections::HashMap, error::Error};
+use once_cell::sync::Lazy;
+use std::{collections::HashMap, env, error::Error, time::Duration};
+
+// Largest trip `Solver::Auto` hands to the exact solver.
+pub const MAX_EXACT_LOCATIONS: usize = 20;
+
+// Largest trip routed without a contraction hierarchy, 50 unless
+// MAX_LOCATIONS_WITHOUT_CH says otherwise. The distance matrix then takes
+// one Dijkstra per location, which the heuristic time budget does not cover.
+pub static MAX_LOCATIONS_WITHOUT_CH: Lazy<usize> = Lazy::new(|| {
+    env::var("MAX_LOCATIONS_WITHOUT_CH")
+        .ok()
+        .and_then(|n| n.parse().ok())
+        .unwrap_or(50)
+});
+
+// Pairs without a road path are priced at the straight-line distance times
+// this factor, so the tour stays defined and avoids them when it can.
+const UNREACHABLE_PENALTY: f64 = 10.0;
+
+// Largest Held-Karp table a single request may allocate, 256 MB unless
+// HELD_KARP_MEMORY_MB says otherwise. 20 locations need about 50 MB.
+static HELD_KARP_MEMORY_BUDGET: Lazy<usize> = Lazy::new(|| {
+    env::var("HELD_KARP_MEMORY_MB")
+        .ok()
+        .and_then(|mb| mb.parse::<usize>().ok())
+        .unwrap_or(256)
+        << 20
+});
+
+// Wall-clock time the local search may spend on a trip, 1 s unless
+// HEURISTIC_TIME_BUDGET_MS says otherwise.
+static HEURISTIC_TIME_BUDGET: Lazy<Duration> = Lazy::new(|| {
+    Duration::from_millis(
+        env::var("HEURISTIC_TIME_BUDGET_MS")
+            .ok()
+            .and_then(|ms| ms.parse().ok())
+            .unwrap_or(1000),
+    )
+});
 
 pub struct TspSolver<'a> {
-    pub road_network: &'a Graph,
-    pub id_to_coordinates: &'a HashMap<usize, Coordinate>,
+    pub state: &'a Data,
     pub path: Vec<usize>,
     pub distance: f64,
     pub nodes: Vec<Coordinate>,
+    pub road_nodes: Vec<usize>,
     pub new_nodes_to_original_nodes: HashMap<usize, usize>,
 }
 
 impl<'a> TspSolver<'a> {
-    pub fn new(
-        road_network: &'a Graph,
-        id_to_coordinates: &'a HashMap<usize, Coordinate>,
-        nodes: Vec<Coordinate>,
-    ) -> Self {
+    pub fn new(state: &'a Data, nodes: Vec<Coordinate>) -> Self {
         Self {
             nodes,
             path: vec![],
             distance: 0.0,
-            road_network,
-            id_to_coordinates,
+            state,
+            road_nodes: vec![],
             new_nodes_to_original_nodes: HashMap::new(),
         }
     }
 
     // it is assume that the first node is the starting node
-    pub fn held_karp_solve(&mut self) -> Result<Vec<usize>, Box<dyn Error>> {
-        let dists = self.get_distance_matrix();
-        let n = dists.len();
-
-        // Maps each subset of the nodes to the cost to reach that subset, as well
-        // as what node it passed before reaching this subset.
-        // Node subsets are represented as set bits.
-        let mut C = HashMap::<(i32, usize), (f64, usize)>::new();
-
-        // Set transition cost from initial state
-        for k in 1..n {
-            C.insert((1 << k, k), (dists[0][k], 0));
-        }
-
-        // Iterate subsets of increasing size
-        for subset_size in 2..n {
-            // Iterate over subsets of this size
-            for subset in (0..1 << n).filter(|s| i32::count_ones(*s) == subset_size as u32) {
-                // Iterate over last nodes in the subset
-                for k in 1..n {
-                    // Skip if k is not in the subset
-                    if (subset & (1 << k)) == 0 {
-                        continue;
-                    }
-
-                    // Find the minimum previous cost
-                    let mut min_prev = f64::INFINITY;
-                    let mut argmin_prev = 0;
-
-                    for m in 1..n {
-                        if (subset & (1 << m)) == 0 || m == k {
-                            continue;
-                        }
-
-                        let subset_without_k = subset ^ (1 << k);
-                        let cost = C.get(&(subset_without_k, m)).unwrap().0 + dists[m][k];
-                        if cost < min_prev {
-                            min_prev = cost;
-                            argmin_prev = m;
-                        }
-                    }
-
-                    C.insert((subset, k), (min_prev, argmin_prev));
-                }
-            }
+    pub fn solve(&mut self, solver: Solver) -> Result<Vec<usize>, Box<dyn Error>> {
+        match solver {
+            Solver::Exact => self.held_karp_solve(),
+            Solver::Heuristic => self.local_search_solve(),
+            Solver::Auto if self.nodes.len() <= MAX_EXACT_LOCATIONS => self.held_karp_solve(),
+            Solver::Auto => self.local_search_solve(),
         }
+    }
 
-        // We're interested in all bits but the least significant (the start state)
-        let mut subset = (1 << n) - 1 - 1;
-
-        // Find the minimum cost to get back to the start
-        let mut min_cost = f64::INFINITY;
-        let mut parent = 0;
-        for k in 1..n {
-            let cost = C.get(&(subset, k)).unwrap().0 + dists[k][0];
-            if cost < min_cost {
-                min_cost = cost;
-                parent = k;
-            }
+    pub fn held_karp_solve(&mut self) -> Result<Vec<usize>, Box<dyn Error>> {
+        // rejected before routing the whole matrix
+        let n = self.nodes.len();
+        if n > 1 && !memory_needed(n).map_or(false, |bytes| bytes <= *HELD_KARP_MEMORY_BUDGET) {
+            return Err(format!("{} locations are too many for the exact solver", n).into());
         }
+        let dists = self.get_distance_matrix()?;
+        METRICS.exact_sizes.observe(dists.len() as f64);
+        let (distance, tour) = METRICS.time(Stage::HeldKarp, || held_karp(&dists, *HELD_KARP_MEMORY_BUDGET))?;
+        self.set_tour(distance, tour)
+    }
 
-        self.path.push(0);
-
-        //Backtrack to find the actual path
-        for _ in 0..n - 1 {
-            self.path.push(parent);
-            let tmp = C.get(&(subset, parent)).unwrap().1;
-            subset = subset ^ (1 << parent);
-            parent = tmp;
-        }
+    pub fn local_search_solve(&mut self) -> Result<Vec<usize>, Box<dyn Error>> {
+        let dists = self.get_distance_matrix()?;
+        METRICS.heuristic_sizes.observe(dists.len() as f64);
+        let (distance, tour) = METRICS.time(Stage::LocalSearch, || local_search_tour(&dists, *HEURISTIC_TIME_BUDGET));
+        self.set_tour(distance, tour)
+    }
 
-        // Add the initial node to the end
-        self.path.push(0);
-        self.path.reverse();
+    fn set_tour(&mut self, distance: f64, tour: Vec<usize>) -> Result<Vec<usize>, Box<dyn Error>> {
+        self.distance = distance;
 
         // transform path to original nodes
-        self.path = self
-            .path
+        self.path = tour
             .iter()
             .map(|node| self.new_nodes_to_original_nodes[node])
             .collect();
@@ -116,25 +113,37 @@ impl<'a> TspSolver<'a> {
         Ok(self.path.to_owned())
     }
 
-    // compute the distance between every pair of nodes and store it in the graph
-    fn get_distance_matrix(&mut self) -> Vec<Vec<f64>> {
-        let mut distance_matrix = vec![vec![0.0; self.nodes.len()]; self.nodes.len()];
+    // snap every node to the road network and compute the road distance
+    // between every pair with one many-to-many query
+    fn get_distance_matrix(&mut self) -> Result<Vec<Vec<f64>>, Box<dyn Error>> {
+        let mut road_nodes = vec![];
+        let nearest = self.state.snap(&self.nodes, 1);
         for i in 0..self.nodes.len() {
             self.new_nodes_to_original_nodes.insert(i, self.nodes[i].id);
+            let road_node = nearest[i]
+                .first()
+                .ok_or("Location could not be matched to the road network")?;
+            road_nodes.push(*road_node);
+        }
+
+        let mut distance_matrix =
+            METRICS.time(Stage::DistanceMatrix, || self.state.distance_table(&road_nodes, &road_nodes));
+        for i in 0..self.nodes.len() {
             for j in 0..self.nodes.len() {
                 if i == j {
                     distance_matrix[i][j] = 0.0;
-                } else {
+                } else if distance_matrix[i][j].is_infinite() {
                     let i_coord = &self.nodes[i];
                     let j_coord = &self.nodes[j];
                     let i_location = Location::new(i_coord.lat, i_coord.lng);
                     let j_location = Location::new(j_coord.lat, j_coord.lng);
                     let distance = i_location.haversine_distance_to(&j_location);
-                    distance_matrix[i][j] = distance.meters();
+                    distance_matrix[i][j] = distance.meters() * UNREACHABLE_PENALTY;
                 }
             }
         }
-        distance_matrix
+        self.road_nodes = road_nodes;
+        Ok(distance_matrix)
     }
 
     fn expand_path(&mut self) -> Result<Vec<usize>, Box<dyn Error>> {
@@ -142,16 +151,8 @@ impl<'a> TspSolver<'a> {
         for i in 0..self.path.len() - 1 {
             let start = self.path[i];
             let end = self.path[i + 1];
-            let path = astar(
-                self.road_network,
-                self.id_to_coordinates,
-                start,
-                end,
-                &harvesine_heuristic,
-            )
-            .unwrap();
-            let path = reconstruct_path(path.1, end).unwrap();
-            new_path.extend(path);
+            let path = self.state.shortest_path(start, end).unwrap();
+            new_path.extend(path.1);
         }
         return Ok(new_path);
     }
@@ -160,6 +161,13 @@ impl<'a> TspSolver<'a> {
 #[cfg(test)]
 mod tests {
     use super::*;
+    use crate::ds::{
+        coordinates::CoordinateTable,
+        graph::GraphBuilder,
+        kdtree::KdTree,
+        segment_index::{SegmentIndex, DEFAULT_CELL_SIZE},
+    };
+    use crate::global::Caches;
     use crate::utils::{
         create_adjacency_list_from_files, create_id_to_coordinates_hashmap_from_file,
     };
@@ -182,4 +190,51 @@ mod tests {
         // );
         // let path = tsp_solver.held_karp_solve().unwrap();
     }
+
+    #[test]
+    fn test_tsp_solver_uses_road_distances() {
+        // four points on a line joined by a one-way loop 0 -> 1 -> 2 -> 3 -> 0:
+        // the straight-line tour would be 0 2 1 3, the road one follows the loop
+        let offsets = [0.0, 2.0, 1.0, 3.0];
+        let coordinates: Vec<Coordinate> = offsets
+            .iter()
+            .enumerate()
+            .map(|(id, x)| Coordinate {
+                lat: 4.6 + x * 0.001,
+                lng: -74.08,
+                id,
+            })
+            .collect();
+        let mut g = GraphBuilder::new(4);
+        for i in 0..4 {
+            g.add_edge(i, (i + 1) % 4, 100.0);
+        }
+        let graph = g.build();
+        let map_id_to_coordinates = CoordinateTable::from(coordinates.clone());
+        let state = Data {
+            segments: SegmentIndex::build(&graph, &map_id_to_coordinates, DEFAULT_CELL_SIZE),
+            reverse: graph.reverse(),
+            graph,
+            map_id_to_coordinates,
+            kd_tree: KdTree::new(coordinates.clone()),
+            ch: None,
+            landmarks: None,
+            caches: Caches::new(1 << 20),
+        };
+
+        let locations = coordinates
+            .iter()
+            .map(|c| Coordinate { id: c.id + 10, ..*c })
+            .collect();
+        let mut tsp = TspSolver::new(&state, locations);
+        assert_eq!(tsp.held_karp_solve().unwrap(), vec![10, 11, 12, 13, 10]);
+        assert_eq!(tsp.road_nodes, vec![0, 1, 2, 3]);
+        assert_eq!(tsp.local_search_solve().unwrap(), vec![10, 11, 12, 13, 10]);
+
+        // too many locations for the exact solver: rejected before routing
+        let many = (0..100).map(|id| Coordinate { id, ..coordinates[id % 4] }).collect();
+        let mut tsp = TspSolver::new(&state, many);
+        assert!(tsp.solve(Solver::Exact).is_err());
+        assert!(tsp.road_nodes.is_empty());
+    }
 }
@@ -0,0 +1,42 @@
+use dotenvy::dotenv;
+use std::{env, error::Error, process, time::Instant};
+use tsp::{
+    algo::ch::ContractionHierarchy,
+    utils,
+};
+
+fn main() {
+    dotenv().ok();
+    let args: Vec<String> = env::args().skip(1).collect();
+    let args: Vec<&str> = args.iter().map(String::as_str).collect();
+
+    let result = match &args[..] {
+        ["build", inputs @ .., output] if inputs.len() <= 2 => {
+            utils::load_graph_from_args(inputs).and_then(|graph| build(graph, output))
+        }
+        _ => {
+            eprintln!("{}", utils::graph_build_usage("ch", "output.ch"));
+            process::exit(2);
+        }
+    };
+
+    if let Err(error) = result {
+        eprintln!("error: {}", error);
+        process::exit(1);
+    }
+}
+
+fn build(graph: utils::Graph, output: &str) -> Result<(), Box<dyn Error>> {
+    let start = Instant::now();
+    let ch = ContractionHierarchy::build(&graph);
+    ch.save(output)?;
+    println!(
+        "Wrote {} ({} nodes, {} arcs, {} in the road network) in {:?}",
+        output,
+        ch.num_nodes(),
+        ch.num_arcs(),
+        graph.num_edges(),
+        start.elapsed()
+    );
+    Ok(())
+}
@@ -0,0 +1,48 @@
+use dotenvy::dotenv;
+use std::{env, error::Error, process, time::Instant};
+use tsp::{
+    algo::alt::{Landmarks, DEFAULT_LANDMARKS},
+    utils,
+};
+
+fn main() {
+    dotenv().ok();
+    let args: Vec<String> = env::args().skip(1).collect();
+    let args: Vec<&str> = args.iter().map(String::as_str).collect();
+
+    let result = match &args[..] {
+        ["build", inputs @ .., output] if inputs.len() <= 2 => {
+            utils::load_graph_from_args(inputs).and_then(|graph| build(graph, output))
+        }
+        _ => {
+            eprintln!(
+                "{}.\nLANDMARK_COUNT sets the number of landmarks (default 16)",
+                utils::graph_build_usage("landmarks", "output.lm")
+            );
+            process::exit(2);
+        }
+    };
+
+    if let Err(error) = result {
+        eprintln!("error: {}", error);
+        process::exit(1);
+    }
+}
+
+fn build(graph: utils::Graph, output: &str) -> Result<(), Box<dyn Error>> {
+    let count = match env::var("LANDMARK_COUNT") {
+        Ok(count) => count.parse()?,
+        Err(_) => DEFAULT_LANDMARKS,
+    };
+    let start = Instant::now();
+    let landmarks = Landmarks::build(&graph, count);
+    landmarks.save(output)?;
+    println!(
+        "Wrote {} ({} landmarks over {} nodes) in {:?}",
+        output,
+        landmarks.num_landmarks(),
+        landmarks.num_nodes(),
+        start.elapsed()
+    );
+    Ok(())
+}
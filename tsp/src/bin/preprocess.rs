@@ -0,0 +1,63 @@
+use std::{env, error::Error, process, time::Instant};
+use tsp::utils::preprocess::{preprocess_text_files, Islands};
+
+const USAGE: &str = "usage:
+    preprocess prune <nodes.txt> <edges.txt> <out-nodes.txt> <out-edges.txt> <id-map.txt>
+    preprocess tag <nodes.txt> <edges.txt> <out-nodes.txt> <out-edges.txt> <id-map.txt>
+
+Both renumber the nodes along a Hilbert curve. prune drops the nodes outside the largest
+strongly connected component; tag keeps them after it. Rebuild snapshots, CH and landmark
+files from the new text files";
+
+fn main() {
+    let args: Vec<String> = env::args().skip(1).collect();
+
+    let result = match args.iter().map(String::as_str).collect::<Vec<_>>()[..] {
+        ["prune", nodes, edges, out_nodes, out_edges, id_map] => {
+            preprocess(nodes, edges, out_nodes, out_edges, id_map, Islands::Prune)
+        }
+        ["tag", nodes, edges, out_nodes, out_edges, id_map] => {
+            preprocess(nodes, edges, out_nodes, out_edges, id_map, Islands::Tag)
+        }
+        _ => {
+            eprintln!("{}", USAGE);
+            process::exit(2);
+        }
+    };
+
+    if let Err(error) = result {
+        eprintln!("error: {}", error);
+        process::exit(1);
+    }
+}
+
+fn preprocess(
+    nodes: &str,
+    edges: &str,
+    out_nodes: &str,
+    out_edges: &str,
+    id_map: &str,
+    islands: Islands,
+) -> Result<(), Box<dyn Error>> {
+    let start = Instant::now();
+    let summary = preprocess_text_files(nodes, edges, out_nodes, out_edges, id_map, islands)?;
+    println!(
+        "{} strongly connected components, the largest with {} of {} nodes",
+        summary.components, summary.largest, summary.nodes
+    );
+    println!(
+        "Wrote {} and {} ({} nodes, {} of {} edges) and {} in {:?}",
+        out_nodes,
+        out_edges,
+        summary.kept_nodes,
+        summary.kept_edges,
+        summary.edges,
+        id_map,
+        start.elapsed()
+    );
+    println!(
+        "Mean id gap along an arc: {:.0} before, {:.0} after",
+        summary.arc_gap_before, summary.arc_gap_after
+    );
+    Ok(())
+}
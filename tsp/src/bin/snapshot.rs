@@ -0,0 +1,52 @@
+use dotenvy::dotenv;
+use std::{env, process, time::Instant};
+use tsp::utils::snapshot::{convert_text_files, Snapshot};
+
+const USAGE: &str = "usage:
+    snapshot convert [nodes.txt] [edges.txt] <output.snap>
+    snapshot verify <file.snap>
+
+convert falls back to COORDINATES_FILE and ARCS_FILE when only the output is given";
+
+fn main() {
+    dotenv().ok();
+    let args: Vec<String> = env::args().skip(1).collect();
+
+    let result = match args.iter().map(String::as_str).collect::<Vec<_>>()[..] {
+        ["convert", nodes, edges, output] => convert(nodes, edges, output),
+        ["convert", output] => match (env::var("COORDINATES_FILE"), env::var("ARCS_FILE")) {
+            (Ok(nodes), Ok(edges)) => convert(&nodes, &edges, output),
+            _ => Err("COORDINATES_FILE and ARCS_FILE must be set".into()),
+        },
+        ["verify", file] => verify(file),
+        _ => {
+            eprintln!("{}", USAGE);
+            process::exit(2);
+        }
+    };
+
+    if let Err(error) = result {
+        eprintln!("error: {}", error);
+        process::exit(1);
+    }
+}
+
+fn convert(nodes: &str, edges: &str, output: &str) -> Result<(), Box<dyn std::error::Error>> {
+    let start = Instant::now();
+    let summary = convert_text_files(nodes, edges, output)?;
+    println!(
+        "Wrote {} ({} nodes, {} edges) in {:?}",
+        output,
+        summary.nodes,
+        summary.edges,
+        start.elapsed()
+    );
+    verify(output)
+}
+
+fn verify(file: &str) -> Result<(), Box<dyn std::error::Error>> {
+    let start = Instant::now();
+    Snapshot::open(file)?.verify()?;
+    println!("{} is valid (checked in {:?})", file, start.elapsed());
+    Ok(())
+}
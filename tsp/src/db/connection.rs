@@ -1,13 +1,81 @@
-use core::panic;
 use diesel::pg::PgConnection;
-use diesel::prelude::*;
+use diesel::r2d2::{
+    event::{CheckoutEvent, HandleEvent, TimeoutEvent},
+    ConnectionManager, Pool, PooledConnection,
+};
 use dotenvy::dotenv;
 use std::env;
+use std::sync::atomic::{AtomicU64, Ordering};
+use std::time::Duration;
 
-pub fn establish_connection() -> PgConnection {
+pub type DbPool = Pool<ConnectionManager<PgConnection>>;
+pub type DbConnection = PooledConnection<ConnectionManager<PgConnection>>;
+
+static CHECKOUTS: AtomicU64 = AtomicU64::new(0);
+static TIMEOUTS: AtomicU64 = AtomicU64::new(0);
+static WAIT_MICROS: AtomicU64 = AtomicU64::new(0);
+
+/// Snapshot of the pool: connections open and idle, and cumulative
+/// checkouts, checkouts that timed out and time spent waiting for one.
+#[derive(Debug, Clone, Copy)]
+pub struct PoolStatus {
+    pub max_size: u32,
+    pub connections: u32,
+    pub idle: u32,
+    pub in_use: u32,
+    pub checkouts: u64,
+    pub timeouts: u64,
+    pub wait_micros: u64,
+}
+
+#[derive(Debug)]
+struct PoolMetrics;
+
+impl HandleEvent for PoolMetrics {
+    fn handle_checkout(&self, event: CheckoutEvent) {
+        CHECKOUTS.fetch_add(1, Ordering::Relaxed);
+        WAIT_MICROS.fetch_add(event.duration().as_micros() as u64, Ordering::Relaxed);
+    }
+
+    fn handle_timeout(&self, event: TimeoutEvent) {
+        TIMEOUTS.fetch_add(1, Ordering::Relaxed);
+        WAIT_MICROS.fetch_add(event.timeout().as_micros() as u64, Ordering::Relaxed);
+    }
+}
+
+/// Pool of DATABASE_POOL_SIZE connections (10 by default). Checkouts wait
+/// up to DATABASE_POOL_TIMEOUT_MS (5000 by default) for a free connection.
+/// Connections are opened in the background, so the server can start
+/// before Postgres accepts them.
+pub fn create_pool() -> DbPool {
     dotenv().ok();
 
     let database_url = env::var("DATABASE_URL").expect("DATABASE_URL must be set");
-    PgConnection::establish(&database_url)
-        .unwrap_or_else(|_| panic!("Error connecting to {}", database_url))
+    let max_size = env::var("DATABASE_POOL_SIZE")
+        .ok()
+        .and_then(|size| size.parse().ok())
+        .unwrap_or(10);
+    let timeout = env::var("DATABASE_POOL_TIMEOUT_MS")
+        .ok()
+        .and_then(|ms| ms.parse().ok())
+        .unwrap_or(5000);
+
+    Pool::builder()
+        .max_size(max_size)
+        .connection_timeout(Duration::from_millis(timeout))
+        .event_handler(Box::new(PoolMetrics))
+        .build_unchecked(ConnectionManager::<PgConnection>::new(database_url))
+}
+
+pub fn pool_status(pool: &DbPool) -> PoolStatus {
+    let state = pool.state();
+    PoolStatus {
+        max_size: pool.max_size(),
+        connections: state.connections,
+        idle: state.idle_connections,
+        in_use: state.connections - state.idle_connections,
+        checkouts: CHECKOUTS.load(Ordering::Relaxed),
+        timeouts: TIMEOUTS.load(Ordering::Relaxed),
+        wait_micros: WAIT_MICROS.load(Ordering::Relaxed),
+    }
 }
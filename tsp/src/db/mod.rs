@@ -1,4 +1,5 @@
 pub mod connection;
 pub mod models;
 pub mod users;
-pub mod trips;
\ No newline at end of file
+pub mod trips;
+pub mod trip_writer;
\ No newline at end of file
@@ -1,9 +1,17 @@
 use crate::schema::trips;
 use crate::db::models::users::User;
+use crate::utils::{geometry::decode_path, path::Path, trip::Location};
 use chrono::{self, NaiveDateTime};
-use diesel::{prelude::*, dsl};
-use serde::Serialize;
+use diesel::prelude::*;
+use serde::{Serialize, Serializer};
 use serde_json;
+use std::error::Error;
+
+/// `created_on` is stored in UTC without a zone; clients get it as RFC 3339
+/// with a `Z`, so browsers do not read it as local time.
+fn serialize_utc<S: Serializer>(created_on: &NaiveDateTime, serializer: S) -> Result<S::Ok, S::Error> {
+    serializer.collect_str(&created_on.format("%Y-%m-%dT%H:%M:%S%.6fZ"))
+}
 
 #[derive(Identifiable, Queryable, Associations, Serialize, Debug)]
 #[diesel(belongs_to(User))]
@@ -13,21 +21,59 @@ pub struct Trip {
     pub user_id: i32,
     pub title: Option<String>,
     pub locations: serde_json::Value,
-    pub path: serde_json::Value,
+    pub path: Option<serde_json::Value>,
     pub distance: f64,
     pub completed: bool,
-    pub created_on: NaiveDateTime
+    #[serde(serialize_with = "serialize_utc")]
+    pub created_on: NaiveDateTime,
+    #[serde(skip)]
+    pub geometry: Option<Vec<u8>>,
 }
 
-#[derive(Insertable, Associations, Debug)]
-#[diesel(belongs_to(User))]
+impl Trip {
+    /// Fills `path` with the JSON `Path` of trips stored as compact
+    /// geometry, so every trip is served in the same shape. Trips stored
+    /// before the geometry column existed already have it.
+    pub fn with_path(mut self) -> Result<Self, Box<dyn Error>> {
+        if self.path.is_none() {
+            let geometry = self.geometry.take().ok_or("Trip has no geometry")?;
+            let locations: Vec<Location> = serde_json::from_value(self.locations.clone())?;
+            let path = Path::new(
+                self.title.clone().unwrap_or_default(),
+                decode_path(&geometry)?,
+                self.distance,
+                &locations,
+            );
+            self.path = Some(serde_json::to_value(path)?);
+        }
+        Ok(self)
+    }
+}
+
+/// What the history list shows of a trip, read without the route.
+#[derive(Queryable, Selectable, Serialize, Debug)]
+#[diesel(table_name = trips)]
+pub struct TripSummary {
+    pub id: i32,
+    pub title: Option<String>,
+    pub locations: serde_json::Value,
+    pub distance: f64,
+    pub completed: bool,
+    #[serde(serialize_with = "serialize_utc")]
+    pub created_on: NaiveDateTime,
+}
+
+/// Owned row for batched inserts, so trips can be queued and written later.
+/// The route goes in `geometry`; `path` is only set by older versions.
+#[derive(Insertable, Debug)]
 #[diesel(table_name = trips)]
-pub struct NewTrip<'a> {
-    pub user_id: &'a i32,
-    pub title: &'a str,
-    pub locations: &'a serde_json::Value,
-    pub path: &'a serde_json::Value,
-    pub distance: &'a f64,
-    pub completed: &'a bool,
-    pub created_on: &'a dsl::now,
-}
\ No newline at end of file
+pub struct TripRecord {
+    pub user_id: i32,
+    pub title: String,
+    pub locations: serde_json::Value,
+    pub path: Option<serde_json::Value>,
+    pub distance: f64,
+    pub completed: bool,
+    pub created_on: NaiveDateTime,
+    pub geometry: Option<Vec<u8>>,
+}
@@ -0,0 +1,419 @@
+//! Write-behind persistence for computed trips.
+//!
+//! Handlers hand trips to a bounded queue and answer right away. A writer
+//! thread drains the queue and stores the trips with one multi-row insert
+//! per batch, retrying while the database is unavailable. Trips that can
+//! not be queued or written are appended to a spill file, which is written
+//! back once inserts succeed again, including after a restart, and only
+//! deleted once its trips are stored. Handlers
+//! never write the spill file themselves: a spill thread does, so a slow
+//! disk does not block the async workers.
+
+use crate::db::{
+    connection::DbPool,
+    models::trips::TripRecord,
+    trips::create_trips,
+};
+use crate::utils::{
+    geometry::encode_path,
+    metrics::{Stage, METRICS},
+    path::Path,
+    trip::Location,
+};
+use chrono::{NaiveDateTime, Utc};
+use diesel::result::{DatabaseErrorKind, Error as DieselError};
+use dotenvy::dotenv;
+use serde::{Deserialize, Serialize};
+use std::{
+    env,
+    error::Error,
+    fmt,
+    fs::{self, OpenOptions},
+    io::{BufRead, BufReader, ErrorKind, Write},
+    sync::{
+        mpsc::{self, Receiver, RecvTimeoutError, SyncSender, TrySendError},
+        Arc, Mutex,
+    },
+    thread,
+    time::{Duration, Instant},
+};
+
+// Postgres takes at most 65535 bind parameters per statement and every
+// trip row binds 8.
+const MAX_BATCH_SIZE: usize = 65535 / 8;
+const RETRIES: u32 = 3;
+const RETRY_DELAY: Duration = Duration::from_millis(250);
+
+/// A trip waiting to be stored. The creation time is taken when it is
+/// queued, not when it reaches the database, and is UTC whatever the time
+/// zone of the database; the `trips_created_on_utc` migration moved older
+/// rows to UTC as well.
+#[derive(Serialize, Deserialize, Debug)]
+pub struct PendingTrip {
+    pub user_id: i32,
+    pub title: String,
+    pub locations: Vec<Location>,
+    pub path: Path,
+    pub created_on: NaiveDateTime,
+}
+
+impl PendingTrip {
+    pub fn new(user_id: i32, title: String, locations: Vec<Location>, path: Path) -> Self {
+        Self {
+            user_id,
+            title,
+            locations,
+            path,
+            created_on: Utc::now().naive_utc(),
+        }
+    }
+
+    fn to_record(&self) -> Result<TripRecord, serde_json::Error> {
+        Ok(TripRecord {
+            user_id: self.user_id,
+            title: self.title.clone(),
+            locations: serde_json::to_value(&self.locations)?,
+            path: None,
+            distance: self.path.distance,
+            completed: false,
+            created_on: self.created_on,
+            geometry: Some(encode_path(&self.path.path)),
+        })
+    }
+}
+
+#[derive(Debug, Clone)]
+pub struct TripWriterConfig {
+    /// Trips per insert.
+    pub batch_size: usize,
+    /// Trips that can wait in memory before new ones are spilled.
+    pub queue_size: usize,
+    /// Longest time a trip waits for its batch to fill.
+    pub flush_interval: Duration,
+    pub spill_file: String,
+}
+
+impl TripWriterConfig {
+    /// TRIP_BATCH_SIZE (100), TRIP_QUEUE (1024), TRIP_FLUSH_MS (200) and
+    /// TRIP_SPILL_FILE ("trips.spill.jsonl").
+    pub fn from_env() -> Self {
+        dotenv().ok();
+        fn parse<T: std::str::FromStr>(name: &str, default: T) -> T {
+            env::var(name).ok().and_then(|value| value.parse().ok()).unwrap_or(default)
+        }
+        Self {
+            batch_size: parse("TRIP_BATCH_SIZE", 100),
+            queue_size: parse("TRIP_QUEUE", 1024),
+            flush_interval: Duration::from_millis(parse("TRIP_FLUSH_MS", 200)),
+            spill_file: parse("TRIP_SPILL_FILE", "trips.spill.jsonl".to_string()),
+        }
+    }
+}
+
+enum Message {
+    Trip(PendingTrip),
+    Flush(mpsc::Sender<()>),
+}
+
+/// Returned by `submit` when both the queue and the spill thread are
+/// full, so the trip can not be kept.
+#[derive(Debug)]
+pub struct WriterBusy;
+
+impl fmt::Display for WriterBusy {
+    fn fmt(&self, f: &mut fmt::Formatter<'_>) -> fmt::Result {
+        write!(f, "Trip queue and spill file are full")
+    }
+}
+
+impl Error for WriterBusy {}
+
+/// Handle to the writer and spill threads, kept in managed state.
+pub struct TripWriter {
+    sender: SyncSender<Message>,
+    spill_sender: SyncSender<PendingTrip>,
+}
+
+impl TripWriter {
+    pub fn start(pool: DbPool, config: TripWriterConfig) -> Self {
+        let batch_size = config.batch_size.clamp(1, MAX_BATCH_SIZE);
+        let (sender, receiver) = mpsc::sync_channel(config.queue_size.max(1));
+        let (spill_sender, spill_receiver) = mpsc::sync_channel(config.queue_size.max(1));
+        let spill = Arc::new(SpillFile::new(config.spill_file));
+        let writer_spill = spill.clone();
+        thread::Builder::new()
+            .name("trip-writer".to_string())
+            .spawn(move || run(pool, receiver, &writer_spill, batch_size, config.flush_interval))
+            .expect("Could not start the trip writer");
+        thread::Builder::new()
+            .name("trip-spill".to_string())
+            .spawn(move || run_spill(spill_receiver, &spill))
+            .expect("Could not start the trip spill thread");
+        Self { sender, spill_sender }
+    }
+
+    /// Queues `trip` without waiting for the database or the disk. When the
+    /// queue is full the trip is handed to the spill thread instead, and
+    /// when that is full too the caller gets `WriterBusy`.
+    pub fn submit(&self, trip: PendingTrip) -> Result<(), WriterBusy> {
+        let trip = match self.sender.try_send(Message::Trip(trip)) {
+            Ok(()) => return Ok(()),
+            Err(TrySendError::Full(message) | TrySendError::Disconnected(message)) => match message {
+                Message::Trip(trip) => trip,
+                Message::Flush(_) => return Ok(()),
+            },
+        };
+        self.spill_sender.try_send(trip).map_err(|_| WriterBusy)
+    }
+
+    /// Writes out everything queued so far, waiting at most `timeout`.
+    /// Returns whether the writer caught up in time.
+    pub fn flush(&self, timeout: Duration) -> bool {
+        let (done, wait) = mpsc::channel();
+        self.sender.send(Message::Flush(done)).is_ok() && wait.recv_timeout(timeout).is_ok()
+    }
+}
+
+fn run(pool: DbPool, receiver: Receiver<Message>, spill: &SpillFile, batch_size: usize, interval: Duration) {
+    // trips left on disk by an earlier run are written first
+    let mut pending = spill.take();
+    let mut replaying = !pending.is_empty();
+    let mut waiters = vec![];
+    let mut deadline = None;
+    loop {
+        if !pending.is_empty() && deadline.is_none() {
+            deadline = Some(Instant::now() + interval);
+        }
+        let message = match deadline {
+            Some(deadline) => receiver.recv_timeout(deadline.saturating_duration_since(Instant::now())),
+            None => receiver.recv().map_err(|_| RecvTimeoutError::Disconnected),
+        };
+        let closed = match message {
+            Ok(Message::Trip(trip)) => {
+                pending.push(trip);
+                false
+            }
+            Ok(Message::Flush(done)) => {
+                waiters.push(done);
+                false
+            }
+            Err(RecvTimeoutError::Timeout) => false,
+            Err(RecvTimeoutError::Disconnected) => true,
+        };
+
+        let due = deadline.map_or(false, |deadline| Instant::now() >= deadline);
+        if pending.len() >= batch_size || due || closed || !waiters.is_empty() {
+            let mut replay = false;
+            let mut kept = true;
+            for batch in pending.chunks(batch_size) {
+                match write_batch(&pool, batch) {
+                    Ok(()) => replay |= spill.exists(),
+                    Err(e) => {
+                        eprintln!("Could not store {} trips, spilling them: {}", batch.len(), e);
+                        if let Err(e) = spill.append(batch) {
+                            eprintln!("Could not spill trips, {} lost: {}", batch.len(), e);
+                            kept = false;
+                        }
+                    }
+                }
+            }
+            pending.clear();
+            deadline = None;
+            // the replayed trips are stored or back in the spill file, so
+            // their copy can go; if a spill failed it stays and is replayed
+            // again, at the cost of storing some trips twice
+            if replaying && kept {
+                spill.finish_replay();
+                replaying = false;
+            }
+            if replay || replaying {
+                pending = spill.take();
+                replaying = !pending.is_empty();
+            }
+            for done in waiters.drain(..) {
+                let _ = done.send(());
+            }
+        }
+        if closed && pending.is_empty() {
+            break;
+        }
+    }
+}
+
+// Appends the trips handed over by `submit`, one file sync for everything
+// waiting at that moment.
+fn run_spill(receiver: Receiver<PendingTrip>, spill: &SpillFile) {
+    while let Ok(trip) = receiver.recv() {
+        let mut batch = vec![trip];
+        batch.extend(receiver.try_iter());
+        if let Err(e) = spill.append(&batch) {
+            eprintln!("Could not spill trips, {} lost: {}", batch.len(), e);
+        }
+    }
+}
+
+// Stores `trips`, retrying with backoff while the database is unreachable.
+// A batch rejected by a constraint is written row by row so one bad trip
+// does not hold back the others; rejected rows are dropped.
+fn write_batch(pool: &DbPool, trips: &[PendingTrip]) -> Result<(), Box<dyn Error>> {
+    let records = trips
+        .iter()
+        .map(PendingTrip::to_record)
+        .collect::<Result<Vec<_>, _>>()?;
+    let mut attempt = 0;
+    loop {
+        let result = match pool.get() {
+            Ok(mut connection) => METRICS
+                .time(Stage::StoreTrips, || create_trips(&mut connection, &records))
+                .map_err(Box::<dyn Error>::from),
+            Err(e) => Err(e.into()),
+        };
+        match result {
+            Ok(_) => return Ok(()),
+            Err(e) if is_rejected(e.as_ref()) => {
+                if trips.len() == 1 {
+                    eprintln!("Dropping trip of user {}: {}", trips[0].user_id, e);
+                    return Ok(());
+                }
+                for trip in trips {
+                    write_batch(pool, std::slice::from_ref(trip))?;
+                }
+                return Ok(());
+            }
+            Err(e) if attempt == RETRIES => return Err(e),
+            Err(_) => {
+                thread::sleep(RETRY_DELAY * 2u32.pow(attempt));
+                attempt += 1;
+            }
+        }
+    }
+}
+
+fn is_rejected(e: &(dyn Error + 'static)) -> bool {
+    matches!(
+        e.downcast_ref::<DieselError>(),
+        Some(DieselError::DatabaseError(
+            DatabaseErrorKind::ForeignKeyViolation
+                | DatabaseErrorKind::UniqueViolation
+                | DatabaseErrorKind::NotNullViolation
+                | DatabaseErrorKind::CheckViolation,
+            _
+        ))
+    )
+}
+
+// Trips that could not be written, one JSON object per line. The writer
+// and spill threads both append to it, so access is serialised. Trips
+// being written back are moved to `<path>.replaying` and only deleted once
+// stored, and lines that can not be read are kept in `<path>.rejected`.
+struct SpillFile {
+    path: String,
+    replaying: String,
+    rejected: String,
+    lock: Mutex<()>,
+}
+
+impl SpillFile {
+    fn new(path: String) -> Self {
+        Self {
+            replaying: format!("{}.replaying", path),
+            rejected: format!("{}.rejected", path),
+            path,
+            lock: Mutex::new(()),
+        }
+    }
+
+    fn exists(&self) -> bool {
+        fs::metadata(&self.path).is_ok()
+    }
+
+    fn append(&self, trips: &[PendingTrip]) -> Result<(), Box<dyn Error>> {
+        let mut lines = vec![];
+        for trip in trips {
+            serde_json::to_writer(&mut lines, trip)?;
+            lines.push(b'\n');
+        }
+        let _guard = self.lock.lock().unwrap();
+        append_synced(&self.path, &lines)?;
+        Ok(())
+    }
+
+    // Trips to write back: those of an unfinished replay, or else the
+    // spill file, moved aside so new spills start a fresh one. The file
+    // stays on disk until `finish_replay`.
+    fn take(&self) -> Vec<PendingTrip> {
+        let _guard = self.lock.lock().unwrap();
+        if fs::metadata(&self.replaying).is_err() {
+            if let Err(e) = fs::rename(&self.path, &self.replaying) {
+                if e.kind() != ErrorKind::NotFound {
+                    eprintln!("Could not replay spilled trips: {}", e);
+                }
+                return vec![];
+            }
+        }
+        let file = match fs::File::open(&self.replaying) {
+            Ok(file) => file,
+            Err(e) => {
+                eprintln!("Could not read spilled trips: {}", e);
+                return vec![];
+            }
+        };
+
+        let mut trips = vec![];
+        let (mut readable, mut unreadable) = (vec![], vec![]);
+        for line in BufReader::new(file).lines().map_while(Result::ok) {
+            match serde_json::from_str(&line) {
+                Ok(trip) => {
+                    trips.push(trip);
+                    readable.extend_from_slice(line.as_bytes());
+                    readable.push(b'\n');
+                }
+                Err(_) if line.trim().is_empty() => {}
+                Err(_) => {
+                    unreadable.extend_from_slice(line.as_bytes());
+                    unreadable.push(b'\n');
+                }
+            }
+        }
+        if !unreadable.is_empty() {
+            // copied out first, then dropped from the replay, so a crash in
+            // between keeps them twice rather than not at all
+            let moved = append_synced(&self.rejected, &unreadable)
+                .and_then(|_| write_synced(&format!("{}.tmp", self.replaying), &readable))
+                .and_then(|_| fs::rename(format!("{}.tmp", self.replaying), &self.replaying));
+            match moved {
+                Ok(()) => eprintln!("Unreadable spilled trips kept in {}", self.rejected),
+                Err(e) => {
+                    eprintln!("Could not set aside unreadable spilled trips: {}", e);
+                    return vec![];
+                }
+            }
+        }
+        if trips.is_empty() {
+            let _ = fs::remove_file(&self.replaying);
+        }
+        trips
+    }
+
+    // Deletes the trips of the current replay, once they are stored.
+    fn finish_replay(&self) {
+        let _guard = self.lock.lock().unwrap();
+        if let Err(e) = fs::remove_file(&self.replaying) {
+            if e.kind() != ErrorKind::NotFound {
+                eprintln!("Could not remove replayed trips: {}", e);
+            }
+        }
+    }
+}
+
+fn append_synced(path: &str, bytes: &[u8]) -> std::io::Result<()> {
+    let mut file = OpenOptions::new().create(true).append(true).open(path)?;
+    file.write_all(bytes)?;
+    file.sync_data()
+}
+
+fn write_synced(path: &str, bytes: &[u8]) -> std::io::Result<()> {
+    let mut file = fs::File::create(path)?;
+    file.write_all(bytes)?;
+    file.sync_data()
+}
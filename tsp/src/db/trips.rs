@@ -1,49 +1,96 @@
-use crate::db::connection::establish_connection;
 use crate::db::models::trips::*;
-use crate::db::users::get_user_by_id;
-use crate::utils::path::Path;
 use crate::schema;
-use crate::utils::trip::Location;
+use chrono::NaiveDateTime;
+use diesel::pg::PgConnection;
 use diesel::prelude::*;
+use std::{fmt, str::FromStr};
 
-pub fn get_trips_by_user_id(query_id: &i32, page: i64) -> Result<Vec<Trip>, diesel::result::Error> {
+const CURSOR_TIME_FORMAT: &str = "%Y-%m-%dT%H:%M:%S%.6f";
+
+/// Position in a user's history, newest first: the page after it starts
+/// with the trips created before `created_on`, or at the same time with a
+/// smaller id. Written as `<created_on>_<id>`.
+#[derive(Debug, Clone, Copy, PartialEq)]
+pub struct HistoryCursor {
+    pub created_on: NaiveDateTime,
+    pub id: i32,
+}
+
+impl fmt::Display for HistoryCursor {
+    fn fmt(&self, f: &mut fmt::Formatter<'_>) -> fmt::Result {
+        write!(f, "{}_{}", self.created_on.format(CURSOR_TIME_FORMAT), self.id)
+    }
+}
+
+impl FromStr for HistoryCursor {
+    type Err = &'static str;
+
+    fn from_str(s: &str) -> Result<Self, Self::Err> {
+        let (created_on, id) = s.rsplit_once('_').ok_or("Invalid cursor")?;
+        Ok(HistoryCursor {
+            created_on: NaiveDateTime::parse_from_str(created_on, CURSOR_TIME_FORMAT).map_err(|_| "Invalid cursor")?,
+            id: id.parse().map_err(|_| "Invalid cursor")?,
+        })
+    }
+}
+
+/// Up to `limit` summaries of a user's trips after `after`, newest first.
+/// Served by the (user_id, created_on, id) index, so every page costs the
+/// same however deep it is.
+pub fn get_trip_summaries(
+    connection: &mut PgConnection,
+    query_id: i32,
+    after: Option<HistoryCursor>,
+    limit: i64,
+) -> Result<Vec<TripSummary>, diesel::result::Error> {
     use schema::trips::dsl::*;
 
-    let user = get_user_by_id(&query_id).unwrap();
-    
-    let connection = &mut establish_connection();
-    let results = Trip::belonging_to(&user)
-        .limit(5)
-        .offset(page)
-        .order_by(created_on.desc())
-        .load::<Trip>(connection)
-        .expect("Error loading trips");
-
-    Ok(results)
+    let mut query = trips
+        .filter(user_id.eq(query_id))
+        .select(TripSummary::as_select())
+        .order_by((created_on.desc(), id.desc()))
+        .limit(limit)
+        .into_boxed();
+    if let Some(after) = after {
+        query = query.filter(
+            created_on.lt(after.created_on)
+                .or(created_on.eq(after.created_on).and(id.lt(after.id))),
+        );
+    }
+    query.load::<TripSummary>(connection)
 }
 
-pub fn create_trip(
-        user_id: &i32,
-        title: &String,
-        locations: &Vec<Location>,
-        path: &Path,
-        distance: &f64,
-        completed: &bool,
-        created_on: &diesel::dsl::now
-    ) -> Result<Vec<Trip>, diesel::result::Error> {
-        use schema::trips;
-        let connection = &mut establish_connection();
-        let new_trip: NewTrip = NewTrip {
-            user_id,
-            title,
-            locations: &serde_json::to_value(locations).unwrap(),
-            path: &serde_json::to_value(path).unwrap(),
-            distance,
-            completed,
-            created_on,
-        };
-
-        diesel::insert_into(trips::table)
-            .values(&new_trip)
-            .get_results::<Trip>(connection)
-    }
\ No newline at end of file
+/// A trip with its route, if it belongs to the user.
+pub fn get_trip(connection: &mut PgConnection, query_id: i32, trip_id: i32) -> Result<Option<Trip>, diesel::result::Error> {
+    use schema::trips::dsl::*;
+
+    trips
+        .filter(id.eq(trip_id))
+        .filter(user_id.eq(query_id))
+        .first::<Trip>(connection)
+        .optional()
+}
+
+/// Inserts all `records` with one multi-row statement.
+pub fn create_trips(connection: &mut PgConnection, records: &[TripRecord]) -> Result<usize, diesel::result::Error> {
+    use schema::trips;
+
+    diesel::insert_into(trips::table)
+        .values(records)
+        .execute(connection)
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn test_history_cursor_round_trip() {
+        let created_on = NaiveDateTime::parse_from_str("2024-03-05 10:20:30.123456", "%Y-%m-%d %H:%M:%S%.f").unwrap();
+        let cursor = HistoryCursor { created_on, id: 42 };
+        assert_eq!(cursor.to_string(), "2024-03-05T10:20:30.123456_42");
+        assert_eq!(cursor.to_string().parse::<HistoryCursor>(), Ok(cursor));
+        assert!("42".parse::<HistoryCursor>().is_err());
+        assert!("yesterday_42".parse::<HistoryCursor>().is_err());
+    }
+}
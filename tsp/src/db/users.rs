@@ -1,13 +1,12 @@
-use crate::db::connection::{establish_connection};
 use crate::db::models::users::*;
 use crate::schema;
 use crate::utils::user::UserBriefDetails;
+use diesel::pg::PgConnection;
 use diesel::prelude::*;
 
-pub fn get_user(query: &str) -> Result<Vec<User>, diesel::result::Error> {
+pub fn get_user(connection: &mut PgConnection, query: &str) -> Result<Vec<User>, diesel::result::Error> {
     use self::schema::users::dsl::*;
 
-    let connection = &mut establish_connection();
     let results = users
         .filter(email.eq(&query).or(username.eq(&query)))
         .load::<User>(connection)
@@ -16,10 +15,9 @@ pub fn get_user(query: &str) -> Result<Vec<User>, diesel::result::Error> {
     Ok(results)
 }
 
-pub fn get_user_by_id(user_id: &i32) -> Result<User, diesel::result::Error> {
+pub fn get_user_by_id(connection: &mut PgConnection, user_id: &i32) -> Result<User, diesel::result::Error> {
     use self::schema::users::dsl::*;
 
-    let connection = &mut establish_connection();
     let result = users
         .find(user_id)
         .get_result::<User>(connection)
@@ -28,8 +26,20 @@ pub fn get_user_by_id(user_id: &i32) -> Result<User, diesel::result::Error> {
     Ok(result)
 }
 
-pub fn get_user_brief_details(user_id: &i32) -> Result<UserBriefDetails, diesel::result::Error> {
-    let user = get_user_by_id(user_id).unwrap();
+/// Whether `user_id` still exists under `name`, without loading the row.
+pub fn user_exists(connection: &mut PgConnection, user_id: i32, query_username: &str) -> Result<bool, diesel::result::Error> {
+    use self::schema::users::dsl::*;
+    use diesel::dsl::exists;
+
+    diesel::select(exists(users.filter(id.eq(user_id)).filter(username.eq(query_username))))
+        .get_result::<bool>(connection)
+}
+
+pub fn get_user_brief_details(
+    connection: &mut PgConnection,
+    user_id: &i32,
+) -> Result<UserBriefDetails, diesel::result::Error> {
+    let user = get_user_by_id(connection, user_id).unwrap();
     let user = UserBriefDetails {
         name: user.name,
         username: user.username,
@@ -40,6 +50,7 @@ pub fn get_user_brief_details(user_id: &i32) -> Result<UserBriefDetails, diesel:
 }
 
 pub fn create_user(
+    connection: &mut PgConnection,
     name: &String,
     username: &String,
     email: &String,
@@ -48,7 +59,6 @@ pub fn create_user(
     created_on: &diesel::dsl::now,
 ) -> Result<Vec<User>, diesel::result::Error> {
     use schema::users;
-    let connection = &mut establish_connection();
 
     let new_user: NewUser = NewUser {
         name,
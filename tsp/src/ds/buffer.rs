@@ -0,0 +1,108 @@
+use memmap2::Mmap;
+use std::{error::Error, fmt, marker::PhantomData, mem, ops::Deref, slice, sync::Arc};
+
+/// Element types that can be reinterpreted directly from the bytes of a
+/// little-endian snapshot file.
+///
+/// # Safety
+/// Implementors must be `Copy`, contain no padding and accept every bit pattern.
+pub unsafe trait Pod: Copy + Send + Sync + 'static {}
+
+unsafe impl Pod for u8 {}
+unsafe impl Pod for u32 {}
+unsafe impl Pod for u64 {}
+unsafe impl Pod for i32 {}
+unsafe impl Pod for f32 {}
+unsafe impl Pod for f64 {}
+
+/// A read-only array that is either owned on the heap or borrowed from a
+/// memory-mapped snapshot. Mapped buffers share the OS page cache, so every
+/// process that maps the same file uses a single copy of the data.
+pub enum Buffer<T: Pod> {
+    Owned(Vec<T>),
+    Mapped {
+        map: Arc<Mmap>,
+        offset: usize,
+        len: usize,
+        _marker: PhantomData<T>,
+    },
+}
+
+impl<T: Pod> Buffer<T> {
+    pub fn mapped(map: Arc<Mmap>, offset: usize, len: usize) -> Result<Self, Box<dyn Error>> {
+        let size = len
+            .checked_mul(mem::size_of::<T>())
+            .ok_or("Mapped buffer size overflows")?;
+        if offset.checked_add(size).map_or(true, |end| end > map.len()) {
+            return Err("Mapped buffer is out of bounds".into());
+        }
+        if (map.as_ptr() as usize + offset) % mem::align_of::<T>() != 0 {
+            return Err("Mapped buffer is not aligned".into());
+        }
+        Ok(Buffer::Mapped {
+            map,
+            offset,
+            len,
+            _marker: PhantomData,
+        })
+    }
+
+    pub fn is_mapped(&self) -> bool {
+        matches!(self, Buffer::Mapped { .. })
+    }
+
+    /// Reinterprets the elements as raw bytes, as they are laid out on disk.
+    pub fn as_bytes(&self) -> &[u8] {
+        as_bytes(self)
+    }
+}
+
+impl<T: Pod> Deref for Buffer<T> {
+    type Target = [T];
+
+    fn deref(&self) -> &[T] {
+        match self {
+            Buffer::Owned(v) => v,
+            Buffer::Mapped {
+                map, offset, len, ..
+            } => {
+                // bounds and alignment are checked in `Buffer::mapped`
+                unsafe { slice::from_raw_parts(map.as_ptr().add(*offset) as *const T, *len) }
+            }
+        }
+    }
+}
+
+impl<T: Pod> From<Vec<T>> for Buffer<T> {
+    fn from(v: Vec<T>) -> Self {
+        Buffer::Owned(v)
+    }
+}
+
+impl<T: Pod> Clone for Buffer<T> {
+    fn clone(&self) -> Self {
+        match self {
+            Buffer::Owned(v) => Buffer::Owned(v.clone()),
+            Buffer::Mapped {
+                map, offset, len, ..
+            } => Buffer::Mapped {
+                map: Arc::clone(map),
+                offset: *offset,
+                len: *len,
+                _marker: PhantomData,
+            },
+        }
+    }
+}
+
+impl<T: Pod> fmt::Debug for Buffer<T> {
+    fn fmt(&self, f: &mut fmt::Formatter<'_>) -> fmt::Result {
+        let kind = if self.is_mapped() { "Mapped" } else { "Owned" };
+        write!(f, "Buffer::{}(len = {})", kind, self.len())
+    }
+}
+
+/// Views a slice of plain-old-data values as its underlying bytes.
+pub fn as_bytes<T: Pod>(data: &[T]) -> &[u8] {
+    unsafe { slice::from_raw_parts(data.as_ptr() as *const u8, mem::size_of_val(data)) }
+}
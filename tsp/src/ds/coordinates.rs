@@ -0,0 +1,71 @@
+use crate::{ds::buffer::Buffer, utils::coordinate::Coordinate};
+
+/// Node coordinates stored as two flat arrays indexed by node id.
+#[derive(Debug, Clone)]
+pub struct CoordinateTable {
+    lat: Buffer<f64>,
+    lng: Buffer<f64>,
+}
+
+impl CoordinateTable {
+    pub fn new(lat: Buffer<f64>, lng: Buffer<f64>) -> Self {
+        assert_eq!(lat.len(), lng.len());
+        Self { lat, lng }
+    }
+
+    pub fn len(&self) -> usize {
+        self.lat.len()
+    }
+
+    pub fn is_empty(&self) -> bool {
+        self.lat.is_empty()
+    }
+
+    // ids missing from the source file are stored as NaN
+    pub fn get(&self, id: usize) -> Option<Coordinate> {
+        let lat = *self.lat.get(id)?;
+        let lng = self.lng[id];
+        if lat.is_nan() || lng.is_nan() {
+            return None;
+        }
+        Some(Coordinate { lat, lng, id })
+    }
+
+    pub fn latitudes(&self) -> &[f64] {
+        &self.lat
+    }
+
+    pub fn longitudes(&self) -> &[f64] {
+        &self.lng
+    }
+}
+
+impl From<Vec<Coordinate>> for CoordinateTable {
+    fn from(coordinates: Vec<Coordinate>) -> Self {
+        let len = coordinates.iter().map(|c| c.id + 1).max().unwrap_or(0);
+        let mut lat = vec![f64::NAN; len];
+        let mut lng = vec![f64::NAN; len];
+        for c in coordinates {
+            lat[c.id] = c.lat;
+            lng[c.id] = c.lng;
+        }
+        Self::new(lat.into(), lng.into())
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn test_coordinate_table_lookup() {
+        let table = CoordinateTable::from(vec![
+            Coordinate { lat: 4.6, lng: -74.0, id: 0 },
+            Coordinate { lat: 4.7, lng: -74.1, id: 2 },
+        ]);
+        assert_eq!(table.len(), 3);
+        assert_eq!(table.get(2).unwrap().lat, 4.7);
+        assert!(table.get(1).is_none());
+        assert!(table.get(3).is_none());
+    }
+}
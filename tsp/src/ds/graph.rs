@@ -1,19 +1,232 @@
-#[derive(Debug)]
+use crate::ds::buffer::Buffer;
+use std::{error::Error, iter::Zip, slice};
+
+/// Road network in compressed sparse row form: the arcs leaving node `u` are
+/// `targets[offsets[u]..offsets[u + 1]]`, with the matching `weights`.
+/// The arrays can be owned or mapped straight from a snapshot.
+#[derive(Debug, Clone)]
 pub struct Graph {
-    pub edges: Vec<Vec<usize>>,
-    pub weights: Vec<Vec<f64>>,
+    offsets: Buffer<u32>,
+    targets: Buffer<u32>,
+    weights: Buffer<f32>,
 }
 
 impl Graph {
-    pub fn new(n: usize) -> Self {
+    pub fn from_csr(
+        offsets: Buffer<u32>,
+        targets: Buffer<u32>,
+        weights: Buffer<f32>,
+    ) -> Result<Self, Box<dyn Error>> {
+        if offsets.is_empty() || offsets[0] != 0 {
+            return Err("Offsets must start at 0".into());
+        }
+        if targets.len() != weights.len() || *offsets.last().unwrap() as usize != targets.len() {
+            return Err("Offsets, targets and weights do not match".into());
+        }
+        Ok(Self {
+            offsets,
+            targets,
+            weights,
+        })
+    }
+
+    /// Full consistency check. It reads every arc, so mapped graphs are only
+    /// validated by the tools that write them.
+    pub fn validate(&self) -> Result<(), Box<dyn Error>> {
+        if self.offsets.windows(2).any(|w| w[0] > w[1]) {
+            return Err("Offsets must be non-decreasing".into());
+        }
+        let num_nodes = self.num_nodes();
+        if self.targets.iter().any(|&v| v as usize >= num_nodes) {
+            return Err("Arc target out of range".into());
+        }
+        Ok(())
+    }
+
+    pub fn num_nodes(&self) -> usize {
+        self.offsets.len() - 1
+    }
+
+    pub fn num_edges(&self) -> usize {
+        self.targets.len()
+    }
+
+    pub fn degree(&self, u: usize) -> usize {
+        (self.offsets[u + 1] - self.offsets[u]) as usize
+    }
+
+    /// Iterates over `(target, weight)` for the arcs leaving `u`.
+    #[inline]
+    pub fn neighbours(&self, u: usize) -> Neighbours<'_> {
+        let range = self.offsets[u] as usize..self.offsets[u + 1] as usize;
+        Neighbours {
+            inner: self.targets[range.clone()].iter().zip(self.weights[range].iter()),
+        }
+    }
+
+    pub fn offsets(&self) -> &[u32] {
+        &self.offsets
+    }
+
+    pub fn targets(&self) -> &[u32] {
+        &self.targets
+    }
+
+    pub fn weights(&self) -> &[f32] {
+        &self.weights
+    }
+
+    /// The same network with every arc turned around, for searches that run
+    /// backwards from the target. Reverse arcs into `v` keep the order of
+    /// their sources.
+    pub fn reverse(&self) -> Graph {
+        let num_nodes = self.num_nodes();
+        let mut offsets = vec![0u32; num_nodes + 1];
+        for &v in self.targets.iter() {
+            offsets[v as usize + 1] += 1;
+        }
+        for i in 0..num_nodes {
+            offsets[i + 1] += offsets[i];
+        }
+
+        let mut cursor = offsets[..num_nodes].to_vec();
+        let mut targets = vec![0u32; self.num_edges()];
+        let mut weights = vec![0f32; self.num_edges()];
+        for u in 0..num_nodes {
+            for arc in self.offsets[u] as usize..self.offsets[u + 1] as usize {
+                let v = self.targets[arc] as usize;
+                let at = cursor[v] as usize;
+                targets[at] = u as u32;
+                weights[at] = self.weights[arc];
+                cursor[v] += 1;
+            }
+        }
+
+        Graph {
+            offsets: offsets.into(),
+            targets: targets.into(),
+            weights: weights.into(),
+        }
+    }
+
+    pub fn is_mapped(&self) -> bool {
+        self.offsets.is_mapped() && self.targets.is_mapped() && self.weights.is_mapped()
+    }
+}
+
+pub struct Neighbours<'a> {
+    inner: Zip<slice::Iter<'a, u32>, slice::Iter<'a, f32>>,
+}
+
+impl<'a> Iterator for Neighbours<'a> {
+    type Item = (usize, f64);
+
+    #[inline]
+    fn next(&mut self) -> Option<(usize, f64)> {
+        self.inner.next().map(|(&v, &w)| (v as usize, w as f64))
+    }
+
+    fn size_hint(&self) -> (usize, Option<usize>) {
+        self.inner.size_hint()
+    }
+}
+
+impl<'a> ExactSizeIterator for Neighbours<'a> {}
+
+/// Collects arcs in any order and packs them into a `Graph`. Arcs keep
+/// their insertion order within each adjacency list.
+pub struct GraphBuilder {
+    num_nodes: usize,
+    arcs: Vec<(u32, u32, f32)>,
+}
+
+impl GraphBuilder {
+    pub fn new(num_nodes: usize) -> Self {
+        assert!(num_nodes < u32::MAX as usize, "Too many nodes for 32 bit ids");
         Self {
-            edges: vec![vec![]; n],
-            weights: vec![vec![]; n],
+            num_nodes,
+            arcs: vec![],
         }
     }
 
     pub fn add_edge(&mut self, u: usize, v: usize, w: f64) {
-        self.edges[u].push(v);
-        self.weights[u].push(w);
+        assert!(u < self.num_nodes && v < self.num_nodes, "Arc {} -> {} out of range", u, v);
+        self.arcs.push((u as u32, v as u32, w as f32));
+    }
+
+    pub fn num_nodes(&self) -> usize {
+        self.num_nodes
+    }
+
+    pub fn build(self) -> Graph {
+        assert!(self.arcs.len() <= u32::MAX as usize, "Too many arcs for 32 bit offsets");
+        let mut offsets = vec![0u32; self.num_nodes + 1];
+        for &(u, _, _) in &self.arcs {
+            offsets[u as usize + 1] += 1;
+        }
+        for i in 0..self.num_nodes {
+            offsets[i + 1] += offsets[i];
+        }
+
+        let mut cursor = offsets[..self.num_nodes].to_vec();
+        let mut targets = vec![0u32; self.arcs.len()];
+        let mut weights = vec![0f32; self.arcs.len()];
+        for (u, v, w) in self.arcs {
+            let at = cursor[u as usize] as usize;
+            targets[at] = v;
+            weights[at] = w;
+            cursor[u as usize] += 1;
+        }
+
+        Graph {
+            offsets: offsets.into(),
+            targets: targets.into(),
+            weights: weights.into(),
+        }
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn test_graph_builder() {
+        let mut builder = GraphBuilder::new(4);
+        builder.add_edge(2, 3, 1.5);
+        builder.add_edge(0, 1, 1.0);
+        builder.add_edge(0, 2, 2.0);
+        let g = builder.build();
+
+        assert_eq!(g.num_nodes(), 4);
+        assert_eq!(g.num_edges(), 3);
+        assert_eq!(g.neighbours(0).collect::<Vec<_>>(), vec![(1, 1.0), (2, 2.0)]);
+        assert_eq!(g.neighbours(1).len(), 0);
+        assert_eq!(g.neighbours(2).collect::<Vec<_>>(), vec![(3, 1.5)]);
+        assert_eq!(g.offsets(), &[0, 2, 2, 3, 3]);
+    }
+
+    #[test]
+    fn test_graph_reverse() {
+        let mut builder = GraphBuilder::new(3);
+        builder.add_edge(0, 2, 1.0);
+        builder.add_edge(1, 2, 2.0);
+        builder.add_edge(2, 0, 3.0);
+        let reverse = builder.build().reverse();
+
+        assert_eq!(reverse.num_edges(), 3);
+        assert_eq!(reverse.neighbours(0).collect::<Vec<_>>(), vec![(2, 3.0)]);
+        assert_eq!(reverse.neighbours(1).len(), 0);
+        assert_eq!(reverse.neighbours(2).collect::<Vec<_>>(), vec![(0, 1.0), (1, 2.0)]);
+    }
+
+    #[test]
+    fn test_graph_from_csr_rejects_bad_arrays() {
+        let graph = Graph::from_csr(vec![0, 1].into(), vec![3].into(), vec![1.0].into());
+        assert!(graph.unwrap().validate().is_err());
+        let graph = Graph::from_csr(vec![0, 2].into(), vec![0].into(), vec![1.0].into());
+        assert!(graph.is_err());
+        let graph = Graph::from_csr(vec![0, 1, 1].into(), vec![1].into(), vec![1.0].into());
+        assert!(graph.unwrap().validate().is_ok());
     }
 }
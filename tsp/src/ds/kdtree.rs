@@ -1,168 +1,183 @@
-use std::{ops::{Add, Sub, Mul}, fmt, cmp::Ordering};
-use pdqselect::select_by;
+use crate::{ds::buffer::Buffer, utils::coordinate::Coordinate};
 
+/// 2-d tree over (lat, lng) stored as three flat arrays in implicit tree
+/// order: the root of `lo..hi` is at `lo + (hi - lo) / 2`, with the smaller
+/// coordinates of its axis to the left. Levels alternate between latitude
+/// and longitude. The arrays can be owned or mapped from a snapshot.
 #[derive(Debug, Clone)]
-pub struct KdTree<T> where T: Copy + PartialEq, {
-    pub root: Vec<Vec<T>>,
+pub struct KdTree {
+    lat: Buffer<f64>,
+    lng: Buffer<f64>,
+    ids: Buffer<u32>,
 }
 
-impl<T> KdTree<T> where T: Copy + PartialEq + PartialOrd + fmt::Debug + Sub<Output = T> + Mul<Output = T> + Add<Output = T> {
-    pub fn new(mut arr: Vec<Vec<T>>) -> Self {
-        Self::sort_kdtree(&mut arr, 0);
+impl KdTree {
+    pub fn new(mut points: Vec<Coordinate>) -> Self {
+        Self::sort_kdtree(&mut points, 0);
         Self {
-            root: arr.to_owned(),
+            lat: points.iter().map(|p| p.lat).collect::<Vec<_>>().into(),
+            lng: points.iter().map(|p| p.lng).collect::<Vec<_>>().into(),
+            ids: points.iter().map(|p| p.id as u32).collect::<Vec<_>>().into(),
         }
     }
 
-    pub fn closest<'a>(target:&'a Vec<T>, point_a: &'a Vec<T>, point_b: &'a Vec<T>) -> Vec<T> {
-        let target_a = Self::distance(target, point_a);
-        let target_b = Self::distance(target, point_b);
+    /// Arrays already laid out by `new`, e.g. read back from a snapshot.
+    pub fn from_sorted(lat: Buffer<f64>, lng: Buffer<f64>, ids: Buffer<u32>) -> Self {
+        assert!(lat.len() == ids.len() && lng.len() == ids.len());
+        Self { lat, lng, ids }
+    }
+
+    fn sort_kdtree(points: &mut [Coordinate], axis: usize) {
+        if points.len() > 1 {
+            let middle = points.len() / 2;
+            points.select_nth_unstable_by(middle, |a, b| {
+                Self::key(a, axis).total_cmp(&Self::key(b, axis))
+            });
+            let (left, right) = points.split_at_mut(middle);
+            Self::sort_kdtree(left, 1 - axis);
+            Self::sort_kdtree(&mut right[1..], 1 - axis);
+        }
+    }
+
+    fn key(point: &Coordinate, axis: usize) -> f64 {
+        if axis == 0 {
+            point.lat
+        } else {
+            point.lng
+        }
+    }
 
-        if target_a < target_b { point_a.clone() }
-        else { point_b.clone() }
+    pub fn len(&self) -> usize {
+        self.ids.len()
     }
 
-    pub fn distance<'a>(target: &'a Vec<T>, point: &'a Vec<T>) -> T {
-        let x: T = (target[0] - point[0])*(target[0] - point[0]);
-        let y: T = (target[1] - point[1])*(target[1] - point[1]);
-        x+y
+    pub fn is_empty(&self) -> bool {
+        self.ids.is_empty()
     }
 
-    pub fn compare(a: &Vec<T>, b: &Vec<T>, k: usize) -> Ordering {
-        if a[k] < b[k] { Ordering::Less }
-        else { Ordering::Greater }
+    pub fn latitudes(&self) -> &[f64] {
+        &self.lat
     }
 
-    pub fn sort_kdtree(array: &mut [Vec<T>], k: usize) {
-        if array.len() > 1 {
-            select_by(array, array.len()/2, |a , b| Self::compare(&a, &b, k));
-            let size = array.len();
-            let middle: usize = if size%2 != 0 { size/2 } else { size/2 - 1 };
+    pub fn longitudes(&self) -> &[f64] {
+        &self.lng
+    }
 
-            Self::sort_kdtree(&mut array[..middle], (k+1)%2);
-            Self::sort_kdtree(&mut array[middle + 1..], (k+1)%2);
-        }
+    pub fn ids(&self) -> &[u32] {
+        &self.ids
     }
 
-    pub fn get_nearest_neighbor(&self, target: &Vec<T>) -> Result<Vec<T>, ()> {
-        self.nearest_neighbor(&self.root, target, 0)
+    pub fn nearest(&self, lat: f64, lng: f64) -> Option<usize> {
+        self.k_nearest(lat, lng, 1).first().copied()
     }
 
-    pub fn nearest_neighbor(&self, arr: &[Vec<T>], target: &Vec<T>, k: usize) -> Result<Vec<T>, ()> {
-        if arr.len() == 1 { return Ok(arr[0].clone()) }
+    /// Ids of the `k` points closest to (lat, lng), nearest first. Longitude
+    /// differences are scaled by cos(lat) so distances are not stretched
+    /// east-west away from the equator.
+    pub fn k_nearest(&self, lat: f64, lng: f64, k: usize) -> Vec<usize> {
+        let mut heap = NearestHeap::new(k);
+        if k > 0 {
+            let query = Query {
+                lat,
+                lng,
+                lng_scale: lat.to_radians().cos(),
+            };
+            self.search(0, self.len(), 0, &query, &mut heap);
+        }
+        heap.into_sorted_ids()
+    }
 
-        let size = arr.len();
-        let middle: usize = if size%2 != 0 { size/2 } else { size/2 - 1 };
-        let first: &[Vec<T>];
-        let second: &[Vec<T>];
-        if target[k] < arr[middle][k] {
-            first = &arr[..middle];
-            second = &arr[middle + 1..];
+    fn search(&self, lo: usize, hi: usize, axis: usize, query: &Query, heap: &mut NearestHeap) {
+        if lo >= hi {
+            return;
+        }
+        let middle = lo + (hi - lo) / 2;
+        let dlat = query.lat - self.lat[middle];
+        let dlng = (query.lng - self.lng[middle]) * query.lng_scale;
+        heap.push(dlat * dlat + dlng * dlng, self.ids[middle]);
+
+        let diff = if axis == 0 { dlat } else { dlng };
+        let (near, far) = if diff < 0.0 {
+            ((lo, middle), (middle + 1, hi))
         } else {
-            first = &arr[middle + 1..];
-            second = &arr[..middle];
+            ((middle + 1, hi), (lo, middle))
+        };
+        self.search(near.0, near.1, 1 - axis, query, heap);
+        if diff * diff < heap.worst() {
+            self.search(far.0, far.1, 1 - axis, query, heap);
         }
+    }
+}
 
-        let mut option: Vec<T> = if first.len() > 0 { self.nearest_neighbor(first, target, (k+1)%2).unwrap() } else { arr[middle].clone() };
-        let mut best: Vec<T> = Self::closest(target, &arr[middle], &option);
+struct Query {
+    lat: f64,
+    lng: f64,
+    lng_scale: f64,
+}
 
-        let r: T = Self::distance(target, &best);
-        let rc: T = target[k] - arr[middle][k];
+// Max-heap of the best `k` candidates found so far, keyed by squared
+// distance, so the worst one can be replaced in O(log k).
+struct NearestHeap {
+    k: usize,
+    items: Vec<(f64, u32)>,
+}
 
-        if r >= (rc*rc) {
-            option =  if second.len() > 0 { self.nearest_neighbor(second, target, (k+1)%2).unwrap() } else { best.clone() };
-            best = Self::closest(target, &option, &best);
+impl NearestHeap {
+    fn new(k: usize) -> Self {
+        Self {
+            k,
+            items: Vec::with_capacity(k),
         }
-
-        Ok(best)
     }
 
-    pub fn get_n_nearest_neighbor(&self, target: &Vec<T>, n: usize) -> Result<Vec<Vec<T>>, ()> {
-        let mut bests: Vec<(Vec<T>, T)> = Vec::with_capacity(n);
-        let _ = self.n_nearest_neighbor(&self.root, target, 0, &mut bests);
-        bests.sort_by(|a, b| a.1.partial_cmp(&b.1).unwrap());
-        let results = bests.iter().map(|x| x.0.to_owned()).collect::<Vec<_>>();
-        Ok(results)
+    fn worst(&self) -> f64 {
+        if self.items.len() < self.k {
+            f64::INFINITY
+        } else {
+            self.items[0].0
+        }
     }
 
-    pub fn save_best(&self, best: &Vec<T>, r: T, bests: &mut Vec<(Vec<T>, T)>) {
-        for i in 0..bests.len() {
-            if bests[i].0[2] == best[2] {
-                return;
-            } else {
+    fn push(&mut self, dist: f64, id: u32) {
+        if self.items.len() < self.k {
+            self.items.push((dist, id));
+            let mut i = self.items.len() - 1;
+            while i > 0 && self.items[(i - 1) / 2].0 < self.items[i].0 {
+                self.items.swap(i, (i - 1) / 2);
+                i = (i - 1) / 2;
             }
-        }
-        if bests.len() < bests.capacity() {
-            let tuple = (best.clone(), r.clone());
-            bests.push(tuple.clone());
-        } else {
-            bests.sort_by(|a, b| a.1.partial_cmp(&b.1).unwrap());
-            bests.reverse();
-            for i in 0..bests.len() {
-                if bests[i].1 > r {
-                    bests[i] = (best.clone(), r.clone());
+        } else if dist < self.items[0].0 {
+            self.items[0] = (dist, id);
+            let mut i = 0;
+            loop {
+                let mut largest = i;
+                for child in [2 * i + 1, 2 * i + 2] {
+                    if child < self.items.len() && self.items[child].0 > self.items[largest].0 {
+                        largest = child;
+                    }
+                }
+                if largest == i {
                     break;
                 }
+                self.items.swap(i, largest);
+                i = largest;
             }
         }
     }
 
-    pub fn n_nearest_neighbor(&self, arr: &[Vec<T>], target: &Vec<T>, k: usize, bests: &mut Vec<(Vec<T>, T)>) -> Result<Vec<T>, ()> {
-        if arr.len() == 1 { 
-            let best = arr[0].clone();
-            let r = Self::distance(target, &arr[0]);
-            self.save_best(&best, r, bests);
-            return Ok(arr[0].clone())
-        }
-
-
-        let size = arr.len();
-        let middle: usize = if size%2 != 0 { size/2 } else { size/2 - 1 };
-        let first: &[Vec<T>];
-        let second: &[Vec<T>];
-        if target[k] < arr[middle][k] {
-            first = &arr[..middle];
-            second = &arr[middle + 1..];
-        } else {
-            first = &arr[middle + 1..];
-            second = &arr[..middle];
-        }
-        
-        let r: T = Self::distance(target, &arr[middle]);
-        self.save_best(&arr[middle], r, bests);
-
-        let mut option: Vec<T> = if first.len() > 0 { self.n_nearest_neighbor(first, target, (k+1)%2, bests).unwrap() } else { arr[middle].clone() };
-        let r: T = Self::distance(target, &option);
-        self.save_best(&option, r, bests);
-
-        let mut best: Vec<T> = Self::closest(target, &arr[middle], &option);
-        let r: T = Self::distance(target, &best);
-        self.save_best(&best, r, bests);
-        
-        let rc: T = target[k] - arr[middle][k];
-        
-
-        if r >= (rc*rc) {
-            option =  if second.len() > 0 { self.n_nearest_neighbor(second, target, (k+1)%2, bests).unwrap() } else { best.clone() };
-            let r: T = Self::distance(target, &option);
-            self.save_best(&option, r, bests);
-
-            best = Self::closest(target, &option, &best);
-            let r: T = Self::distance(target, &best);
-            self.save_best(&best, r, bests);
-        }
-
-        Ok(best)
+    fn into_sorted_ids(mut self) -> Vec<usize> {
+        self.items.sort_by(|a, b| a.0.total_cmp(&b.0));
+        self.items.into_iter().map(|(_, id)| id as usize).collect()
     }
-
 }
 
 #[cfg(test)]
 mod tests {
-    // use super::*;
+    use super::*;
     use crate::utils::create_kd_tree_from_file;
     use dotenvy::dotenv;
-    use std::{env};
+    use rand::{rngs::StdRng, Rng, SeedableRng};
+    use std::env;
 
     #[test]
     fn test_n_nearest_neighbor_kd_tree() {
@@ -171,14 +186,59 @@ mod tests {
         let coordinates = env::var("COORDINATES_FILE").unwrap();
         let kd_tree = create_kd_tree_from_file(&coordinates).unwrap();
 
-        let _result = kd_tree.get_nearest_neighbor(&[4.665179, -74.063324].to_vec()).unwrap();
-        let results = kd_tree.get_n_nearest_neighbor(&[4.665179, -74.063324].to_vec(), 100).unwrap();
-        
-        
+        let _result = kd_tree.nearest(4.665179, -74.063324).unwrap();
+        let results = kd_tree.k_nearest(4.665179, -74.063324, 100);
+
         println!("# results: {:?}", results.len());
         for i in 0..results.len() {
             println!("{:?}", results[i]);
         }
     }
 
-}
\ No newline at end of file
+    #[test]
+    fn test_k_nearest_matches_brute_force() {
+        let mut rng = StdRng::seed_from_u64(9);
+        let points: Vec<Coordinate> = (0..500)
+            .map(|id| Coordinate {
+                lat: 4.5 + rng.gen_range(0.0..0.3),
+                lng: -74.2 + rng.gen_range(0.0..0.3),
+                id,
+            })
+            .collect();
+        let tree = KdTree::new(points.clone());
+        assert_eq!(tree.len(), 500);
+
+        let queries: Vec<Coordinate> = (0..50)
+            .map(|id| Coordinate {
+                lat: 4.5 + rng.gen_range(0.0..0.3),
+                lng: -74.2 + rng.gen_range(0.0..0.3),
+                id,
+            })
+            .collect();
+        for query in &queries {
+            let found = tree.k_nearest(query.lat, query.lng, 5);
+            let scale = query.lat.to_radians().cos();
+            let mut expected = points.clone();
+            expected.sort_by(|a, b| {
+                let da = (a.lat - query.lat).powi(2) + ((a.lng - query.lng) * scale).powi(2);
+                let db = (b.lat - query.lat).powi(2) + ((b.lng - query.lng) * scale).powi(2);
+                da.total_cmp(&db)
+            });
+            let expected: Vec<usize> = expected[..5].iter().map(|p| p.id).collect();
+            assert_eq!(found, expected);
+            assert_eq!(tree.nearest(query.lat, query.lng), Some(expected[0]));
+        }
+    }
+
+    #[test]
+    fn test_k_nearest_small_trees() {
+        let empty = KdTree::new(vec![]);
+        assert_eq!(empty.nearest(0.0, 0.0), None);
+        let tree = KdTree::new(vec![
+            Coordinate { lat: 1.0, lng: 1.0, id: 7 },
+            Coordinate { lat: 2.0, lng: 2.0, id: 3 },
+        ]);
+        assert_eq!(tree.k_nearest(0.0, 0.0, 5), vec![7, 3]);
+        assert_eq!(tree.k_nearest(0.0, 0.0, 0), Vec::<usize>::new());
+    }
+}
@@ -0,0 +1,293 @@
+use std::{
+    collections::{hash_map::RandomState, HashMap},
+    hash::{BuildHasher, Hash},
+    sync::{
+        atomic::{AtomicU64, Ordering},
+        Mutex,
+    },
+};
+
+const SHARDS: usize = 16;
+const NIL: usize = usize::MAX;
+// Bookkeeping charged to every entry on top of the caller's cost: the map
+// slot, the list links and the allocator header.
+const ENTRY_OVERHEAD: usize = 64;
+
+/// Counters of an `LruCache`, cumulative since it was created.
+#[derive(Debug, Clone, Copy, Default, PartialEq, Eq)]
+pub struct CacheStats {
+    pub hits: u64,
+    pub misses: u64,
+    pub evictions: u64,
+    pub entries: usize,
+    pub bytes: usize,
+}
+
+/// Size-bounded least recently used cache that can be shared between
+/// threads. Keys are spread over independently locked shards, each with its
+/// own recency list and an equal part of the memory budget, so concurrent
+/// requests rarely wait on each other. Values are cloned out, so large ones
+/// should be behind an `Arc`.
+pub struct LruCache<K, V> {
+    shards: Vec<Mutex<Shard<K, V>>>,
+    hasher: RandomState,
+    hits: AtomicU64,
+    misses: AtomicU64,
+    evictions: AtomicU64,
+}
+
+impl<K: Hash + Eq + Clone, V: Clone> LruCache<K, V> {
+    /// Cache holding at most `capacity` bytes, as estimated by the costs
+    /// passed to `insert`. A capacity of 0 disables it.
+    pub fn new(capacity: usize) -> Self {
+        Self {
+            shards: (0..SHARDS).map(|_| Mutex::new(Shard::new(capacity / SHARDS))).collect(),
+            hasher: RandomState::new(),
+            hits: AtomicU64::new(0),
+            misses: AtomicU64::new(0),
+            evictions: AtomicU64::new(0),
+        }
+    }
+
+    pub fn get(&self, key: &K) -> Option<V> {
+        let value = self.shard(key).lock().unwrap().get(key);
+        let counter = if value.is_some() { &self.hits } else { &self.misses };
+        counter.fetch_add(1, Ordering::Relaxed);
+        value
+    }
+
+    /// Stores `value` as the most recently used entry, evicting the least
+    /// recently used ones until it fits. `cost` is the heap memory the value
+    /// owns; entries larger than a whole shard are not stored.
+    pub fn insert(&self, key: K, value: V, cost: usize) {
+        let cost = cost + ENTRY_OVERHEAD + std::mem::size_of::<(K, V)>();
+        let evicted = self.shard(&key).lock().unwrap().insert(key, value, cost);
+        if evicted > 0 {
+            self.evictions.fetch_add(evicted, Ordering::Relaxed);
+        }
+    }
+
+    /// Cached value for `key`, computing and storing it on a miss. The lock
+    /// is not held while `compute` runs, so two threads missing the same key
+    /// may both compute it.
+    pub fn get_or_insert_with(&self, key: K, compute: impl FnOnce() -> (V, usize)) -> V {
+        if let Some(value) = self.get(&key) {
+            return value;
+        }
+        let (value, cost) = compute();
+        self.insert(key, value.clone(), cost);
+        value
+    }
+
+    pub fn stats(&self) -> CacheStats {
+        let (mut entries, mut bytes) = (0, 0);
+        for shard in &self.shards {
+            let shard = shard.lock().unwrap();
+            entries += shard.map.len();
+            bytes += shard.bytes;
+        }
+        CacheStats {
+            hits: self.hits.load(Ordering::Relaxed),
+            misses: self.misses.load(Ordering::Relaxed),
+            evictions: self.evictions.load(Ordering::Relaxed),
+            entries,
+            bytes,
+        }
+    }
+
+    fn shard(&self, key: &K) -> &Mutex<Shard<K, V>> {
+        &self.shards[self.hasher.hash_one(key) as usize % SHARDS]
+    }
+}
+
+struct Entry<K, V> {
+    key: K,
+    value: V,
+    cost: usize,
+    prev: usize,
+    next: usize,
+}
+
+// Entries live in a slab and form a doubly linked list through indices,
+// most recently used at `head`. Freed slots are reused.
+struct Shard<K, V> {
+    map: HashMap<K, usize>,
+    entries: Vec<Option<Entry<K, V>>>,
+    free: Vec<usize>,
+    head: usize,
+    tail: usize,
+    bytes: usize,
+    capacity: usize,
+}
+
+impl<K: Hash + Eq + Clone, V: Clone> Shard<K, V> {
+    fn new(capacity: usize) -> Self {
+        Self {
+            map: HashMap::new(),
+            entries: vec![],
+            free: vec![],
+            head: NIL,
+            tail: NIL,
+            bytes: 0,
+            capacity,
+        }
+    }
+
+    fn entry(&mut self, i: usize) -> &mut Entry<K, V> {
+        self.entries[i].as_mut().unwrap()
+    }
+
+    fn get(&mut self, key: &K) -> Option<V> {
+        let i = *self.map.get(key)?;
+        self.unlink(i);
+        self.push_front(i);
+        Some(self.entry(i).value.clone())
+    }
+
+    // Returns the number of entries evicted to make room.
+    fn insert(&mut self, key: K, value: V, cost: usize) -> u64 {
+        if let Some(i) = self.map.remove(&key) {
+            self.remove(i);
+        }
+        if cost > self.capacity {
+            return 0;
+        }
+        let mut evicted = 0;
+        while self.bytes + cost > self.capacity {
+            let last = self.tail;
+            let key = self.entry(last).key.clone();
+            self.map.remove(&key);
+            self.remove(last);
+            evicted += 1;
+        }
+
+        let entry = Entry {
+            key: key.clone(),
+            value,
+            cost,
+            prev: NIL,
+            next: NIL,
+        };
+        let i = match self.free.pop() {
+            Some(i) => {
+                self.entries[i] = Some(entry);
+                i
+            }
+            None => {
+                self.entries.push(Some(entry));
+                self.entries.len() - 1
+            }
+        };
+        self.push_front(i);
+        self.map.insert(key, i);
+        self.bytes += cost;
+        evicted
+    }
+
+    fn remove(&mut self, i: usize) {
+        self.unlink(i);
+        let entry = self.entries[i].take().unwrap();
+        self.bytes -= entry.cost;
+        self.free.push(i);
+    }
+
+    fn unlink(&mut self, i: usize) {
+        let (prev, next) = {
+            let entry = self.entry(i);
+            (entry.prev, entry.next)
+        };
+        match prev {
+            NIL => self.head = next,
+            prev => self.entry(prev).next = next,
+        }
+        match next {
+            NIL => self.tail = prev,
+            next => self.entry(next).prev = prev,
+        }
+    }
+
+    fn push_front(&mut self, i: usize) {
+        let head = self.head;
+        {
+            let entry = self.entry(i);
+            entry.prev = NIL;
+            entry.next = head;
+        }
+        match head {
+            NIL => self.tail = i,
+            head => self.entry(head).prev = i,
+        }
+        self.head = i;
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use std::{sync::Arc, thread};
+
+    // Room for `n` entries with no extra cost in every shard.
+    fn capacity(n: usize) -> usize {
+        n * SHARDS * (ENTRY_OVERHEAD + std::mem::size_of::<(u32, u32)>())
+    }
+
+    #[test]
+    fn test_lru_evicts_least_recently_used() {
+        let cache: LruCache<u32, u32> = LruCache::new(capacity(2));
+        // force every key into the same shard by probing for collisions
+        let keys: Vec<u32> = {
+            let shard = |k: &u32| cache.hasher.hash_one(k) as usize % SHARDS;
+            let first = shard(&0);
+            (0..).filter(|k| shard(k) == first).take(3).collect()
+        };
+        cache.insert(keys[0], 10, 0);
+        cache.insert(keys[1], 11, 0);
+        assert_eq!(cache.get(&keys[0]), Some(10));
+        cache.insert(keys[2], 12, 0);
+
+        assert_eq!(cache.get(&keys[1]), None);
+        assert_eq!(cache.get(&keys[0]), Some(10));
+        assert_eq!(cache.get(&keys[2]), Some(12));
+        let stats = cache.stats();
+        assert_eq!((stats.hits, stats.misses, stats.evictions), (3, 1, 1));
+        assert_eq!(stats.entries, 2);
+    }
+
+    #[test]
+    fn test_lru_respects_memory_cap() {
+        let cache: LruCache<u32, u32> = LruCache::new(capacity(4));
+        for k in 0..1000 {
+            cache.insert(k, k, 0);
+        }
+        let stats = cache.stats();
+        assert!(stats.bytes <= capacity(4));
+        assert_eq!(stats.entries as u64 + stats.evictions, 1000);
+        // values larger than a shard are never stored
+        cache.insert(5000, 1, capacity(4));
+        assert_eq!(cache.get(&5000), None);
+        assert_eq!(LruCache::<u32, u32>::new(0).get_or_insert_with(1, || (2, 0)), 2);
+    }
+
+    #[test]
+    fn test_lru_shared_between_threads() {
+        let cache: Arc<LruCache<u32, u32>> = Arc::new(LruCache::new(capacity(100)));
+        let handles: Vec<_> = (0..4)
+            .map(|t| {
+                let cache = cache.clone();
+                thread::spawn(move || {
+                    for k in 0..500 {
+                        let value = cache.get_or_insert_with(k % 50, || (k % 50 * 2, 0));
+                        assert_eq!(value, k % 50 * 2);
+                    }
+                    t
+                })
+            })
+            .collect();
+        for handle in handles {
+            handle.join().unwrap();
+        }
+        let stats = cache.stats();
+        assert_eq!(stats.hits + stats.misses, 2000);
+        assert!(stats.hits >= 2000 - 4 * 50);
+    }
+}
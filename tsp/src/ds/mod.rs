@@ -1,5 +1,9 @@
+pub mod buffer;
+pub mod coordinates;
 pub mod graph;
 pub mod linked_list;
+pub mod lru;
 pub mod priority_queue;
 pub mod queue;
 pub mod kdtree;
+pub mod segment_index;
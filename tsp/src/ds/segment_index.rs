@@ -0,0 +1,351 @@
+use crate::{
+    ds::{buffer::Buffer, coordinates::CoordinateTable, graph::Graph},
+    utils::coordinate::Coordinate,
+};
+use std::error::Error;
+
+/// Grid cell side in degrees, about 550 m of latitude.
+pub const DEFAULT_CELL_SIZE: f64 = 0.005;
+const METERS_PER_DEGREE: f64 = 111_320.0;
+// Matches this close, in meters, count as equally near; the one whose point
+// is nearer to an endpoint wins, so a location on a node snaps to it.
+const TIE_TOLERANCE: f64 = 0.01;
+
+/// Closest point of the road network to a query location.
+#[derive(Debug, Clone, Copy)]
+pub struct SegmentMatch {
+    pub from: usize,
+    pub to: usize,
+    /// Position of `point` along the arc, 0 at `from` and 1 at `to`.
+    pub fraction: f64,
+    /// Distance from the query to `point` in meters.
+    pub distance: f64,
+    pub point: Coordinate,
+}
+
+/// Uniform grid over the arcs of the road network. Every arc is registered
+/// in each cell it crosses, and only non-empty cells are stored: `cells`
+/// holds their sorted keys and the arcs of `cells[i]` are
+/// `arcs[offsets[i]..offsets[i + 1]]`. An arc and its reverse are stored once.
+#[derive(Debug, Clone)]
+pub struct SegmentIndex {
+    cell_size: f64,
+    cells: Buffer<u64>,
+    offsets: Buffer<u32>,
+    arcs: Buffer<u32>,
+}
+
+impl SegmentIndex {
+    pub fn build(g: &Graph, coordinates: &CoordinateTable, cell_size: f64) -> Self {
+        let mut entries: Vec<(u64, u32)> = vec![];
+        for u in 0..g.num_nodes() {
+            let start = g.offsets()[u] as usize;
+            for (i, (v, _)) in g.neighbours(u).enumerate() {
+                if v == u || (v < u && g.neighbours(v).any(|(w, _)| w == u)) {
+                    continue;
+                }
+                let (a, b) = match (coordinates.get(u), coordinates.get(v)) {
+                    (Some(a), Some(b)) => (a, b),
+                    _ => continue,
+                };
+                let arc = (start + i) as u32;
+                for_each_cell(grid_position(&a, cell_size), grid_position(&b, cell_size), |x, y| {
+                    entries.push((cell_key(x, y), arc))
+                });
+            }
+        }
+        entries.sort_unstable();
+        entries.dedup();
+
+        let mut cells = vec![];
+        let mut offsets = vec![0u32];
+        let mut arcs = Vec::with_capacity(entries.len());
+        for (key, arc) in entries {
+            if cells.last() != Some(&key) {
+                if !cells.is_empty() {
+                    offsets.push(arcs.len() as u32);
+                }
+                cells.push(key);
+            }
+            arcs.push(arc);
+        }
+        if !cells.is_empty() {
+            offsets.push(arcs.len() as u32);
+        }
+
+        Self {
+            cell_size,
+            cells: cells.into(),
+            offsets: offsets.into(),
+            arcs: arcs.into(),
+        }
+    }
+
+    pub fn from_parts(
+        cell_size: f64,
+        cells: Buffer<u64>,
+        offsets: Buffer<u32>,
+        arcs: Buffer<u32>,
+    ) -> Result<Self, Box<dyn Error>> {
+        if !(cell_size > 0.0)
+            || offsets.len() != cells.len() + 1
+            || offsets[0] != 0
+            || *offsets.last().unwrap() as usize != arcs.len()
+        {
+            return Err("Inconsistent segment index sections".into());
+        }
+        Ok(Self {
+            cell_size,
+            cells,
+            offsets,
+            arcs,
+        })
+    }
+
+    pub fn cell_size(&self) -> f64 {
+        self.cell_size
+    }
+
+    pub fn cells(&self) -> &[u64] {
+        &self.cells
+    }
+
+    pub fn offsets(&self) -> &[u32] {
+        &self.offsets
+    }
+
+    pub fn arcs(&self) -> &[u32] {
+        &self.arcs
+    }
+
+    /// Closest arc of `g` within `max_distance` meters of (lat, lng).
+    ///
+    /// Distances use an equirectangular projection centred on the query,
+    /// which is accurate to well under a meter at snapping range. Rings of
+    /// cells are scanned outwards until no unseen cell can be closer than
+    /// the best match.
+    pub fn nearest(
+        &self,
+        g: &Graph,
+        coordinates: &CoordinateTable,
+        lat: f64,
+        lng: f64,
+        max_distance: f64,
+    ) -> Option<SegmentMatch> {
+        let cos_lat = lat.to_radians().cos();
+        let cell_meters = self.cell_size * METERS_PER_DEGREE * cos_lat.min(1.0);
+        let max_ring = (max_distance / cell_meters).ceil() as i64 + 1;
+        let (qx, qy) = grid_position(&Coordinate { lat, lng, id: 0 }, self.cell_size);
+        let (cx, cy) = (qx.floor() as i64, qy.floor() as i64);
+
+        let mut best: Option<(SegmentMatch, f64)> = None;
+        for ring in 0..=max_ring {
+            for (x, y) in ring_cells(cx, cy, ring) {
+                for &arc in self.cell_arcs(cell_key(x, y)) {
+                    let arc = arc as usize;
+                    let from = g.offsets().partition_point(|&o| o as usize <= arc) - 1;
+                    let to = g.targets()[arc] as usize;
+                    let (a, b) = match (coordinates.get(from), coordinates.get(to)) {
+                        (Some(a), Some(b)) => (a, b),
+                        _ => continue,
+                    };
+                    let (candidate, gap) = project(lat, lng, cos_lat, &a, &b);
+                    if candidate.distance <= max_distance
+                        && best.map_or(true, |(b, best_gap)| {
+                            candidate.distance < b.distance - TIE_TOLERANCE
+                                || (candidate.distance <= b.distance + TIE_TOLERANCE
+                                    && gap < best_gap)
+                        })
+                    {
+                        best = Some((candidate, gap));
+                    }
+                }
+            }
+            // cells in the next ring are at least `ring` cells away
+            if best.map_or(false, |(b, _)| b.distance + TIE_TOLERANCE <= ring as f64 * cell_meters) {
+                break;
+            }
+        }
+        best.map(|(b, _)| b)
+    }
+
+    fn cell_arcs(&self, key: u64) -> &[u32] {
+        match self.cells.binary_search(&key) {
+            Ok(i) => &self.arcs[self.offsets[i] as usize..self.offsets[i + 1] as usize],
+            Err(_) => &[],
+        }
+    }
+}
+
+// Position in cell units, with both axes shifted to be non-negative.
+fn grid_position(c: &Coordinate, cell_size: f64) -> (f64, f64) {
+    ((c.lng + 180.0) / cell_size, (c.lat + 90.0) / cell_size)
+}
+
+fn cell_key(x: i64, y: i64) -> u64 {
+    ((y as u64) << 32) | (x as u64 & 0xffff_ffff)
+}
+
+fn ring_cells(cx: i64, cy: i64, ring: i64) -> Vec<(i64, i64)> {
+    if ring == 0 {
+        return vec![(cx, cy)];
+    }
+    let mut cells = Vec::with_capacity(8 * ring as usize);
+    for d in -ring..=ring {
+        cells.push((cx + d, cy - ring));
+        cells.push((cx + d, cy + ring));
+    }
+    for d in -ring + 1..ring {
+        cells.push((cx - ring, cy + d));
+        cells.push((cx + ring, cy + d));
+    }
+    cells
+}
+
+// Visits every cell crossed by the segment a-b (grid traversal in the style
+// of Amanatides and Woo).
+fn for_each_cell(a: (f64, f64), b: (f64, f64), mut visit: impl FnMut(i64, i64)) {
+    let (mut x, mut y) = (a.0.floor() as i64, a.1.floor() as i64);
+    let (end_x, end_y) = (b.0.floor() as i64, b.1.floor() as i64);
+    let (dx, dy) = (b.0 - a.0, b.1 - a.1);
+    let step_x = if dx > 0.0 { 1 } else { -1 };
+    let step_y = if dy > 0.0 { 1 } else { -1 };
+    let boundary = |start: f64, cell: i64, d: f64| {
+        if d > 0.0 {
+            (cell as f64 + 1.0 - start) / d
+        } else if d < 0.0 {
+            (start - cell as f64) / -d
+        } else {
+            f64::INFINITY
+        }
+    };
+    let mut t_max_x = boundary(a.0, x, dx);
+    let mut t_max_y = boundary(a.1, y, dy);
+    let t_delta_x = if dx != 0.0 { 1.0 / dx.abs() } else { f64::INFINITY };
+    let t_delta_y = if dy != 0.0 { 1.0 / dy.abs() } else { f64::INFINITY };
+
+    visit(x, y);
+    for _ in 0..(end_x - x).abs() + (end_y - y).abs() {
+        if t_max_x < t_max_y {
+            x += step_x;
+            t_max_x += t_delta_x;
+        } else {
+            y += step_y;
+            t_max_y += t_delta_y;
+        }
+        visit(x, y);
+    }
+}
+
+// Closest point of segment a-b to the query, in meters on the local plane,
+// and the distance from that point to the nearer endpoint.
+fn project(lat: f64, lng: f64, cos_lat: f64, a: &Coordinate, b: &Coordinate) -> (SegmentMatch, f64) {
+    let to_plane = |c: &Coordinate| {
+        (
+            (c.lng - lng) * cos_lat * METERS_PER_DEGREE,
+            (c.lat - lat) * METERS_PER_DEGREE,
+        )
+    };
+    let (ax, ay) = to_plane(a);
+    let (bx, by) = to_plane(b);
+    let (dx, dy) = (bx - ax, by - ay);
+    let length = dx * dx + dy * dy;
+    let fraction = if length > 0.0 {
+        (-(ax * dx + ay * dy) / length).clamp(0.0, 1.0)
+    } else {
+        0.0
+    };
+    let (px, py) = (ax + fraction * dx, ay + fraction * dy);
+    let gap = fraction.min(1.0 - fraction) * length.sqrt();
+    let found = SegmentMatch {
+        from: a.id,
+        to: b.id,
+        fraction,
+        distance: (px * px + py * py).sqrt(),
+        point: Coordinate {
+            lat: a.lat + fraction * (b.lat - a.lat),
+            lng: a.lng + fraction * (b.lng - a.lng),
+            id: a.id,
+        },
+    };
+    (found, gap)
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::ds::graph::GraphBuilder;
+    use rand::{rngs::StdRng, Rng, SeedableRng};
+
+    fn coordinate(id: usize, lat: f64, lng: f64) -> Coordinate {
+        Coordinate { lat, lng, id }
+    }
+
+    #[test]
+    fn test_snaps_to_long_road_instead_of_isolated_node() {
+        // a 3 km straight road and an unconnected node next to the query
+        let coordinates = CoordinateTable::from(vec![
+            coordinate(0, 4.60, -74.10),
+            coordinate(1, 4.60, -74.073),
+            coordinate(2, 4.6012, -74.0866),
+        ]);
+        let mut g = GraphBuilder::new(3);
+        g.add_edge(0, 1, 3000.0);
+        g.add_edge(1, 0, 3000.0);
+        let g = g.build();
+        let index = SegmentIndex::build(&g, &coordinates, DEFAULT_CELL_SIZE);
+        assert_eq!(index.arcs().len(), index.cells().len());
+
+        let found = index.nearest(&g, &coordinates, 4.6010, -74.0865, 1000.0).unwrap();
+        assert_eq!((found.from, found.to), (0, 1));
+        assert!((found.fraction - 0.5).abs() < 0.01);
+        assert!((found.distance - 111.3).abs() < 1.0, "{}", found.distance);
+        assert!((found.point.lat - 4.60).abs() < 1e-9);
+        assert!(index.nearest(&g, &coordinates, 4.62, -74.0865, 1000.0).is_none());
+    }
+
+    #[test]
+    fn test_nearest_matches_brute_force() {
+        let mut rng = StdRng::seed_from_u64(21);
+        let n = 300;
+        let coordinates = CoordinateTable::from(
+            (0..n)
+                .map(|id| coordinate(id, 4.6 + rng.gen_range(0.0..0.05), -74.1 + rng.gen_range(0.0..0.05)))
+                .collect::<Vec<_>>(),
+        );
+        let mut g = GraphBuilder::new(n);
+        for u in 0..n {
+            let v = rng.gen_range(0..n);
+            g.add_edge(u, v, 1.0);
+        }
+        let g = g.build();
+        let index = SegmentIndex::build(&g, &coordinates, 0.003);
+
+        for _ in 0..100 {
+            let (lat, lng): (f64, f64) = (4.6 + rng.gen_range(0.0..0.05), -74.1 + rng.gen_range(0.0..0.05));
+            let cos_lat = lat.to_radians().cos();
+            let expected = (0..n)
+                .flat_map(|u| g.neighbours(u).map(move |(v, _)| (u, v)))
+                .map(|(u, v)| {
+                    project(lat, lng, cos_lat, &coordinates.get(u).unwrap(), &coordinates.get(v).unwrap())
+                        .0
+                        .distance
+                })
+                .fold(f64::INFINITY, f64::min);
+            let found = index.nearest(&g, &coordinates, lat, lng, 10_000.0).unwrap();
+            assert!((found.distance - expected).abs() < 1e-6);
+        }
+    }
+
+    #[test]
+    fn test_for_each_cell_is_connected() {
+        let mut cells = vec![];
+        for_each_cell((0.5, 0.5), (3.2, 1.7), |x, y| cells.push((x, y)));
+        assert_eq!(cells.first(), Some(&(0, 0)));
+        assert_eq!(cells.last(), Some(&(3, 1)));
+        assert_eq!(cells.len(), 5);
+        for pair in cells.windows(2) {
+            assert_eq!((pair[0].0 - pair[1].0).abs() + (pair[0].1 - pair[1].1).abs(), 1);
+        }
+    }
+}
@@ -1,8 +1,248 @@
-use crate::{ds::{graph::Graph, kdtree::KdTree}, utils::coordinate::Coordinate};
-use std::collections::HashMap;
+use crate::{
+    algo::{
+        alt::Landmarks,
+        ch::ContractionHierarchy,
+        many_to_many,
+        shortest_paths::{bidirectional_astar, harvesine_heuristic},
+    },
+    ds::{
+        coordinates::CoordinateTable, graph::Graph, kdtree::KdTree, lru::LruCache,
+        segment_index::SegmentIndex,
+    },
+    utils::{
+        coordinate::Coordinate,
+        metrics::{Stage, METRICS},
+    },
+};
+use once_cell::sync::Lazy;
+use rayon::{prelude::*, ThreadPool, ThreadPoolBuilder};
+use rocket::tokio::sync::oneshot;
+use std::{
+    env,
+    error::Error,
+    panic::{self, AssertUnwindSafe},
+    sync::{
+        atomic::{AtomicUsize, Ordering},
+        Arc,
+    },
+};
+
+// Locations farther than this many meters from every road are snapped to
+// the nearest nodes instead.
+const MAX_SNAP_DISTANCE: f64 = 1000.0;
+
+// Snapped locations are cached per cell of this many degrees, about a meter.
+const SNAP_CACHE_QUANTUM: f64 = 1e-5;
+
+/// Pool for the CPU-bound part of requests (solving and routing), so they
+/// never take more than COMPUTE_THREADS cores. Defaults to one per core.
+pub static COMPUTE_POOL: Lazy<ThreadPool> = Lazy::new(|| {
+    let threads = env::var("COMPUTE_THREADS")
+        .ok()
+        .and_then(|threads| threads.parse().ok())
+        .unwrap_or(0);
+    ThreadPoolBuilder::new()
+        .num_threads(threads)
+        .thread_name(|i| format!("compute-{}", i))
+        .build()
+        .unwrap()
+});
+
+// Jobs admitted to COMPUTE_POOL at once, running or waiting for a thread:
+// COMPUTE_QUEUE, or four per thread unless set.
+static COMPUTE_QUEUE_LIMIT: Lazy<usize> = Lazy::new(|| {
+    env::var("COMPUTE_QUEUE")
+        .ok()
+        .and_then(|limit| limit.parse().ok())
+        .unwrap_or_else(|| COMPUTE_POOL.current_num_threads() * 4)
+});
+static COMPUTE_ADMITTED: AtomicUsize = AtomicUsize::new(0);
+
+/// Occupancy of the compute queue.
+#[derive(Debug, Clone, Copy)]
+pub struct ComputeQueueStatus {
+    pub threads: usize,
+    pub limit: usize,
+    /// Jobs running or waiting for a thread.
+    pub admitted: usize,
+}
+
+pub fn compute_queue_status() -> ComputeQueueStatus {
+    ComputeQueueStatus {
+        threads: COMPUTE_POOL.current_num_threads(),
+        limit: *COMPUTE_QUEUE_LIMIT,
+        admitted: COMPUTE_ADMITTED.load(Ordering::Acquire),
+    }
+}
+
+/// Returned by `submit_compute` when the compute queue is full.
+#[derive(Debug)]
+pub struct ComputeBusy;
+
+// Frees an admission slot when the job ends, even if it panicked.
+struct ComputeSlot;
+
+impl Drop for ComputeSlot {
+    fn drop(&mut self) {
+        COMPUTE_ADMITTED.fetch_sub(1, Ordering::AcqRel);
+    }
+}
+
+/// Queues `job` on COMPUTE_POOL and returns a receiver for its result, so
+/// async handlers can await it without blocking their worker thread. When
+/// COMPUTE_QUEUE jobs are already admitted it fails right away instead of
+/// growing the backlog. The receiver errors if the job panicked.
+pub fn submit_compute<T, F>(job: F) -> Result<oneshot::Receiver<T>, ComputeBusy>
+where
+    T: Send + 'static,
+    F: FnOnce() -> T + Send + 'static,
+{
+    if COMPUTE_ADMITTED.fetch_add(1, Ordering::AcqRel) >= *COMPUTE_QUEUE_LIMIT {
+        COMPUTE_ADMITTED.fetch_sub(1, Ordering::AcqRel);
+        return Err(ComputeBusy);
+    }
+    let slot = ComputeSlot;
+    let (sender, receiver) = oneshot::channel();
+    COMPUTE_POOL.spawn(move || {
+        let _slot = slot;
+        // a panic would abort the process from a spawned job; dropping the
+        // sender reports it to the caller instead
+        if let Ok(result) = panic::catch_unwind(AssertUnwindSafe(job)) {
+            let _ = sender.send(result);
+        }
+    });
+    Ok(receiver)
+}
+
+/// Leg routes between road network nodes, `None` when there is no path.
+pub type RouteCache = LruCache<(u32, u32), Option<(f64, Arc<[u32]>)>>;
+/// Snapping candidates per quantised (lat, lng) and number of candidates.
+pub type SnapCache = LruCache<(i32, i32, u32), Arc<[u32]>>;
+
+/// In-memory caches shared by all requests, so repeated and overlapping
+/// trips reuse earlier routing and snapping work.
+pub struct Caches {
+    pub routes: RouteCache,
+    pub snaps: SnapCache,
+}
+
+impl Caches {
+    /// Caches using `bytes` of memory in total, three quarters for routes.
+    pub fn new(bytes: usize) -> Self {
+        Self {
+            routes: LruCache::new(bytes / 4 * 3),
+            snaps: LruCache::new(bytes / 4),
+        }
+    }
+
+    /// Caches sized by ROUTE_CACHE_MB, 64 MB unless set. 0 disables them.
+    pub fn from_env() -> Self {
+        let mb = env::var("ROUTE_CACHE_MB")
+            .ok()
+            .and_then(|mb| mb.parse::<usize>().ok())
+            .unwrap_or(64);
+        Self::new(mb << 20)
+    }
+}
 
 pub struct Data {
     pub graph: Graph,
-    pub map_id_to_coordinates: HashMap<usize, Coordinate>,
-    pub kd_tree: KdTree<f64>,
+    // `graph` with every arc reversed, built at load time for backward searches
+    pub reverse: Graph,
+    pub map_id_to_coordinates: CoordinateTable,
+    pub kd_tree: KdTree,
+    pub segments: SegmentIndex,
+    pub ch: Option<ContractionHierarchy>,
+    pub landmarks: Option<Landmarks>,
+    pub caches: Caches,
+}
+
+impl Data {
+    /// Distance and node path between two road network nodes, answered by
+    /// the contraction hierarchy when one is loaded, else by bidirectional
+    /// A* with the landmark bounds or, without those, the straight-line
+    /// distance.
+    pub fn shortest_path(&self, src: usize, dest: usize) -> Result<(f64, Vec<usize>), Box<dyn Error>> {
+        let route = self.caches.routes.get_or_insert_with((src as u32, dest as u32), || {
+            let route = METRICS.time(Stage::RouteSearch, || self.route(src, dest));
+            let route = route.ok().map(|(distance, path)| {
+                (distance, path.into_iter().map(|v| v as u32).collect::<Arc<[u32]>>())
+            });
+            let cost = route.as_ref().map_or(0, |(_, path)| path.len() * 4);
+            (route, cost)
+        });
+        match route {
+            Some((distance, path)) => Ok((distance, path.iter().map(|&v| v as usize).collect())),
+            None => Err("No path found".into()),
+        }
+    }
+
+    fn route(&self, src: usize, dest: usize) -> Result<(f64, Vec<usize>), Box<dyn Error>> {
+        let (g, reverse, map) = (&self.graph, &self.reverse, &self.map_id_to_coordinates);
+        match (&self.ch, &self.landmarks) {
+            (Some(ch), _) => ch.query(src, dest),
+            (None, Some(landmarks)) => bidirectional_astar(g, reverse, map, src, dest, &|_, v, t| {
+                landmarks.lower_bound(v, t)
+            }),
+            (None, None) => bidirectional_astar(g, reverse, map, src, dest, &harvesine_heuristic),
+        }
+    }
+
+    /// Road distances between every source and target, infinite when there
+    /// is no path.
+    pub fn distance_table(&self, sources: &[usize], targets: &[usize]) -> Vec<Vec<f64>> {
+        match &self.ch {
+            Some(ch) => ch.distance_table(sources, targets),
+            None => many_to_many::distance_table(&self.graph, sources, targets),
+        }
+    }
+
+    /// Up to `k` road network nodes to start routing from for each
+    /// coordinate. The endpoints of the closest road segment come first,
+    /// the nearer one leading, followed by the nearest nodes.
+    pub fn snap(&self, coordinates: &[Coordinate], k: usize) -> Vec<Vec<usize>> {
+        METRICS.time(Stage::Snap, || {
+            coordinates
+                .par_iter()
+                .map(|c| {
+                    let key = (
+                        (c.lat / SNAP_CACHE_QUANTUM).round() as i32,
+                        (c.lng / SNAP_CACHE_QUANTUM).round() as i32,
+                        k as u32,
+                    );
+                    let candidates = self.caches.snaps.get_or_insert_with(key, || {
+                        let candidates = self.snap_coordinate(c, k);
+                        let cost = candidates.len() * 4;
+                        (candidates.into_iter().map(|v| v as u32).collect(), cost)
+                    });
+                    candidates.iter().map(|&v| v as usize).collect()
+                })
+                .collect()
+        })
+    }
+
+    fn snap_coordinate(&self, c: &Coordinate, k: usize) -> Vec<usize> {
+        let mut candidates = Vec::with_capacity(k + 2);
+        let segment = self.segments.nearest(
+            &self.graph,
+            &self.map_id_to_coordinates,
+            c.lat,
+            c.lng,
+            MAX_SNAP_DISTANCE,
+        );
+        if let Some(segment) = segment {
+            if segment.fraction <= 0.5 {
+                candidates.extend([segment.from, segment.to]);
+            } else {
+                candidates.extend([segment.to, segment.from]);
+            }
+        }
+        for node in self.kd_tree.k_nearest(c.lat, c.lng, k) {
+            if !candidates.contains(&node) {
+                candidates.push(node);
+            }
+        }
+        candidates.truncate(k);
+        candidates
+    }
 }
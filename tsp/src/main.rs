@@ -8,33 +8,107 @@ use rocket::Config;
 use rocket_cors::{AllowedOrigins, CorsOptions};
 use std::env;
 use std::net::Ipv4Addr;
+use std::sync::Arc;
 use tsp::routes::{
-    history::get_history, login::login, shortestpath::shortestpath, signup::sign_up,
-    user::get_user_details,
+    history::{get_history, get_history_trip}, login::login, metrics::{metrics, RequestMetrics},
+    shortestpath::shortestpath, signup::sign_up, timing::RequestTracing, user::get_user_details,
 };
-use tsp::{global::Data, utils};
+use tsp::{
+    algo::{alt::Landmarks, ch::ContractionHierarchy},
+    db::{
+        connection::create_pool,
+        trip_writer::{TripWriter, TripWriterConfig},
+    },
+    ds::segment_index::{SegmentIndex, DEFAULT_CELL_SIZE},
+    global::{Caches, Data},
+    utils,
+    utils::{
+        authenticate::Authenticator, compression::ResponseCompression, response::ErrorResponse,
+        snapshot::Snapshot,
+    },
+};
+use rocket::fairing::AdHoc;
+use rocket::serde::json::Json;
+use std::time::Duration;
+
+// Authenticated routes reject bad tokens in their request guard; keep the JSON body
+#[catch(401)]
+fn unauthorized() -> Json<ErrorResponse> {
+    Json(ErrorResponse {
+        message: "Invalid Token".to_string(),
+    })
+}
 
 #[launch]
 fn rocket() -> _ {
     dotenv().ok();
     let port = env::var("PORT").unwrap();
-    let coordinates_file = env::var("COORDINATES_FILE").unwrap();
-    let arcs_file = env::var("ARCS_FILE").unwrap();
 
-    let graph = utils::create_adjacency_list_from_files(&coordinates_file, &arcs_file).unwrap();
-    let map_id_to_coordinates =
-        utils::create_id_to_coordinates_hashmap_from_file(&coordinates_file).unwrap();
-    let kd_tree = utils::create_kd_tree_from_file(&coordinates_file).unwrap();
+    // A snapshot (see `cargo run --bin snapshot`) is mapped instead of parsed
+    let (graph, map_id_to_coordinates, kd_tree, segments) = match env::var("SNAPSHOT_FILE") {
+        Ok(snapshot_file) => {
+            let snapshot = Snapshot::open(&snapshot_file).unwrap();
+            let graph = utils::create_adjacency_list_from_snapshot(&snapshot).unwrap();
+            let coordinates = utils::create_coordinate_table_from_snapshot(&snapshot).unwrap();
+            let segments =
+                utils::create_segment_index_from_snapshot(&snapshot, &graph, &coordinates).unwrap();
+            (
+                graph,
+                coordinates,
+                utils::create_kd_tree_from_snapshot(&snapshot).unwrap(),
+                segments,
+            )
+        }
+        Err(_) => {
+            let coordinates_file = env::var("COORDINATES_FILE").unwrap();
+            let arcs_file = env::var("ARCS_FILE").unwrap();
+            let graph =
+                utils::create_adjacency_list_from_files(&coordinates_file, &arcs_file).unwrap();
+            let coordinates =
+                utils::create_id_to_coordinates_hashmap_from_file(&coordinates_file).unwrap();
+            let segments = SegmentIndex::build(&graph, &coordinates, DEFAULT_CELL_SIZE);
+            (
+                graph,
+                coordinates,
+                utils::create_kd_tree_from_file(&coordinates_file).unwrap(),
+                segments,
+            )
+        }
+    };
 
+    // Optional contraction hierarchy (see `cargo run --bin ch`) for route queries
+    let ch = env::var("CH_FILE").ok().map(|ch_file| {
+        let ch = ContractionHierarchy::open(&ch_file).unwrap();
+        assert_eq!(ch.num_nodes(), graph.num_nodes(), "CH_FILE was built for another graph");
+        ch
+    });
+
+    // Optional landmark tables (see `cargo run --bin landmarks`) for A* without a CH
+    let landmarks = env::var("LANDMARKS_FILE").ok().map(|landmarks_file| {
+        let landmarks = Landmarks::open(&landmarks_file).unwrap();
+        assert_eq!(
+            landmarks.num_nodes(),
+            graph.num_nodes(),
+            "LANDMARKS_FILE was built for another graph"
+        );
+        landmarks
+    });
+
+    let reverse = graph.reverse();
     let state = Data {
         graph,
+        reverse,
         map_id_to_coordinates,
         kd_tree,
+        segments,
+        ch,
+        landmarks,
+        caches: Caches::from_env(),
     };
 
     let allowed_origins = AllowedOrigins::some_exact(&[env::var("FRONTEND_URL").unwrap()]);
 
-    let cors = CorsOptions::default()
+    let mut cors = CorsOptions::default()
         .allowed_origins(allowed_origins)
         .allowed_methods(
             vec![Method::Get, Method::Post, Method::Patch]
@@ -43,6 +117,8 @@ fn rocket() -> _ {
                 .collect(),
         )
         .allow_credentials(true);
+    // lets the frontend read the stage breakdown of traced requests
+    cors.expose_headers.insert("Server-Timing".to_string());
 
     let config = Config {
         port: port.parse().unwrap(),
@@ -52,12 +128,31 @@ fn rocket() -> _ {
 
     let figment = Figment::from(config);
 
+    let pool = create_pool();
+    let trip_writer = TripWriter::start(pool.clone(), TripWriterConfig::from_env());
+
     rocket::custom(figment)
-        .manage(state)
-        .mount("/", routes![shortestpath])
-        .mount("/history", routes![get_history])
+        .manage(Arc::new(state))
+        .manage(pool)
+        .manage(trip_writer)
+        .manage(Authenticator::from_env())
+        .register("/", catchers![unauthorized])
+        .mount("/", routes![shortestpath, metrics])
+        .mount("/history", routes![get_history, get_history_trip])
         .mount("/signup", routes![sign_up])
         .mount("/login", routes![login])
         .mount("/user", routes![get_user_details])
         .attach(cors.to_cors().unwrap())
+        .attach(ResponseCompression::default())
+        .attach(RequestTracing::from_env())
+        .attach(AdHoc::on_shutdown("Flush trips", |rocket| {
+            Box::pin(async move {
+                // give queued trips a chance to reach the database before exiting
+                if let Some(writer) = rocket.state::<TripWriter>() {
+                    writer.flush(Duration::from_secs(5));
+                }
+            })
+        }))
+        // last, so the times it records include the other fairings
+        .attach(RequestMetrics)
 }
@@ -1,27 +1,54 @@
 use rocket::http::Status;
-use rocket::{get, serde::json::Json, response::status::Custom};
-use crate::db::models::trips::Trip;
-use crate::{utils::{response::{DataResponse, ErrorResponse}, auth_token::Token, authenticate::{authenticate, get_claims_by_token}}, db::{users::get_user_by_id, trips::get_trips_by_user_id}};
+use rocket::{get, serde::json::Json, response::status::Custom, State};
+use crate::db::models::trips::{Trip, TripSummary};
+use crate::{utils::{response::{DataResponse, ErrorResponse, PageResponse}, auth_token::AuthenticatedUser}, db::{connection::DbPool, trips::{get_trip, get_trip_summaries, HistoryCursor}}};
+use crate::routes::utils::get_connection;
 
+// Viajes por página del historial
+const HISTORY_PAGE_SIZE: usize = 5;
 
-#[get("/<page>")]
-pub fn get_history(page: i64, token_raw: Token) -> Result< Json<DataResponse<Vec<Trip>>>, Custom<Json<ErrorResponse>>> {
-    let token_raw = token_raw.tkn.split(' ').collect::<Vec<&str>>()[1];
-    if authenticate(token_raw) {
-        let token_claims = get_claims_by_token(token_raw).unwrap();
-        let user = get_user_by_id(&token_claims.uid).unwrap();
+fn error(status: Status, message: &str) -> Custom<Json<ErrorResponse>> {
+    Custom(status, Json(ErrorResponse {
+        message: message.to_string(),
+    }))
+}
 
-        if user.username == token_claims.username {
-            let trips = get_trips_by_user_id(&user.id, page).unwrap();
+#[get("/?<cursor>")]
+pub fn get_history(cursor: Option<&str>, user: AuthenticatedUser, pool: &State<DbPool>) -> Result<Json<PageResponse<Vec<TripSummary>>>, Custom<Json<ErrorResponse>>> {
+    let after = match cursor.map(|cursor| cursor.parse::<HistoryCursor>()) {
+        Some(Ok(after)) => Some(after),
+        Some(Err(message)) => return Err(error(Status::BadRequest, message)),
+        None => None,
+    };
+    let connection = &mut get_connection(pool)?;
+    // se pide un viaje de más para saber si hay otra página
+    let mut trips = get_trip_summaries(connection, user.claims.uid, after, HISTORY_PAGE_SIZE as i64 + 1)
+        .map_err(|_| error(Status::InternalServerError, "Trips could not be loaded"))?;
 
-            let response = DataResponse {
-                data: trips,
-            };
-            return Ok(Json(response))
-        }
+    let mut next = None;
+    if trips.len() > HISTORY_PAGE_SIZE {
+        trips.truncate(HISTORY_PAGE_SIZE);
+        let last = &trips[HISTORY_PAGE_SIZE - 1];
+        next = Some(HistoryCursor { created_on: last.created_on, id: last.id }.to_string());
     }
-    let response = ErrorResponse {
-        message: "Invalid Token".to_string(),
-    };
-    Err(Custom(Status::Unauthorized, Json(response)))
-}
\ No newline at end of file
+    Ok(Json(PageResponse {
+        data: trips,
+        next,
+    }))
+}
+
+#[get("/trip/<id>")]
+pub fn get_history_trip(id: i32, user: AuthenticatedUser, pool: &State<DbPool>) -> Result<Json<DataResponse<Trip>>, Custom<Json<ErrorResponse>>> {
+    let connection = &mut get_connection(pool)?;
+    let trip = get_trip(connection, user.claims.uid, id)
+        .map_err(|_| error(Status::InternalServerError, "Trip could not be loaded"))?
+        .ok_or_else(|| error(Status::NotFound, "Trip not found"))?;
+    // los viajes guardados como geometría compacta se devuelven con la misma forma
+    let trip = trip
+        .with_path()
+        .map_err(|_| error(Status::InternalServerError, "Trip could not be loaded"))?;
+
+    Ok(Json(DataResponse {
+        data: trip,
+    }))
+}
@@ -1,6 +1,7 @@
-use rocket::{post, http::Status, response::status::Custom};
+use rocket::{post, http::Status, response::status::Custom, State};
 use rocket::serde::{Deserialize, json::Json};
-use crate::db::users::get_user;
+use crate::db::{connection::DbPool, users::get_user};
+use crate::routes::utils::get_connection;
 use crate::utils::{hash::hash_password, response::*, claims::Claims, rate_limit::RateLimitGuard};
 use jsonwebtoken::{encode, Header, EncodingKey, get_current_timestamp};
 use dotenvy::dotenv;
@@ -16,9 +17,10 @@ pub struct Body<'r> {
 #[post("/", data="<body>")]
 pub fn login(
     _rate_limit: RateLimitGuard,
-    body: Json<Body<'_>>
+    body: Json<Body<'_>>,
+    pool: &State<DbPool>
 ) -> Result<Json<OkResponse>, Custom<Json<ErrorResponse>>> {
-    let query_response = get_user(body.email);
+    let query_response = get_user(&mut get_connection(pool)?, body.email);
     let token: String;
     
     match query_response {
@@ -0,0 +1,156 @@
+use crate::{
+    db::connection::{pool_status, DbPool},
+    ds::lru::CacheStats,
+    global::{compute_queue_status, Data},
+    utils::metrics::{write_sample, METRICS, UNMATCHED},
+};
+use dotenvy::dotenv;
+use once_cell::sync::Lazy;
+use rocket::{
+    fairing::{Fairing, Info, Kind},
+    get,
+    http::{ContentType, Status},
+    request::{FromRequest, Outcome},
+    Orbit, Request, Response, Rocket, State,
+};
+use std::{
+    env,
+    sync::{atomic::Ordering, Arc},
+    time::Instant,
+};
+
+// Token que debe enviar quien lee /metrics; sin METRICS_TOKEN no se sirven
+static METRICS_TOKEN: Lazy<Option<String>> = Lazy::new(|| {
+    dotenv().ok();
+    env::var("METRICS_TOKEN").ok().filter(|token| !token.is_empty())
+});
+
+/// Acceso a /metrics con `Authorization: Bearer <METRICS_TOKEN>`. Las
+/// métricas muestran el estado interno del servidor, así que sin token
+/// configurado la ruta responde 404.
+pub struct MetricsAccess;
+
+#[rocket::async_trait]
+impl<'r> FromRequest<'r> for MetricsAccess {
+    type Error = ();
+
+    async fn from_request(req: &'r Request<'_>) -> Outcome<MetricsAccess, ()> {
+        let expected = match METRICS_TOKEN.as_deref() {
+            Some(token) => token,
+            None => return Outcome::Error((Status::NotFound, ())),
+        };
+        let given = req
+            .headers()
+            .get_one("Authorization")
+            .and_then(|header| header.strip_prefix("Bearer "))
+            .unwrap_or("");
+        if tokens_match(given, expected) {
+            Outcome::Success(MetricsAccess)
+        } else {
+            Outcome::Error((Status::Unauthorized, ()))
+        }
+    }
+}
+
+// Comparación en tiempo constante para no filtrar el token por el tiempo de respuesta
+fn tokens_match(given: &str, expected: &str) -> bool {
+    given.len() == expected.len()
+        && given
+            .bytes()
+            .zip(expected.bytes())
+            .fold(0u8, |diff, (a, b)| diff | (a ^ b))
+            == 0
+}
+
+// Momento en que llegó la petición, guardado en la caché local de la petición
+struct RequestStart(Instant);
+
+/// Cuenta las peticiones en curso y registra la latencia y el estado de cada
+/// respuesta por endpoint. Se adjunta después de los demás fairings para
+/// incluir su tiempo (p. ej. la compresión).
+pub struct RequestMetrics;
+
+#[rocket::async_trait]
+impl Fairing for RequestMetrics {
+    fn info(&self) -> Info {
+        Info {
+            name: "Request metrics",
+            kind: Kind::Liftoff | Kind::Request | Kind::Response,
+        }
+    }
+
+    async fn on_liftoff(&self, rocket: &Rocket<Orbit>) {
+        METRICS.register_endpoints(rocket.routes().filter_map(|route| route.name.as_ref().map(|name| name.to_string())));
+    }
+
+    async fn on_request(&self, req: &mut Request<'_>, _: &mut rocket::Data<'_>) {
+        req.local_cache(|| RequestStart(Instant::now()));
+        METRICS.in_flight.fetch_add(1, Ordering::Relaxed);
+    }
+
+    async fn on_response<'r>(&self, req: &'r Request<'_>, res: &mut Response<'r>) {
+        METRICS.in_flight.fetch_sub(1, Ordering::Relaxed);
+        let elapsed = req.local_cache(|| RequestStart(Instant::now())).0.elapsed();
+        let endpoint = req.route().and_then(|route| route.name.as_deref()).unwrap_or(UNMATCHED);
+        if let Some(metrics) = METRICS.endpoint(endpoint) {
+            metrics.record(res.status().code, elapsed);
+        }
+    }
+}
+
+// Una muestra por caché
+fn write_cache(out: &mut String, name: &str, kind: &str, help: &str, routes: &CacheStats, snaps: &CacheStats, value: fn(&CacheStats) -> f64) {
+    write_sample(out, name, kind, help, &[
+        ("cache=\"routes\"", value(routes)),
+        ("cache=\"snaps\"", value(snaps)),
+    ]);
+}
+
+#[get("/metrics")]
+pub fn metrics(_access: MetricsAccess, state: &State<Arc<Data>>, pool: &State<DbPool>) -> (ContentType, String) {
+    let mut out = String::with_capacity(16 * 1024);
+    METRICS.render(&mut out);
+
+    // cachés en memoria
+    let routes = state.caches.routes.stats();
+    let snaps = state.caches.snaps.stats();
+    write_cache(&mut out, "tsp_cache_hits_total", "counter", "Cache lookups that found a value.", &routes, &snaps, |s| s.hits as f64);
+    write_cache(&mut out, "tsp_cache_misses_total", "counter", "Cache lookups that found nothing.", &routes, &snaps, |s| s.misses as f64);
+    write_cache(&mut out, "tsp_cache_evictions_total", "counter", "Entries evicted to stay within budget.", &routes, &snaps, |s| s.evictions as f64);
+    write_cache(&mut out, "tsp_cache_entries", "gauge", "Entries in the cache.", &routes, &snaps, |s| s.entries as f64);
+    write_cache(&mut out, "tsp_cache_bytes", "gauge", "Estimated memory used by the cache.", &routes, &snaps, |s| s.bytes as f64);
+
+    // pool de conexiones a la base de datos
+    let db = pool_status(pool);
+    write_sample(&mut out, "tsp_db_pool_connections", "gauge", "Database connections by state.", &[
+        ("state=\"idle\"", db.idle as f64),
+        ("state=\"in_use\"", db.in_use as f64),
+    ]);
+    write_sample(&mut out, "tsp_db_pool_max_connections", "gauge", "Size limit of the pool.", &[("", db.max_size as f64)]);
+    write_sample(&mut out, "tsp_db_pool_checkouts_total", "counter", "Connections handed out.", &[("", db.checkouts as f64)]);
+    write_sample(&mut out, "tsp_db_pool_timeouts_total", "counter", "Checkouts that timed out.", &[("", db.timeouts as f64)]);
+    write_sample(&mut out, "tsp_db_pool_wait_seconds_total", "counter", "Time spent waiting for connections.", &[
+        ("", db.wait_micros as f64 / 1e6),
+    ]);
+
+    // cola de cálculo
+    let compute = compute_queue_status();
+    write_sample(&mut out, "tsp_compute_queue_jobs", "gauge", "Trip computations running or waiting.", &[("", compute.admitted as f64)]);
+    write_sample(&mut out, "tsp_compute_queue_limit", "gauge", "Computations admitted before answering 503.", &[("", compute.limit as f64)]);
+    write_sample(&mut out, "tsp_compute_threads", "gauge", "Threads of the compute pool.", &[("", compute.threads as f64)]);
+
+    (ContentType::new("text", "plain").with_params(("version", "0.0.4")), out)
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn test_tokens_match() {
+        assert!(tokens_match("s3cret", "s3cret"));
+        assert!(!tokens_match("s3creT", "s3cret"));
+        assert!(!tokens_match("s3cre", "s3cret"));
+        assert!(!tokens_match("", "s3cret"));
+    }
+}
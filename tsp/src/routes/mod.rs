@@ -4,3 +4,5 @@ pub mod signup;
 pub mod utils;
 pub mod history;
 pub mod user;
+pub mod metrics;
+pub mod timing;
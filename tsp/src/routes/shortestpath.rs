@@ -1,14 +1,33 @@
 use crate::{
-    algo::{tsp_solver::TspSolver, shortest_paths::{harvesine_heuristic, astar, reconstruct_path}},
-    global::Data,
+    algo::tsp_solver::{TspSolver, MAX_LOCATIONS_WITHOUT_CH},
+    global::{submit_compute, Data, COMPUTE_POOL},
     utils::{
-        auth_token::Token, authenticate::{authenticate, get_claims_by_token}, coordinate::Coordinate,
-        response::ErrorResponse, trip::{Trip, Location}, path::{Path, PathLocation},
-    }, db::{trips::create_trip, users::get_user_by_id},
+        auth_token::AuthenticatedUser, coordinate::Coordinate, metrics::{Stage, METRICS}, trace,
+        response::ErrorResponse, trip::{Trip, Location}, path::Path,
+    }, db::trip_writer::{PendingTrip, TripWriter}, routes::timing::RequestTrace,
+};
+use rayon::prelude::*;
+use rocket::{
+    http::{ContentType, Header, Status}, post, request::{FromRequest, Outcome, Request},
+    response::status::Custom, serde::json::Json, Responder, State,
 };
-use rocket::{http::Status, post, response::status::Custom, serde::json::Json, State};
 use serde::Serialize;
-use std::error::Error;
+use std::{error::Error, sync::Arc, time::Instant};
+
+// Nodos del grafo que se prueban por ubicación cuando el más cercano no tiene ruta
+const SNAP_CANDIDATES: usize = 5;
+
+// Pares de candidatos que se prueban, uno tras otro, cuando el par más cercano
+// no tiene ruta; cada búsqueda fallida recorre todo lo alcanzable
+const FALLBACK_PAIRS: usize = 4;
+
+// Segundos que se sugiere esperar cuando la cola de cálculo está llena
+const RETRY_AFTER_SECONDS: &str = "1";
+
+// Tipo que el cliente puede aceptar para recibir la ruta como polyline codificada;
+// el subtipo es el que lleva el Content-Type de esas respuestas
+const POLYLINE_MEDIA_TYPE: &str = "application/vnd.tsp.polyline+json";
+const POLYLINE_MEDIA_SUBTYPE: &str = "vnd.tsp.polyline+json";
 
 
 #[derive(Serialize)]
@@ -18,151 +37,221 @@ pub struct DijkstraOutput {
     pub distance: f64,
 }
 
-#[post("/shortestpath", data = "<data>")]
-pub fn shortestpath(
-    token_raw: Token,
-    mut data: Json<Trip>,
-    state: &State<Data>,
-) -> Result<Json<Path>, Custom<Json<ErrorResponse>>> {
-    let token_raw = token_raw.tkn.split(' ').collect::<Vec<&str>>()[1];
-    if authenticate(token_raw) {
-        // Validar número de ubicaciones para prevenir DoS
-        if data.locations.len() < 2 {
-            return Err(Custom(Status::BadRequest, Json(ErrorResponse {
-                message: "At least 2 locations are required".to_string(),
-            })));
-        }
-        
-        if data.locations.len() > 10 {
-            return Err(Custom(Status::BadRequest, Json(ErrorResponse {
-                message: "Maximum 10 locations allowed to prevent resource exhaustion".to_string(),
-            })));
-        }
-        
-        // Validar longitud del título
-        if data.title.len() < 1 || data.title.len() > 100 {
-            return Err(Custom(Status::BadRequest, Json(ErrorResponse {
-                message: "Title must be between 1 and 100 characters".to_string(),
-            })));
+/// Ruta calculada con el tipo de la forma elegida. `Vary: Accept` evita que un
+/// caché entregue una forma a quien pidió la otra.
+#[derive(Responder)]
+pub struct PathResponse {
+    body: String,
+    content_type: ContentType,
+    vary: Header<'static>,
+}
+
+#[derive(Responder)]
+pub enum ShortestPathError {
+    Failed(Custom<Json<ErrorResponse>>),
+    #[response(status = 503)]
+    Busy(Json<ErrorResponse>, Header<'static>),
+}
+
+/// Forma de la respuesta: la ruta como coordenadas JSON (por defecto) o como
+/// polyline codificada, pedida con `?format=polyline` o con el header Accept.
+#[derive(Debug, Clone, Copy, PartialEq)]
+pub enum PathFormat {
+    Json,
+    Polyline,
+}
+
+#[rocket::async_trait]
+impl<'r> FromRequest<'r> for PathFormat {
+    type Error = ();
+
+    async fn from_request(req: &'r Request<'_>) -> Outcome<PathFormat, ()> {
+        let by_query = matches!(req.query_value::<&str>("format"), Some(Ok("polyline")));
+        let by_accept = req.headers().get_one("Accept").map_or(false, |accept| accept.contains(POLYLINE_MEDIA_TYPE));
+        Outcome::Success(if by_query || by_accept { PathFormat::Polyline } else { PathFormat::Json })
+    }
+}
+
+impl PathFormat {
+    fn content_type(self) -> ContentType {
+        match self {
+            PathFormat::Json => ContentType::JSON,
+            PathFormat::Polyline => ContentType::new("application", POLYLINE_MEDIA_SUBTYPE),
         }
-        
-        let mut nodes: Vec<Coordinate> = Vec::new();
-        for i in 0..data.locations.len() {
-            data.locations[i].coordinates.id = data.locations[i].id;
-            nodes.push(data.locations[i].coordinates);
+    }
+}
+
+fn failed(status: Status, message: &str) -> ShortestPathError {
+    ShortestPathError::Failed(Custom(status, Json(ErrorResponse {
+        message: message.to_string(),
+    })))
+}
+
+fn busy() -> ShortestPathError {
+    ShortestPathError::Busy(
+        Json(ErrorResponse { message: "Server is busy, try again later".to_string() }),
+        Header::new("Retry-After", RETRY_AFTER_SECONDS),
+    )
+}
+
+#[post("/shortestpath", data = "<data>")]
+pub async fn shortestpath(
+    user: AuthenticatedUser,
+    data: Json<Trip>,
+    state: &State<Arc<Data>>,
+    writer: &State<TripWriter>,
+    format: PathFormat,
+    request_trace: RequestTrace,
+) -> Result<PathResponse, ShortestPathError> {
+    // Validar número de ubicaciones para prevenir DoS
+    if data.locations.len() < 2 {
+        return Err(failed(Status::BadRequest, "At least 2 locations are required"));
+    }
+
+    if data.locations.len() > 200 {
+        return Err(failed(Status::BadRequest, "Maximum 200 locations allowed to prevent resource exhaustion"));
+    }
+
+    // sin CH la matriz de distancias cuesta un Dijkstra por ubicación
+    if state.ch.is_none() && data.locations.len() > *MAX_LOCATIONS_WITHOUT_CH {
+        let message = format!("Maximum {} locations allowed on this server", *MAX_LOCATIONS_WITHOUT_CH);
+        return Err(failed(Status::BadRequest, &message));
+    }
+
+    // Validar longitud del título
+    if data.title.len() < 1 || data.title.len() > 100 {
+        return Err(failed(Status::BadRequest, "Title must be between 1 and 100 characters"));
+    }
+
+    // el cálculo se hace en el pool de cómputo para no bloquear los workers de Rocket;
+    // si la cola está llena se rechaza de inmediato
+    let request_trace = request_trace.0;
+    if let Some(request_trace) = &request_trace {
+        request_trace.add("locations", data.locations.len() as u64);
+    }
+    let state = state.inner().clone();
+    let mut data = data.into_inner();
+    let job_trace = request_trace.clone();
+    let queued = Instant::now();
+    let job = submit_compute(move || {
+        trace::scope(job_trace, || {
+            trace::record("compute_queue", queued, queued.elapsed());
+            solve_trip(&state, &mut data).map(|response| (data, response))
+        })
+    });
+    let job = match job {
+        Ok(job) => job,
+        Err(_) => return Err(busy()),
+    };
+    let (data, response) = match job.await {
+        Ok(Ok(result)) => result,
+        Ok(Err(message)) => return Err(failed(Status::BadRequest, &message)),
+        Err(_) => return Err(failed(Status::InternalServerError, "Trip could not be computed")),
+    };
+
+    // la respuesta se serializa aquí, y no en el responder, para medir cuánto tarda
+    trace::scope(request_trace, || {
+        let reply = METRICS.time(Stage::Serialize, || match format {
+            PathFormat::Json => serde_json::to_string(&response),
+            PathFormat::Polyline => serde_json::to_string(&response.to_encoded()),
+        });
+        let reply = match reply {
+            Ok(reply) => PathResponse {
+                body: reply,
+                content_type: format.content_type(),
+                vary: Header::new("Vary", "Accept"),
+            },
+            Err(_) => return Err(failed(Status::InternalServerError, "Trip could not be computed")),
+        };
+
+        // el viaje se guarda en segundo plano; la respuesta no espera a la base de datos
+        let trip = PendingTrip::new(user.claims.uid, data.title, data.locations, response);
+        // con la base de datos caída y el disco saturado se pide reintentar
+        if trace::span("queue_trip", || writer.submit(trip)).is_err() {
+            return Err(busy());
         }
-        
-        let mut tsp = TspSolver::new(&state.graph, &state.map_id_to_coordinates, nodes);
-        let results = tsp.held_karp_solve().unwrap();
-
-        let mut new_locations: Vec<Location> = Vec::new();
-        for i in 0..results.len() {
-            for e in 0..data.locations.len() {
-                if results[i] == data.locations[e].id {
-                    new_locations.push(data.locations[e].clone());
-                }
+        Ok(reply)
+    })
+}
+
+// Ordena las ubicaciones del viaje y construye la ruta completa. Corre en el pool de cómputo.
+fn solve_trip(state: &Data, data: &mut Trip) -> Result<Path, String> {
+    let mut nodes: Vec<Coordinate> = Vec::new();
+    for i in 0..data.locations.len() {
+        data.locations[i].coordinates.id = data.locations[i].id;
+        nodes.push(data.locations[i].coordinates);
+    }
+
+    let mut tsp = TspSolver::new(state, nodes);
+    let results = tsp.solve(data.solver).map_err(|e| e.to_string())?;
+
+    let mut new_locations: Vec<Location> = Vec::new();
+    for i in 0..results.len() {
+        for e in 0..data.locations.len() {
+            if results[i] == data.locations[e].id {
+                new_locations.push(data.locations[e].clone());
             }
         }
-        data.locations = new_locations;
-
-        let distance_path = build_path(&data.locations, &state);
-        let response = match distance_path {
-            Ok(d_p) => {
-                let mut path_aux: Vec<PathLocation> = Vec::new();
-                for i in 0..data.locations.len() {
-                    path_aux.push(PathLocation { location: data.locations[i].coordinates, label: format!("{}", i+1) });
-                }
-                Path {
-                    title: data.title.clone(),
-                    path: d_p.1,
-                    distance: d_p.0,
-                    locations: path_aux
-                }
-            },
-            Err(message) => {
-                let response: ErrorResponse = ErrorResponse {
-                    message: message.to_string(),
-                };
-                return Err(Custom(Status::BadRequest, Json(response)));
-            }
-        };
-        let token_claims = get_claims_by_token(token_raw).unwrap();
-        let user = get_user_by_id(&token_claims.uid).unwrap();
-
-        let _created_trip = create_trip(
-            &user.id,
-            &data.title,
-            &data.locations,
-            &response,
-            &response.distance,
-            &false,
-            &diesel::dsl::now
-        ).unwrap();
-
-        Ok(Json(response))
-
-    } else {
-        let response: ErrorResponse = ErrorResponse {
-            message: "Invalid session token".to_string(),
-        };
-        Err(Custom(Status::Unauthorized, Json(response)))
     }
-}
+    data.locations = new_locations;
 
-pub fn approximate_coordinate(state: &State<Data>, coordinate: &Coordinate) -> Vec<Vec<f64>> {
-    //try to approximate coordinate using kd-tree
-    let latitude: f64 = coordinate.lat;
-    let longitude: f64 = coordinate.lng;
-    let nodes = state
-        .kd_tree
-        .get_n_nearest_neighbor(&vec![latitude, longitude], 5)
-        .unwrap();
-   nodes
+    let d_p = build_path(&data.locations, state).map_err(|e| e.to_string())?;
+    Ok(Path::new(data.title.clone(), d_p.1, d_p.0, &data.locations))
 }
 
-pub fn build_path(path: &Vec<Location>, state: &State<Data>) -> Result<(f64, Vec<Coordinate>), Box<dyn Error>> {
+pub fn build_path(path: &Vec<Location>, state: &Data) -> Result<(f64, Vec<Coordinate>), Box<dyn Error>> {
+    // se aproximan todas las ubicaciones al tramo de vía más cercano; sus extremos
+    // son los primeros candidatos de cada tramo
+    let coordinates: Vec<Coordinate> = path.iter().map(|location| location.coordinates).collect();
+
+    // los tramos son independientes: se calculan en paralelo y se unen en orden
+    let legs: Vec<Option<(f64, Vec<usize>)>> = COMPUTE_POOL.install(|| {
+        let candidates = state.snap(&coordinates, SNAP_CANDIDATES);
+        // los tramos corren en otros hilos del pool; se registran en la traza de la petición
+        let request_trace = trace::current();
+        METRICS.time(Stage::PathLegs, || {
+            candidates
+                .par_windows(2)
+                .map(|leg| trace::scope(request_trace.clone(), || route_leg(state, &leg[0], &leg[1])))
+                .collect()
+        })
+    });
+
     let mut new_path: Vec<Coordinate> = vec![];
     let mut distance:f64 = 0.;
-    for i in 0..path.len() - 1 {
-
-        let start_approximation = approximate_coordinate(state, &path[i].coordinates);
-        let end_approximation: Vec<Vec<f64>> = approximate_coordinate(state, &path[i+1].coordinates);
-
-        let mut resolved_path: bool = false;
-        for e in 0..start_approximation.len() {
-            if resolved_path { break; }
-
-            let min_len = if e < end_approximation.len() { e } else { end_approximation.len() };
-            for j in 0..min_len {
-                let src: usize = start_approximation[e][2] as usize;
-                let dest: usize = end_approximation[j][2] as usize;
-                let dijkstra_result = astar(&state.graph, &state.map_id_to_coordinates, src, dest, &harvesine_heuristic);
-                
-                match dijkstra_result {
-                    Ok(ok_path) => {
-                        distance += ok_path.0;
-                        let results = reconstruct_path(ok_path.1, dest).unwrap();
-
-                        for r in results {
-                            let node = state.map_id_to_coordinates.get(&r).unwrap().clone();
-                            new_path.push(node);
-                        }
-                        resolved_path = true;
-                        break;
-                    },
-                    Err(_) => {
-                        continue;
-                    }
-                }
-            }
+    for leg in legs {
+        let (leg_distance, nodes) = leg.ok_or("No path found")?;
+        distance += leg_distance;
+        for r in nodes {
+            let node = state.map_id_to_coordinates.get(r).unwrap();
+            new_path.push(node);
         }
+    }
 
-        if !resolved_path {
-            return Err("No path found".into())
+    return Ok((distance, new_path));
+}
+
+fn route_leg(state: &Data, start_candidates: &[usize], end_candidates: &[usize]) -> Option<(f64, Vec<usize>)> {
+    // los pares se ordenan por la suma de las posiciones de sus candidatos, así
+    // los primeros respaldos cambian tanto el inicio como el final
+    let mut pairs: Vec<(usize, usize, usize)> = vec![];
+    for (i, &s) in start_candidates.iter().enumerate() {
+        for (j, &e) in end_candidates.iter().enumerate() {
+            pairs.push((i + j, s, e));
         }
     }
+    pairs.sort_by_key(|&(rank, _, _)| rank);
 
-    return Ok((distance, new_path));
+    // el par más cercano (el que usó la matriz de distancias) casi siempre tiene
+    // ruta; si no, se prueban unos pocos pares más en orden y se para en el primero
+    let mut pairs = pairs.into_iter().map(|(_, s, e)| (s, e)).take(1 + FALLBACK_PAIRS);
+    let (src, dest) = pairs.next()?;
+    state.shortest_path(src, dest).ok().or_else(|| {
+        pairs.find_map(|(src, dest)| {
+            trace::add("candidate_retries", 1);
+            state.shortest_path(src, dest).ok()
+        })
+    })
 }
 
 #[cfg(test)]
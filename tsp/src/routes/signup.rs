@@ -1,8 +1,9 @@
 use diesel;
 use regex::Regex;
-use rocket::{post, http::Status, response::status::Custom};
+use rocket::{post, http::Status, response::status::Custom, State};
 use rocket::serde::{Deserialize, json::Json};
-use crate::db::users::create_user;
+use crate::db::{connection::DbPool, users::create_user};
+use crate::routes::utils::get_connection;
 use crate::utils::{salt::gen_salt, hash::hash_password, response::*, claims::Claims, rate_limit::RateLimitGuard};
 use jsonwebtoken::{encode, Header, EncodingKey, get_current_timestamp};
 use dotenvy::dotenv;
@@ -43,7 +44,8 @@ fn validate_username(username: &str) -> bool {
 #[post("/", data="<body>")]
 pub fn sign_up(
     _rate_limit: RateLimitGuard,
-    body: Json<Body<'_>>
+    body: Json<Body<'_>>,
+    pool: &State<DbPool>
 ) -> Result<Json<OkResponse>, Custom<Json<ErrorResponse>>>{
     // Validar longitud del nombre
     if body.name.len() < 2 || body.name.len() > 100 {
@@ -76,6 +78,7 @@ pub fn sign_up(
     let salt: String = gen_salt();
     let password_hashed: String = hash_password(&salt, body.password);
     match create_user(
+            &mut get_connection(pool)?,
             &body.name.to_string(),
             &body.username.to_string(),
             &body.email.to_string(),
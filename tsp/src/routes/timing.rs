@@ -0,0 +1,165 @@
+use crate::utils::trace::{Span, Trace};
+use chrono::Utc;
+use dotenvy::dotenv;
+use rocket::{
+    fairing::{Fairing, Info, Kind},
+    http::Header,
+    request::{FromRequest, Outcome},
+    tokio::task,
+    Request, Response,
+};
+use serde::Serialize;
+use std::{
+    collections::BTreeMap,
+    env,
+    fs::OpenOptions,
+    io::Write,
+    sync::{Arc, Mutex},
+    time::Duration,
+};
+
+// Header con el que un cliente pide el desglose de tiempos en la respuesta
+const TIMING_REQUEST_HEADER: &str = "X-Server-Timing";
+
+/// Traza de la petición, `None` si no se está trazando. Como guard, los
+/// handlers la usan para registrar sus etapas.
+#[derive(Clone)]
+pub struct RequestTrace(pub Option<Trace>);
+
+#[rocket::async_trait]
+impl<'r> FromRequest<'r> for RequestTrace {
+    type Error = ();
+
+    async fn from_request(req: &'r Request<'_>) -> Outcome<RequestTrace, ()> {
+        Outcome::Success(req.local_cache(|| RequestTrace(None)).clone())
+    }
+}
+
+// Si la respuesta lleva el header Server-Timing
+struct SendServerTiming(bool);
+
+#[derive(Debug, Clone, Copy, PartialEq)]
+enum ServerTiming {
+    Off,
+    OptIn,
+    Always,
+}
+
+#[derive(Serialize)]
+struct SlowRequest<'a> {
+    at: String,
+    method: &'a str,
+    path: &'a str,
+    status: u16,
+    duration_ms: f64,
+    counters: BTreeMap<&'static str, u64>,
+    spans: Vec<Span>,
+}
+
+// Peticiones lentas, un objeto JSON por línea
+struct SlowRequestLog {
+    threshold: Duration,
+    path: String,
+    lock: Arc<Mutex<()>>,
+}
+
+impl SlowRequestLog {
+    fn write(&self, line: Vec<u8>) {
+        let (path, lock) = (self.path.clone(), self.lock.clone());
+        // la escritura no bloquea al worker que responde
+        task::spawn_blocking(move || {
+            let _guard = lock.lock().unwrap();
+            let result = OpenOptions::new()
+                .create(true)
+                .append(true)
+                .open(&path)
+                .and_then(|mut file| file.write_all(&line));
+            if let Err(e) = result {
+                eprintln!("Could not log slow request: {}", e);
+            }
+        });
+    }
+}
+
+/// Traza las peticiones que piden el header Server-Timing y, si hay umbral
+/// de petición lenta, todas las demás, para guardar en un archivo las que lo
+/// superan con el desglose de sus etapas.
+pub struct RequestTracing {
+    timing: ServerTiming,
+    slow: Option<SlowRequestLog>,
+}
+
+impl RequestTracing {
+    /// SERVER_TIMING: "opt-in" (por defecto, con el header X-Server-Timing),
+    /// "always" u "off". SLOW_REQUEST_MS activa el registro de peticiones
+    /// lentas en SLOW_REQUEST_FILE ("slow-requests.jsonl").
+    pub fn from_env() -> Self {
+        dotenv().ok();
+        let timing = match env::var("SERVER_TIMING").as_deref() {
+            Ok("off") => ServerTiming::Off,
+            Ok("always") => ServerTiming::Always,
+            _ => ServerTiming::OptIn,
+        };
+        let slow = env::var("SLOW_REQUEST_MS")
+            .ok()
+            .and_then(|ms| ms.parse().ok())
+            .map(|ms| SlowRequestLog {
+                threshold: Duration::from_millis(ms),
+                path: env::var("SLOW_REQUEST_FILE").unwrap_or_else(|_| "slow-requests.jsonl".to_string()),
+                lock: Arc::new(Mutex::new(())),
+            });
+        Self { timing, slow }
+    }
+}
+
+#[rocket::async_trait]
+impl Fairing for RequestTracing {
+    fn info(&self) -> Info {
+        Info {
+            name: "Request tracing",
+            kind: Kind::Request | Kind::Response,
+        }
+    }
+
+    async fn on_request(&self, req: &mut Request<'_>, _: &mut rocket::Data<'_>) {
+        let send = match self.timing {
+            ServerTiming::Off => false,
+            ServerTiming::OptIn => req.headers().contains(TIMING_REQUEST_HEADER),
+            ServerTiming::Always => true,
+        };
+        if send || self.slow.is_some() {
+            req.local_cache(|| RequestTrace(Some(Trace::new())));
+        }
+        req.local_cache(|| SendServerTiming(send));
+    }
+
+    async fn on_response<'r>(&self, req: &'r Request<'_>, res: &mut Response<'r>) {
+        let trace = match &req.local_cache(|| RequestTrace(None)).0 {
+            Some(trace) => trace,
+            None => return,
+        };
+        let total = trace.elapsed();
+        if req.local_cache(|| SendServerTiming(false)).0 {
+            res.set_header(Header::new("Server-Timing", trace.server_timing(total)));
+        }
+
+        let slow = match &self.slow {
+            Some(slow) if total >= slow.threshold => slow,
+            _ => return,
+        };
+        let record = SlowRequest {
+            at: Utc::now().to_rfc3339(),
+            method: req.method().as_str(),
+            // sin la query, que puede llevar datos del usuario
+            path: req.uri().path().as_str(),
+            status: res.status().code,
+            duration_ms: total.as_secs_f64() * 1000.0,
+            counters: trace.counters().into_iter().collect(),
+            spans: trace.spans(),
+        };
+        if let Ok(mut line) = serde_json::to_vec(&record) {
+            line.push(b'\n');
+            slow.write(line);
+        }
+    }
+}
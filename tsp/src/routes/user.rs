@@ -1,26 +1,10 @@
-use rocket::{get, response::status::Custom, serde::json::Json, http::Status};
-use crate::{utils::{auth_token::Token, user::UserBriefDetails, response::ErrorResponse, authenticate::{authenticate, get_claims_by_token}}, db::users::get_user_by_id};
+use rocket::{get, response::status::Custom, serde::json::Json, State};
+use crate::{utils::{auth_token::AuthenticatedUser, user::UserBriefDetails, response::ErrorResponse}, db::{connection::DbPool, users::get_user_brief_details}};
+use crate::routes::utils::get_connection;
 
 #[get("/")]
-pub fn get_user_details(token_raw: Token) -> Result<Json<UserBriefDetails>, Custom<Json<ErrorResponse>>> {
-    let token_raw = token_raw.tkn.split(' ').collect::<Vec<&str>>()[1];
-    if authenticate(token_raw) {
-        let token_claims = get_claims_by_token(token_raw).unwrap();
-        let user = get_user_by_id(&token_claims.uid).unwrap();
-
-        if user.username == token_claims.username {
-            let user_details = UserBriefDetails {
-                name: user.name,
-                username: user.username,
-                email: user.email,
-                picture: user.picture
-            };
-
-            return Ok(Json(user_details))
-        }
-    }
-    let response = ErrorResponse {
-        message: "Invalid Token".to_string(),
-    };
-    Err(Custom(Status::Unauthorized, Json(response)))
-}
\ No newline at end of file
+pub fn get_user_details(user: AuthenticatedUser, pool: &State<DbPool>) -> Result<Json<UserBriefDetails>, Custom<Json<ErrorResponse>>> {
+    let connection = &mut get_connection(pool)?;
+    let user_details = get_user_brief_details(connection, &user.claims.uid).unwrap();
+    Ok(Json(user_details))
+}
@@ -1,12 +1,23 @@
 use crate::{
+    db::connection::{DbConnection, DbPool},
     ds::priority_queue::{MinHeap, Prioritiness},
-    utils::{coordinate::Coordinate, create_kd_tree_from_file},
+    utils::{coordinate::Coordinate, create_kd_tree_from_file, response::ErrorResponse},
 };
+use rocket::{http::Status, response::status::Custom, serde::json::Json};
 use std::{
     fs,
     time::{Duration, Instant},
 };
 
+/// Connection from the pool, or 503 when none frees up in time.
+pub fn get_connection(pool: &DbPool) -> Result<DbConnection, Custom<Json<ErrorResponse>>> {
+    pool.get().map_err(|_| {
+        Custom(Status::ServiceUnavailable, Json(ErrorResponse {
+            message: "Database is busy, try again later".to_string(),
+        }))
+    })
+}
+
 #[derive(Copy, Clone, Debug)]
 struct Distance {
     pub distance: f64,
@@ -79,7 +90,7 @@ pub fn compare_coordinates_approximation() {
     for test_coordinate in tests.iter() {
         let start = Instant::now();
         let _nearest_coordinate = kd_tree
-            .nearest_neighbor(&kd_tree.root, &vec![test_coordinate.lat, test_coordinate.lng], 0)
+            .nearest(test_coordinate.lat, test_coordinate.lng)
             .unwrap();
         let duration = start.elapsed();
         times_elapsed.push(duration);
@@ -6,10 +6,11 @@ diesel::table! {
         user_id -> Int4,
         title -> Nullable<Varchar>,
         locations -> Json,
-        path -> Json,
+        path -> Nullable<Json>,
         distance -> Float8,
         completed -> Bool,
         created_on -> Timestamp,
+        geometry -> Nullable<Bytea>,
     }
 }
 
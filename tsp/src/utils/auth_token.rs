@@ -1,24 +1,51 @@
 use rocket::request::{Request, FromRequest, Outcome};
 use rocket::http::Status;
+use rocket::tokio::task;
+use crate::db::{connection::DbPool, users::user_exists};
+use super::{authenticate::Authenticator, claims::Claims};
 
+/// Claims of a valid session token whose user exists. The token is decoded
+/// once per request and the database is only asked when the user is not
+/// in the authenticator's cache.
 #[derive(Debug)]
-pub struct Token<'r> {
-    pub tkn: &'r str
+pub struct AuthenticatedUser {
+    pub claims: Claims
 }
 
-
 #[rocket::async_trait]
-impl<'r> FromRequest<'r> for Token<'r> {
+impl<'r> FromRequest<'r> for AuthenticatedUser {
     type Error = ();
 
-    async fn from_request(req: &'r Request<'_>) -> Outcome<Token<'r>, ()> {
+    async fn from_request(req: &'r Request<'_>) -> Outcome<AuthenticatedUser, ()> {
+        let token = match req.headers().get_one("Authorization") {
+            Some(header) => header.split(' ').nth(1).unwrap_or(""),
+            None => return Outcome::Forward(Status::Unauthorized),
+        };
+        let authenticator = req.rocket().state::<Authenticator>().expect("Authenticator must be managed");
+        let claims = match authenticator.decode(token) {
+            Some(claims) => claims,
+            None => return Outcome::Error((Status::Unauthorized, ())),
+        };
+        if authenticator.is_known(&claims) {
+            return Outcome::Success(AuthenticatedUser { claims });
+        }
+
+        // usuario fuera de la caché: se confirma en la base de datos sin bloquear el worker
+        let pool = req.rocket().state::<DbPool>().expect("DbPool must be managed").clone();
+        let (uid, username) = (claims.uid, claims.username.clone());
+        let exists = task::spawn_blocking(move || {
+            let connection = &mut pool.get().map_err(|_| Status::ServiceUnavailable)?;
+            user_exists(connection, uid, &username).map_err(|_| Status::InternalServerError)
+        }).await;
 
-        match req.headers().get_one("Authorization") {
-            Some(token) => {
-                let token_raw = Token{tkn: token};
-                Outcome::Success(token_raw)
+        match exists {
+            Ok(Ok(true)) => {
+                authenticator.remember(&claims);
+                Outcome::Success(AuthenticatedUser { claims })
             },
-            None => Outcome::Forward(Status::Unauthorized),
+            Ok(Ok(false)) => Outcome::Error((Status::Unauthorized, ())),
+            Ok(Err(status)) => Outcome::Error((status, ())),
+            Err(_) => Outcome::Error((Status::InternalServerError, ())),
         }
     }
-}
\ No newline at end of file
+}
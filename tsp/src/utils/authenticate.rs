@@ -1,39 +1,147 @@
+use dashmap::DashMap;
 use jsonwebtoken::{decode, Algorithm, DecodingKey, Validation};
 use dotenvy::dotenv;
 use std::env;
-
-use crate::db::users::get_user;
+use std::time::{Duration, Instant};
 
 use super::claims::Claims;
 
-pub fn authenticate(token: &str) -> bool {
-    dotenv().ok();
-    let secret = env::var("SECRET_JWT").expect("SECRET_JWT must be set");
-    let token_data = decode::<Claims>(token, &DecodingKey::from_secret(secret.as_ref()), &Validation::new(Algorithm::HS256));
-    match token_data {
-        Ok(token) => {
-            let claims = token.claims;
-            if claims.exp < claims.iat {
-                return false;
-            }
-            get_user(&claims.username).is_ok()
-        },
-        Err(_) => {
-            false
+// Seconds a confirmed user is trusted without asking the database again
+const DEFAULT_USER_TTL_SECONDS: u64 = 60;
+// Expired entries are swept when the cache grows past this many users
+const SWEEP_THRESHOLD: usize = 10_000;
+
+/// Verifies session tokens. Built once at startup and kept in managed
+/// state: the decoding key is derived from SECRET_JWT a single time, and
+/// users confirmed to exist are remembered for a short TTL so most
+/// requests are authenticated without a database round trip. Code that
+/// renames or deletes users calls `invalidate`; otherwise the TTL bounds
+/// how long the tokens of a removed user keep working.
+pub struct Authenticator {
+    key: DecodingKey,
+    validation: Validation,
+    ttl: Duration,
+    // uid -> (username, confirmed until)
+    users: DashMap<i32, (String, Instant)>,
+}
+
+impl Authenticator {
+    pub fn new(secret: &str, ttl: Duration) -> Self {
+        Self {
+            key: DecodingKey::from_secret(secret.as_ref()),
+            validation: Validation::new(Algorithm::HS256),
+            ttl,
+            users: DashMap::new(),
+        }
+    }
+
+    /// Reads SECRET_JWT and AUTH_CACHE_TTL_SECONDS (60 by default, 0
+    /// disables the user cache).
+    pub fn from_env() -> Self {
+        dotenv().ok();
+        let secret = env::var("SECRET_JWT").expect("SECRET_JWT must be set");
+        let ttl = env::var("AUTH_CACHE_TTL_SECONDS")
+            .ok()
+            .and_then(|seconds| seconds.parse().ok())
+            .unwrap_or(DEFAULT_USER_TTL_SECONDS);
+        Self::new(&secret, Duration::from_secs(ttl))
+    }
+
+    /// Claims of a well formed, correctly signed and unexpired token.
+    pub fn decode(&self, token: &str) -> Option<Claims> {
+        let claims = decode::<Claims>(token, &self.key, &self.validation).ok()?.claims;
+        if claims.exp < claims.iat {
+            return None;
+        }
+        Some(claims)
+    }
+
+    /// Whether the user of `claims` was confirmed to exist within the TTL.
+    pub fn is_known(&self, claims: &Claims) -> bool {
+        match self.users.get(&claims.uid) {
+            Some(entry) => entry.0 == claims.username && entry.1 > Instant::now(),
+            None => false,
+        }
+    }
+
+    pub fn remember(&self, claims: &Claims) {
+        if self.ttl.is_zero() {
+            return;
+        }
+        let now = Instant::now();
+        if self.users.len() >= SWEEP_THRESHOLD {
+            self.users.retain(|_, entry| entry.1 > now);
         }
+        self.users.insert(claims.uid, (claims.username.clone(), now + self.ttl));
+    }
+
+    /// Forgets a user, e.g. after it is renamed or deleted, so its tokens
+    /// are checked against the database again.
+    pub fn invalidate(&self, uid: i32) {
+        self.users.remove(&uid);
+    }
+
+    pub fn invalidate_all(&self) {
+        self.users.clear();
     }
 }
 
-pub fn get_claims_by_token(token: &str) -> Result<Claims, &str> {
-    dotenv().ok();
-    let secret = env::var("SECRET_JWT").expect("SECRET_JWT must be set");
-    let token_data = decode::<Claims>(token, &DecodingKey::from_secret(secret.as_ref()), &Validation::new(Algorithm::HS256));
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use jsonwebtoken::{encode, get_current_timestamp, EncodingKey, Header};
 
-    match token_data {
-        Ok(token) => {
-            Ok(token.claims)
-        },
-        Err(_) => Err("Invalid Token")
+    fn token(secret: &str, claims: &Claims) -> String {
+        encode(&Header::default(), claims, &EncodingKey::from_secret(secret.as_ref())).unwrap()
     }
 
-}
\ No newline at end of file
+    fn claims(uid: i32, username: &str) -> Claims {
+        let now = get_current_timestamp();
+        Claims { uid, username: username.to_string(), iat: now, exp: now + 3600 }
+    }
+
+    #[test]
+    fn test_decode_checks_signature_and_expiry() {
+        let auth = Authenticator::new("secret", Duration::from_secs(60));
+        let decoded = auth.decode(&token("secret", &claims(3, "ana"))).unwrap();
+        assert_eq!((decoded.uid, decoded.username.as_str()), (3, "ana"));
+
+        assert!(auth.decode(&token("other", &claims(3, "ana"))).is_none());
+        assert!(auth.decode("not a token").is_none());
+        let mut expired = claims(3, "ana");
+        expired.exp = expired.iat - 3600;
+        assert!(auth.decode(&token("secret", &expired)).is_none());
+    }
+
+    #[test]
+    fn test_known_users_invalidate() {
+        let auth = Authenticator::new("secret", Duration::from_secs(60));
+        let ana = claims(3, "ana");
+        assert!(!auth.is_known(&ana));
+        auth.remember(&ana);
+        assert!(auth.is_known(&ana));
+        // a token for the same id with another username is not trusted
+        assert!(!auth.is_known(&claims(3, "bob")));
+        auth.invalidate(3);
+        assert!(!auth.is_known(&ana));
+
+        auth.remember(&ana);
+        auth.remember(&claims(4, "bea"));
+        auth.invalidate_all();
+        assert!(!auth.is_known(&ana));
+
+        let uncached = Authenticator::new("secret", Duration::ZERO);
+        uncached.remember(&ana);
+        assert!(!uncached.is_known(&ana));
+    }
+
+    #[test]
+    fn test_known_users_expire() {
+        let auth = Authenticator::new("secret", Duration::from_millis(50));
+        let ana = claims(3, "ana");
+        auth.remember(&ana);
+        assert!(auth.is_known(&ana));
+        std::thread::sleep(Duration::from_millis(60));
+        assert!(!auth.is_known(&ana));
+    }
+}
@@ -0,0 +1,171 @@
+use rocket::fairing::{Fairing, Info, Kind};
+use rocket::http::{ContentType, Header};
+use rocket::tokio::task;
+use rocket::{Request, Response};
+use std::io::{Cursor, Write};
+
+// Smaller bodies are sent as they are: compressing them saves less than
+// the framing costs.
+const DEFAULT_MIN_SIZE: usize = 1024;
+// Fast settings; responses are compressed on every request.
+const BROTLI_QUALITY: u32 = 5;
+const BROTLI_WINDOW: u32 = 22;
+
+#[derive(Debug, Clone, Copy, PartialEq)]
+enum Encoding {
+    Brotli,
+    Gzip,
+}
+
+impl Encoding {
+    fn name(self) -> &'static str {
+        match self {
+            Encoding::Brotli => "br",
+            Encoding::Gzip => "gzip",
+        }
+    }
+
+    fn compress(self, body: &[u8]) -> std::io::Result<Vec<u8>> {
+        match self {
+            Encoding::Brotli => {
+                let mut writer = brotli::CompressorWriter::new(Vec::new(), 4096, BROTLI_QUALITY, BROTLI_WINDOW);
+                writer.write_all(body)?;
+                Ok(writer.into_inner())
+            }
+            Encoding::Gzip => {
+                let mut encoder = flate2::write::GzEncoder::new(Vec::new(), flate2::Compression::default());
+                encoder.write_all(body)?;
+                encoder.finish()
+            }
+        }
+    }
+}
+
+/// Compresses JSON and text responses with brotli or gzip, whichever the
+/// client prefers in Accept-Encoding. Compression runs on a blocking
+/// thread so large routes do not stall the async workers.
+pub struct ResponseCompression {
+    min_size: usize,
+}
+
+impl ResponseCompression {
+    pub fn new(min_size: usize) -> Self {
+        Self { min_size }
+    }
+}
+
+impl Default for ResponseCompression {
+    fn default() -> Self {
+        Self::new(DEFAULT_MIN_SIZE)
+    }
+}
+
+#[rocket::async_trait]
+impl Fairing for ResponseCompression {
+    fn info(&self) -> Info {
+        Info {
+            name: "Response compression",
+            kind: Kind::Response,
+        }
+    }
+
+    async fn on_response<'r>(&self, req: &'r Request<'_>, res: &mut Response<'r>) {
+        if res.headers().contains("Content-Encoding") || !is_compressible(res.content_type()) {
+            return;
+        }
+        let encoding = match preferred_encoding(req.headers().get("Accept-Encoding")) {
+            Some(encoding) => encoding,
+            None => return,
+        };
+        // only bodies of known size; streams are left alone
+        match res.body().preset_size() {
+            Some(size) if size >= self.min_size => {}
+            _ => return,
+        }
+        let body = match res.body_mut().to_bytes().await {
+            Ok(body) => body,
+            Err(_) => return,
+        };
+
+        let compressed = task::spawn_blocking(move || {
+            let compressed = encoding.compress(&body).ok();
+            (body, compressed)
+        })
+        .await;
+        match compressed {
+            Ok((_, Some(compressed))) => {
+                res.set_header(Header::new("Content-Encoding", encoding.name()));
+                res.set_sized_body(compressed.len(), Cursor::new(compressed));
+            }
+            Ok((body, None)) => res.set_sized_body(body.len(), Cursor::new(body)),
+            Err(_) => return,
+        }
+        res.adjoin_header(Header::new("Vary", "Accept-Encoding"));
+    }
+}
+
+fn is_compressible(content_type: Option<ContentType>) -> bool {
+    match content_type {
+        Some(content_type) => {
+            content_type.is_json()
+                || content_type.top() == "text"
+                || content_type.sub().as_str().ends_with("+json")
+                || content_type.is_javascript()
+        }
+        None => false,
+    }
+}
+
+// Encoding with the highest q-value among the Accept-Encoding values,
+// brotli on ties. `*` stands for either.
+fn preferred_encoding<'a>(values: impl Iterator<Item = &'a str>) -> Option<Encoding> {
+    let mut best: Option<(Encoding, f32)> = None;
+    for item in values.flat_map(|value| value.split(',')) {
+        let mut parts = item.split(';');
+        let name = parts.next().unwrap_or("").trim();
+        let q = parts
+            .filter_map(|param| param.trim().strip_prefix("q="))
+            .next()
+            .and_then(|q| q.trim().parse::<f32>().ok())
+            .unwrap_or(1.0);
+        let encoding = match name {
+            "br" | "*" => Encoding::Brotli,
+            "gzip" => Encoding::Gzip,
+            _ => continue,
+        };
+        let better = match best {
+            None => true,
+            Some((current, current_q)) => q > current_q || (q == current_q && current == Encoding::Gzip && encoding == Encoding::Brotli),
+        };
+        if q > 0.0 && better {
+            best = Some((encoding, q));
+        }
+    }
+    best.map(|(encoding, _)| encoding)
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn test_preferred_encoding() {
+        let parse = |value: &str| preferred_encoding(std::iter::once(value));
+        assert_eq!(parse("gzip, deflate, br"), Some(Encoding::Brotli));
+        assert_eq!(parse("gzip, deflate"), Some(Encoding::Gzip));
+        assert_eq!(parse("br;q=0.5, gzip;q=0.8"), Some(Encoding::Gzip));
+        assert_eq!(parse("br;q=0, gzip"), Some(Encoding::Gzip));
+        assert_eq!(parse("identity"), None);
+        assert_eq!(preferred_encoding(["gzip", "br"].into_iter()), Some(Encoding::Brotli));
+    }
+
+    #[test]
+    fn test_compress_round_trip() {
+        let body = br#"{"polyline":"_p~iF~ps|U_ulLnnqC_mqNvxq`@"}"#.repeat(100);
+        let gzip = Encoding::Gzip.compress(&body).unwrap();
+        let mut decoded = vec![];
+        std::io::Read::read_to_end(&mut flate2::read::GzDecoder::new(&gzip[..]), &mut decoded).unwrap();
+        assert_eq!(decoded, body);
+        assert!(Encoding::Brotli.compress(&body).unwrap().len() < body.len() / 10);
+    }
+}
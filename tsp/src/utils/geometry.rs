@@ -0,0 +1,169 @@
+//! Compact encodings of route geometry.
+//!
+//! Consecutive points of a route are close together, so each point is
+//! stored as the difference from the previous one. For storage: latitude
+//! and longitude in millionths of a degree (about 0.1 m) and the node id,
+//! each as a zigzag varint. Most points take 4 to 6 bytes instead of the
+//! ~60 of a JSON `Coordinate`. For responses: the encoded polyline format
+//! read by map libraries, without node ids.
+
+use crate::utils::coordinate::Coordinate;
+use std::error::Error;
+
+const FORMAT_VERSION: u8 = 1;
+const SCALE: f64 = 1e6;
+// Five decimals, about a meter, as expected by Google's polyline decoders
+const POLYLINE_SCALE: f64 = 1e5;
+
+pub fn encode_path(path: &[Coordinate]) -> Vec<u8> {
+    let mut bytes = Vec::with_capacity(2 + path.len() * 6);
+    bytes.push(FORMAT_VERSION);
+    write_varint(&mut bytes, path.len() as u64);
+    let (mut lat, mut lng, mut id) = (0i64, 0i64, 0i64);
+    for point in path {
+        let (next_lat, next_lng) = ((point.lat * SCALE).round() as i64, (point.lng * SCALE).round() as i64);
+        let next_id = point.id as i64;
+        write_varint(&mut bytes, zigzag(next_lat - lat));
+        write_varint(&mut bytes, zigzag(next_lng - lng));
+        write_varint(&mut bytes, zigzag(next_id - id));
+        (lat, lng, id) = (next_lat, next_lng, next_id);
+    }
+    bytes
+}
+
+pub fn decode_path(bytes: &[u8]) -> Result<Vec<Coordinate>, Box<dyn Error>> {
+    let mut reader = Reader { bytes, at: 0 };
+    match reader.byte()? {
+        FORMAT_VERSION => {}
+        version => return Err(format!("Unknown geometry format {}", version).into()),
+    }
+    let len = reader.varint()? as usize;
+    // every point takes at least three bytes
+    if len > bytes.len() / 3 {
+        return Err("Truncated geometry".into());
+    }
+    let mut path = Vec::with_capacity(len);
+    let (mut lat, mut lng, mut id) = (0i64, 0i64, 0i64);
+    for _ in 0..len {
+        lat += unzigzag(reader.varint()?);
+        lng += unzigzag(reader.varint()?);
+        id += unzigzag(reader.varint()?);
+        path.push(Coordinate {
+            lat: lat as f64 / SCALE,
+            lng: lng as f64 / SCALE,
+            id: id as usize,
+        });
+    }
+    Ok(path)
+}
+
+/// Latitudes and longitudes of `path` as an encoded polyline string.
+pub fn encode_polyline(path: &[Coordinate]) -> String {
+    let mut polyline = String::with_capacity(path.len() * 8);
+    let (mut lat, mut lng) = (0i64, 0i64);
+    for point in path {
+        let (next_lat, next_lng) = (
+            (point.lat * POLYLINE_SCALE).round() as i64,
+            (point.lng * POLYLINE_SCALE).round() as i64,
+        );
+        for delta in [next_lat - lat, next_lng - lng] {
+            let mut value = zigzag(delta);
+            while value >= 0x20 {
+                polyline.push(char::from(((value & 0x1f) | 0x20) as u8 + 63));
+                value >>= 5;
+            }
+            polyline.push(char::from(value as u8 + 63));
+        }
+        (lat, lng) = (next_lat, next_lng);
+    }
+    polyline
+}
+
+fn zigzag(value: i64) -> u64 {
+    ((value << 1) ^ (value >> 63)) as u64
+}
+
+fn unzigzag(value: u64) -> i64 {
+    (value >> 1) as i64 ^ -((value & 1) as i64)
+}
+
+fn write_varint(bytes: &mut Vec<u8>, mut value: u64) {
+    while value >= 0x80 {
+        bytes.push(value as u8 | 0x80);
+        value >>= 7;
+    }
+    bytes.push(value as u8);
+}
+
+struct Reader<'a> {
+    bytes: &'a [u8],
+    at: usize,
+}
+
+impl<'a> Reader<'a> {
+    fn byte(&mut self) -> Result<u8, Box<dyn Error>> {
+        let byte = *self.bytes.get(self.at).ok_or("Truncated geometry")?;
+        self.at += 1;
+        Ok(byte)
+    }
+
+    fn varint(&mut self) -> Result<u64, Box<dyn Error>> {
+        let mut value = 0u64;
+        for shift in (0..64).step_by(7) {
+            let byte = self.byte()?;
+            value |= ((byte & 0x7f) as u64) << shift;
+            if byte < 0x80 {
+                return Ok(value);
+            }
+        }
+        Err("Invalid varint in geometry".into())
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn test_geometry_round_trip() {
+        let path: Vec<Coordinate> = (0..500)
+            .map(|i| Coordinate {
+                lat: 4.6 + i as f64 * 1.3e-4,
+                lng: -74.08 - (i % 7) as f64 * 2.1e-4,
+                id: 120_000 + i * 3 % 11,
+            })
+            .collect();
+        let bytes = encode_path(&path);
+        assert!(bytes.len() < path.len() * 8);
+
+        let decoded = decode_path(&bytes).unwrap();
+        assert_eq!(decoded.len(), path.len());
+        for (a, b) in path.iter().zip(&decoded) {
+            assert!((a.lat - b.lat).abs() <= 0.5 / SCALE);
+            assert!((a.lng - b.lng).abs() <= 0.5 / SCALE);
+            assert_eq!(a.id, b.id);
+        }
+        assert!(decode_path(&encode_path(&[])).unwrap().is_empty());
+    }
+
+    #[test]
+    fn test_encode_polyline() {
+        // example from the format's documentation
+        let path = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+            .iter()
+            .map(|&(lat, lng)| Coordinate { lat, lng, id: 0 })
+            .collect::<Vec<_>>();
+        assert_eq!(encode_polyline(&path), "_p~iF~ps|U_ulLnnqC_mqNvxq`@");
+        assert_eq!(encode_polyline(&[]), "");
+    }
+
+    #[test]
+    fn test_decode_rejects_bad_geometry() {
+        let path = vec![Coordinate { lat: 4.6, lng: -74.1, id: 1 }; 3];
+        let bytes = encode_path(&path);
+        assert!(decode_path(&bytes[..bytes.len() - 1]).is_err());
+        assert!(decode_path(&[]).is_err());
+        assert!(decode_path(&[9, 0]).is_err());
+        assert!(decode_path(&[FORMAT_VERSION, 0xff, 0xff, 0xff, 0xff, 0xff, 0xff, 0xff, 0xff, 0xff, 0xff]).is_err());
+    }
+}
@@ -0,0 +1,323 @@
+//! Process-wide counters and histograms, exposed in the Prometheus text
+//! format by `/metrics`.
+//!
+//! Recording costs a few relaxed atomic operations. Histograms have fixed
+//! buckets, and every label combination is created before the first
+//! request, so the request path never locks or allocates.
+
+use crate::utils::trace;
+use once_cell::sync::{Lazy, OnceCell};
+use std::{
+    collections::HashMap,
+    fmt::Write,
+    sync::atomic::{AtomicI64, AtomicU64, Ordering},
+    time::{Duration, Instant},
+};
+
+// Seconds, from half a millisecond to the longest trips
+const LATENCY_BUCKETS: &[f64] = &[
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+];
+const SETTLED_BUCKETS: &[f64] = &[
+    10.0, 100.0, 1_000.0, 3_000.0, 10_000.0, 30_000.0, 100_000.0, 300_000.0, 1_000_000.0,
+];
+const SIZE_BUCKETS: &[f64] = &[2.0, 3.0, 5.0, 8.0, 10.0, 12.0, 15.0, 20.0, 30.0, 50.0, 100.0, 200.0];
+
+// Requests that matched no route are counted under this endpoint
+pub const UNMATCHED: &str = "unmatched";
+
+/// Cumulative histogram with fixed upper bounds.
+pub struct Histogram {
+    bounds: &'static [f64],
+    // one per bound plus +Inf, not cumulative; summed when rendered
+    buckets: Box<[AtomicU64]>,
+    count: AtomicU64,
+    // f64 bits
+    sum: AtomicU64,
+}
+
+impl Histogram {
+    pub fn new(bounds: &'static [f64]) -> Self {
+        Self {
+            bounds,
+            buckets: (0..=bounds.len()).map(|_| AtomicU64::new(0)).collect(),
+            count: AtomicU64::new(0),
+            sum: AtomicU64::new(0f64.to_bits()),
+        }
+    }
+
+    pub fn observe(&self, value: f64) {
+        let bucket = self.bounds.partition_point(|&bound| bound < value);
+        self.buckets[bucket].fetch_add(1, Ordering::Relaxed);
+        self.count.fetch_add(1, Ordering::Relaxed);
+        let _ = self.sum.fetch_update(Ordering::Relaxed, Ordering::Relaxed, |sum| {
+            Some((f64::from_bits(sum) + value).to_bits())
+        });
+    }
+
+    pub fn observe_duration(&self, duration: Duration) {
+        self.observe(duration.as_secs_f64());
+    }
+
+    pub fn count(&self) -> u64 {
+        self.count.load(Ordering::Relaxed)
+    }
+
+    pub fn sum(&self) -> f64 {
+        f64::from_bits(self.sum.load(Ordering::Relaxed))
+    }
+
+    fn render(&self, out: &mut String, name: &str, labels: &str) {
+        let separator = if labels.is_empty() { "" } else { "," };
+        let mut cumulative = 0;
+        for (i, bucket) in self.buckets.iter().enumerate() {
+            cumulative += bucket.load(Ordering::Relaxed);
+            let le = match self.bounds.get(i) {
+                Some(bound) => bound.to_string(),
+                None => "+Inf".to_string(),
+            };
+            let _ = writeln!(out, "{}_bucket{{{}{}le=\"{}\"}} {}", name, labels, separator, le, cumulative);
+        }
+        let labels = if labels.is_empty() { String::new() } else { format!("{{{}}}", labels) };
+        let _ = writeln!(out, "{}_sum{} {}", name, labels, self.sum());
+        let _ = writeln!(out, "{}_count{} {}", name, labels, self.count());
+    }
+}
+
+/// Parts of a trip request timed separately.
+#[derive(Debug, Clone, Copy, PartialEq, Eq)]
+pub enum Stage {
+    /// Matching locations to road nodes (cache misses and hits).
+    Snap,
+    /// Road distances between every pair of locations.
+    DistanceMatrix,
+    HeldKarp,
+    LocalSearch,
+    /// One point-to-point route search, on route cache misses only.
+    RouteSearch,
+    /// Routing every leg of the ordered trip.
+    PathLegs,
+    /// Writing the response body.
+    Serialize,
+    /// One batch insert of the trip writer.
+    StoreTrips,
+}
+
+impl Stage {
+    pub const ALL: [Stage; 8] = [
+        Stage::Snap,
+        Stage::DistanceMatrix,
+        Stage::HeldKarp,
+        Stage::LocalSearch,
+        Stage::RouteSearch,
+        Stage::PathLegs,
+        Stage::Serialize,
+        Stage::StoreTrips,
+    ];
+
+    pub fn name(self) -> &'static str {
+        match self {
+            Stage::Snap => "snap",
+            Stage::DistanceMatrix => "distance_matrix",
+            Stage::HeldKarp => "held_karp",
+            Stage::LocalSearch => "local_search",
+            Stage::RouteSearch => "route_search",
+            Stage::PathLegs => "path_legs",
+            Stage::Serialize => "serialize",
+            Stage::StoreTrips => "store_trips",
+        }
+    }
+}
+
+/// Latency and status classes of one endpoint.
+pub struct EndpointMetrics {
+    pub duration: Histogram,
+    // 1xx to 5xx
+    statuses: [AtomicU64; 5],
+}
+
+impl EndpointMetrics {
+    fn new() -> Self {
+        Self {
+            duration: Histogram::new(LATENCY_BUCKETS),
+            statuses: Default::default(),
+        }
+    }
+
+    pub fn record(&self, status: u16, duration: Duration) {
+        self.duration.observe_duration(duration);
+        if let Some(class) = self.statuses.get((status / 100).wrapping_sub(1) as usize) {
+            class.fetch_add(1, Ordering::Relaxed);
+        }
+    }
+}
+
+pub struct Metrics {
+    stages: Vec<Histogram>,
+    pub settled_nodes: Histogram,
+    pub exact_sizes: Histogram,
+    pub heuristic_sizes: Histogram,
+    pub in_flight: AtomicI64,
+    // filled once with the mounted routes, read without locking afterwards
+    endpoints: OnceCell<HashMap<String, EndpointMetrics>>,
+}
+
+pub static METRICS: Lazy<Metrics> = Lazy::new(|| Metrics {
+    stages: Stage::ALL.iter().map(|_| Histogram::new(LATENCY_BUCKETS)).collect(),
+    settled_nodes: Histogram::new(SETTLED_BUCKETS),
+    exact_sizes: Histogram::new(SIZE_BUCKETS),
+    heuristic_sizes: Histogram::new(SIZE_BUCKETS),
+    in_flight: AtomicI64::new(0),
+    endpoints: OnceCell::new(),
+});
+
+impl Metrics {
+    pub fn stage(&self, stage: Stage) -> &Histogram {
+        &self.stages[stage as usize]
+    }
+
+    /// Runs `f` and records its duration under `stage`, and as a span of
+    /// the current request trace if there is one.
+    pub fn time<R>(&self, stage: Stage, f: impl FnOnce() -> R) -> R {
+        let start = Instant::now();
+        let result = f();
+        let elapsed = start.elapsed();
+        self.stage(stage).observe_duration(elapsed);
+        trace::record(stage.name(), start, elapsed);
+        result
+    }
+
+    /// Creates the per-endpoint metrics. Only the first call has effect.
+    pub fn register_endpoints<I: IntoIterator<Item = String>>(&self, names: I) {
+        let _ = self.endpoints.set(
+            names
+                .into_iter()
+                .chain([UNMATCHED.to_string()])
+                .map(|name| (name, EndpointMetrics::new()))
+                .collect(),
+        );
+    }
+
+    /// Metrics of the endpoint `name`, or `None` before registration or for
+    /// an unknown name.
+    pub fn endpoint(&self, name: &str) -> Option<&EndpointMetrics> {
+        self.endpoints.get()?.get(name)
+    }
+
+    /// Appends everything recorded here in the Prometheus text format.
+    pub fn render(&self, out: &mut String) {
+        write_header(out, "tsp_http_requests_in_flight", "gauge", "Requests being handled.");
+        let _ = writeln!(out, "tsp_http_requests_in_flight {}", self.in_flight.load(Ordering::Relaxed));
+
+        if let Some(endpoints) = self.endpoints.get() {
+            let mut names: Vec<&String> = endpoints.keys().collect();
+            names.sort();
+            write_header(out, "tsp_http_requests_total", "counter", "Responses by endpoint and status class.");
+            for name in &names {
+                for (i, class) in endpoints[*name].statuses.iter().enumerate() {
+                    let _ = writeln!(
+                        out,
+                        "tsp_http_requests_total{{endpoint=\"{}\",status=\"{}xx\"}} {}",
+                        name,
+                        i + 1,
+                        class.load(Ordering::Relaxed)
+                    );
+                }
+            }
+            write_header(out, "tsp_http_request_duration_seconds", "histogram", "Time to respond, by endpoint.");
+            for name in &names {
+                endpoints[*name]
+                    .duration
+                    .render(out, "tsp_http_request_duration_seconds", &format!("endpoint=\"{}\"", name));
+            }
+        }
+
+        write_header(out, "tsp_stage_duration_seconds", "histogram", "Time spent in each part of a trip request.");
+        for stage in Stage::ALL {
+            self.stage(stage)
+                .render(out, "tsp_stage_duration_seconds", &format!("stage=\"{}\"", stage.name()));
+        }
+        write_header(out, "tsp_search_settled_nodes", "histogram", "Nodes settled per shortest path search.");
+        self.settled_nodes.render(out, "tsp_search_settled_nodes", "");
+        write_header(out, "tsp_solver_locations", "histogram", "Locations per solved tour, by solver.");
+        self.exact_sizes.render(out, "tsp_solver_locations", "solver=\"held_karp\"");
+        self.heuristic_sizes.render(out, "tsp_solver_locations", "solver=\"local_search\"");
+    }
+}
+
+pub fn write_header(out: &mut String, name: &str, kind: &str, help: &str) {
+    let _ = writeln!(out, "# HELP {} {}", name, help);
+    let _ = writeln!(out, "# TYPE {} {}", name, kind);
+}
+
+/// Appends a single-sample metric with its header. `labels` is a list of
+/// `name="value"` pairs, possibly empty.
+pub fn write_sample(out: &mut String, name: &str, kind: &str, help: &str, samples: &[(&str, f64)]) {
+    write_header(out, name, kind, help);
+    for (labels, value) in samples {
+        if labels.is_empty() {
+            let _ = writeln!(out, "{} {}", name, value);
+        } else {
+            let _ = writeln!(out, "{}{{{}}} {}", name, labels, value);
+        }
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn test_histogram_buckets() {
+        let histogram = Histogram::new(&[1.0, 10.0]);
+        for value in [0.5, 1.0, 3.0, 10.0, 50.0] {
+            histogram.observe(value);
+        }
+        assert_eq!(histogram.count(), 5);
+        assert_eq!(histogram.sum(), 64.5);
+
+        let mut out = String::new();
+        histogram.render(&mut out, "t", "stage=\"snap\"");
+        assert_eq!(
+            out,
+            "t_bucket{stage=\"snap\",le=\"1\"} 2\n\
+             t_bucket{stage=\"snap\",le=\"10\"} 4\n\
+             t_bucket{stage=\"snap\",le=\"+Inf\"} 5\n\
+             t_sum{stage=\"snap\"} 64.5\n\
+             t_count{stage=\"snap\"} 5\n"
+        );
+        let mut out = String::new();
+        Histogram::new(&[1.0]).render(&mut out, "t", "");
+        assert!(out.starts_with("t_bucket{le=\"1\"} 0\n"));
+        assert!(out.ends_with("t_sum 0\nt_count 0\n"));
+    }
+
+    #[test]
+    fn test_endpoints_and_stages() {
+        let metrics = Metrics {
+            stages: Stage::ALL.iter().map(|_| Histogram::new(LATENCY_BUCKETS)).collect(),
+            settled_nodes: Histogram::new(SETTLED_BUCKETS),
+            exact_sizes: Histogram::new(SIZE_BUCKETS),
+            heuristic_sizes: Histogram::new(SIZE_BUCKETS),
+            in_flight: AtomicI64::new(0),
+            endpoints: OnceCell::new(),
+        };
+        assert!(metrics.endpoint("login").is_none());
+        metrics.register_endpoints(["login".to_string()]);
+        metrics.register_endpoints(["other".to_string()]);
+        assert!(metrics.endpoint("other").is_none());
+
+        metrics.endpoint("login").unwrap().record(200, Duration::from_millis(3));
+        metrics.endpoint(UNMATCHED).unwrap().record(404, Duration::from_millis(1));
+        assert_eq!(metrics.time(Stage::HeldKarp, || 7), 7);
+        assert_eq!(metrics.stage(Stage::HeldKarp).count(), 1);
+        assert_eq!(metrics.stage(Stage::Snap).count(), 0);
+
+        let mut out = String::new();
+        metrics.render(&mut out);
+        assert!(out.contains("tsp_http_requests_total{endpoint=\"login\",status=\"2xx\"} 1\n"));
+        assert!(out.contains("tsp_http_requests_total{endpoint=\"unmatched\",status=\"4xx\"} 1\n"));
+        assert!(out.contains("tsp_stage_duration_seconds_count{stage=\"held_karp\"} 1\n"));
+        assert!(out.contains("# TYPE tsp_search_settled_nodes histogram\n"));
+    }
+}
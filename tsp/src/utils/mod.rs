@@ -9,17 +9,35 @@ pub mod trip;
 pub mod path;
 pub mod user;
 pub mod rate_limit;
+pub mod snapshot;
+pub mod geometry;
+pub mod compression;
+pub mod synthetic;
+pub mod metrics;
+pub mod trace;
+pub mod preprocess;
 
-pub use crate::ds::{graph::Graph, kdtree::KdTree};
+pub use crate::ds::{
+    coordinates::CoordinateTable,
+    graph::{Graph, GraphBuilder},
+    kdtree::KdTree,
+    segment_index::{SegmentIndex, DEFAULT_CELL_SIZE},
+};
 use coordinate::Coordinate;
-use std::collections::HashMap;
+use snapshot::Snapshot;
+use std::env;
 use std::error::Error;
 use std::fs;
 
+// Each loader accepts either the text files or a snapshot written by the
+// `snapshot` binary; snapshots are recognised by their magic bytes.
 pub fn create_adjacency_list_from_files(
     coordinates_file: &String,
     arcs_file: &String,
 ) -> Result<Graph, Box<dyn Error>> {
+    if Snapshot::is_snapshot(coordinates_file) {
+        return create_adjacency_list_from_snapshot(&Snapshot::open(coordinates_file)?);
+    }
     let coordinates_file = fs::read_to_string(coordinates_file)?;
     let arcs_file = fs::read_to_string(arcs_file)?;
 
@@ -28,26 +46,30 @@ pub fn create_adjacency_list_from_files(
         num_of_nodes += 1;
     }
 
-    let mut edges = vec![vec![]; num_of_nodes];
-    let mut weights = vec![vec![]; num_of_nodes];
+    let mut builder = GraphBuilder::new(num_of_nodes);
 
     for line in arcs_file.lines() {
         let mut split_line = line.split_whitespace();
         let source: usize = split_line.next().unwrap().parse()?;
         let destination: usize = split_line.next().unwrap().parse()?;
         let weight = split_line.next().unwrap().parse::<f64>()?;
-        edges[source].push(destination);
-        weights[source].push(weight);
+        if source >= num_of_nodes || destination >= num_of_nodes {
+            return Err(format!("Arc {} -> {} references an unknown node", source, destination).into());
+        }
+        builder.add_edge(source, destination, weight);
     }
 
-    Ok(Graph { edges, weights })
+    Ok(builder.build())
 }
 
 pub fn create_id_to_coordinates_hashmap_from_file(
     coordinates_file: &str,
-) -> Result<HashMap<usize, Coordinate>, Box<dyn Error>> {
+) -> Result<CoordinateTable, Box<dyn Error>> {
+    if Snapshot::is_snapshot(coordinates_file) {
+        return create_coordinate_table_from_snapshot(&Snapshot::open(coordinates_file)?);
+    }
     let file = fs::read_to_string(coordinates_file)?;
-    let mut coordinates_hashmap = HashMap::new();
+    let mut coordinates = vec![];
     for line in file.lines() {
         let mut split_line = line.split_whitespace();
         let id = split_line.next().unwrap().parse::<usize>()?;
@@ -70,15 +92,18 @@ pub fn create_id_to_coordinates_hashmap_from_file(
             id: id,
         };
 
-        coordinates_hashmap.insert(id, coordinate);
+        coordinates.push(coordinate);
     }
 
-    Ok(coordinates_hashmap)
+    Ok(CoordinateTable::from(coordinates))
 }
 
 pub fn create_kd_tree_from_file(
     coordinates_file: &str,
-) -> Result<KdTree<f64>, Box<dyn Error>> {
+) -> Result<KdTree, Box<dyn Error>> {
+    if Snapshot::is_snapshot(coordinates_file) {
+        return create_kd_tree_from_snapshot(&Snapshot::open(coordinates_file)?);
+    }
     let file = fs::read_to_string(coordinates_file)?;
     let mut points = vec![];
     for line in file.lines() {
@@ -87,7 +112,7 @@ pub fn create_kd_tree_from_file(
             .next()
             .unwrap()
             .to_string()
-            .parse::<f64>()
+            .parse::<usize>()
             .unwrap();
         let latitude = split_line
             .next()
@@ -102,12 +127,105 @@ pub fn create_kd_tree_from_file(
             .parse::<f64>()
             .unwrap();
 
-        points.push(vec![latitude, longitude, id])
+        points.push(Coordinate {
+            lat: latitude,
+            lng: longitude,
+            id,
+        })
     }
     let tree = KdTree::new(points);
     Ok(tree)
 }
 
+pub fn create_adjacency_list_from_snapshot(snapshot: &Snapshot) -> Result<Graph, Box<dyn Error>> {
+    Graph::from_csr(
+        snapshot.section(&snapshot::EDGE_OFFSETS)?,
+        snapshot.section(&snapshot::EDGE_TARGETS)?,
+        snapshot.section(&snapshot::EDGE_WEIGHTS)?,
+    )
+}
+
+pub fn create_coordinate_table_from_snapshot(
+    snapshot: &Snapshot,
+) -> Result<CoordinateTable, Box<dyn Error>> {
+    let lat = snapshot.section::<f64>(&snapshot::NODE_LATITUDES)?;
+    let lng = snapshot.section::<f64>(&snapshot::NODE_LONGITUDES)?;
+    if lat.len() != lng.len() {
+        return Err("Latitude and longitude sections differ in length".into());
+    }
+    Ok(CoordinateTable::new(lat, lng))
+}
+
+/// KD tree stored in the snapshot, or built from the coordinates for
+/// snapshots written before its flat layout existed.
+pub fn create_kd_tree_from_snapshot(snapshot: &Snapshot) -> Result<KdTree, Box<dyn Error>> {
+    if !snapshot.has_section(&snapshot::KD_TREE_IDS) {
+        let coordinates = create_coordinate_table_from_snapshot(snapshot)?;
+        let points = (0..coordinates.len()).filter_map(|id| coordinates.get(id)).collect();
+        return Ok(KdTree::new(points));
+    }
+    let lat = snapshot.section::<f64>(&snapshot::KD_TREE_LATITUDES)?;
+    let lng = snapshot.section::<f64>(&snapshot::KD_TREE_LONGITUDES)?;
+    let ids = snapshot.section::<u32>(&snapshot::KD_TREE_IDS)?;
+    if lat.len() != ids.len() || lng.len() != ids.len() {
+        return Err("KD tree sections differ in length".into());
+    }
+    Ok(KdTree::from_sorted(lat, lng, ids))
+}
+
+/// Segment grid stored in the snapshot, or built from the road network for
+/// snapshots written before it existed.
+pub fn create_segment_index_from_snapshot(
+    snapshot: &Snapshot,
+    graph: &Graph,
+    coordinates: &CoordinateTable,
+) -> Result<SegmentIndex, Box<dyn Error>> {
+    if !snapshot.has_section(&snapshot::SEGMENT_CELLS) {
+        return Ok(SegmentIndex::build(graph, coordinates, DEFAULT_CELL_SIZE));
+    }
+    let cell_size = snapshot.section::<f64>(&snapshot::SEGMENT_CELL_SIZE)?;
+    SegmentIndex::from_parts(
+        *cell_size.first().ok_or("Empty segment cell size section")?,
+        snapshot.section(&snapshot::SEGMENT_CELLS)?,
+        snapshot.section(&snapshot::SEGMENT_OFFSETS)?,
+        snapshot.section(&snapshot::SEGMENT_ARCS)?,
+    )
+}
+
+/// Usage of the `build` subcommand shared by the offline tools that read
+/// the road network with [`load_graph_from_args`].
+pub fn graph_build_usage(command: &str, output: &str) -> String {
+    format!(
+        "usage:
+    {0} build <road.snap> <{1}>
+    {0} build <nodes.txt> <edges.txt> <{1}>
+    {0} build <{1}>
+
+build falls back to SNAPSHOT_FILE, then COORDINATES_FILE and ARCS_FILE, when only the output is given",
+        command, output
+    )
+}
+
+/// Road network named on the command line of an offline tool: a snapshot,
+/// the coordinates and arcs text files or, with no inputs, SNAPSHOT_FILE,
+/// then COORDINATES_FILE and ARCS_FILE.
+pub fn load_graph_from_args(inputs: &[&str]) -> Result<Graph, Box<dyn Error>> {
+    match inputs {
+        [snapshot] => create_adjacency_list_from_snapshot(&Snapshot::open(snapshot)?),
+        [nodes, edges] => create_adjacency_list_from_files(&nodes.to_string(), &edges.to_string()),
+        [] => match (
+            env::var("SNAPSHOT_FILE"),
+            env::var("COORDINATES_FILE"),
+            env::var("ARCS_FILE"),
+        ) {
+            (Ok(snapshot), _, _) => load_graph_from_args(&[&snapshot]),
+            (_, Ok(nodes), Ok(edges)) => load_graph_from_args(&[&nodes, &edges]),
+            _ => Err("SNAPSHOT_FILE or COORDINATES_FILE and ARCS_FILE must be set".into()),
+        },
+        _ => Err("Expected a snapshot or the coordinates and arcs files".into()),
+    }
+}
+
 #[cfg(test)]
 mod tests {
     use super::*;
@@ -125,4 +243,25 @@ mod tests {
     fn create_kd_tree_from_file_correct() {
         let _tree = create_kd_tree_from_file(&("nodes.txt".to_string())).unwrap();
     }
+
+    #[test]
+    fn test_load_graph_from_args() {
+        let net = synthetic::SyntheticNetwork::grid(4, 3, 7);
+        let path = |name: &str| {
+            env::temp_dir()
+                .join(format!("tsp-{}-load-graph-{}", std::process::id(), name))
+                .to_string_lossy()
+                .to_string()
+        };
+        let (nodes, edges) = (path("nodes.txt"), path("edges.txt"));
+        net.write_text_files(&nodes, &edges).unwrap();
+
+        let graph = load_graph_from_args(&[&nodes, &edges]).unwrap();
+        assert_eq!(graph.num_nodes(), net.graph.num_nodes());
+        assert_eq!(graph.num_edges(), net.graph.num_edges());
+        assert!(load_graph_from_args(&[&nodes, &edges, &nodes]).is_err());
+
+        fs::remove_file(nodes).unwrap();
+        fs::remove_file(edges).unwrap();
+    }
 }
@@ -1,17 +1,52 @@
 use serde::{Serialize, Deserialize};
 
-use crate::utils::Coordinate;
+use crate::utils::{geometry::encode_polyline, trip::Location, Coordinate};
 
-#[derive(Serialize, Deserialize, Debug)]
+#[derive(Serialize, Deserialize, Clone, Debug)]
 pub struct  PathLocation {
     pub location: Coordinate,
     pub label: String,
 }
 
-#[derive(Serialize, Deserialize, Debug)]
+#[derive(Serialize, Deserialize, Clone, Debug)]
 pub struct Path {
     pub title: String,
     pub path: Vec<Coordinate>,
     pub distance: f64,
     pub locations: Vec<PathLocation>
-}
\ No newline at end of file
+}
+
+/// `Path` with the route as an encoded polyline, a fraction of the size of
+/// the JSON coordinates.
+#[derive(Serialize, Debug)]
+pub struct EncodedPath {
+    pub title: String,
+    pub polyline: String,
+    pub distance: f64,
+    pub locations: Vec<PathLocation>
+}
+
+impl Path {
+    /// Path through `locations` in visiting order, labelled 1, 2, ...
+    pub fn new(title: String, path: Vec<Coordinate>, distance: f64, locations: &[Location]) -> Self {
+        Path {
+            title,
+            path,
+            distance,
+            locations: locations
+                .iter()
+                .enumerate()
+                .map(|(i, location)| PathLocation { location: location.coordinates, label: format!("{}", i + 1) })
+                .collect(),
+        }
+    }
+
+    pub fn to_encoded(&self) -> EncodedPath {
+        EncodedPath {
+            title: self.title.clone(),
+            polyline: encode_polyline(&self.path),
+            distance: self.distance,
+            locations: self.locations.clone(),
+        }
+    }
+}
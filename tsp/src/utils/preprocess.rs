@@ -0,0 +1,298 @@
+//! Offline cleanup of the `nodes.txt`/`edges.txt` road network.
+//!
+//! Node ids in the extract follow the OSM export order, so nodes that are
+//! close on the map end up far apart in memory and every search expansion
+//! touches a different cache line. Preprocessing renumbers the nodes along a
+//! Hilbert curve over their coordinates, which keeps neighbours on the road
+//! close in id as well, and drops (or sets apart) the nodes outside the
+//! largest strongly connected component.
+//!
+//! Only ids change: coordinates and weights are written back as read, so
+//! routes are the same and the query code needs nothing new. Snapshots,
+//! contraction hierarchies and landmark files hold node ids and have to be
+//! rebuilt from the new files.
+
+use crate::{
+    algo::components::strongly_connected_components,
+    ds::graph::GraphBuilder,
+    utils::{create_id_to_coordinates_hashmap_from_file, snapshot::Snapshot},
+};
+use std::{
+    error::Error,
+    fs::{self, File},
+    io::{BufWriter, Write},
+};
+
+// Cells per side of the Hilbert grid, as a power of two. 2^16 cells over a
+// city are well under a meter wide.
+const HILBERT_ORDER: u32 = 16;
+
+/// What to do with nodes outside the largest strongly connected component.
+#[derive(Debug, Clone, Copy, PartialEq)]
+pub enum Islands {
+    /// Drop them and their arcs.
+    Prune,
+    /// Keep them after the largest component, so that a node is in it
+    /// exactly when its id is below the size of the component.
+    Tag,
+}
+
+pub struct PreprocessSummary {
+    pub nodes: usize,
+    pub edges: usize,
+    pub components: usize,
+    pub largest: usize,
+    pub kept_nodes: usize,
+    pub kept_edges: usize,
+    /// Mean id distance between the ends of an arc, before and after.
+    pub arc_gap_before: f64,
+    pub arc_gap_after: f64,
+}
+
+/// Position of the cell `(x, y)` along the Hilbert curve filling a
+/// `2^order` x `2^order` grid.
+pub fn hilbert_index(order: u32, mut x: u64, mut y: u64) -> u64 {
+    let n = 1u64 << order;
+    let mut d = 0;
+    let mut s = n / 2;
+    while s > 0 {
+        let rx = (x & s > 0) as u64;
+        let ry = (y & s > 0) as u64;
+        d += s * s * ((3 * rx) ^ ry);
+        // rotate the quadrant so the curve stays continuous
+        if ry == 0 {
+            if rx == 1 {
+                x = n - 1 - x;
+                y = n - 1 - y;
+            }
+            std::mem::swap(&mut x, &mut y);
+        }
+        s /= 2;
+    }
+    d
+}
+
+/// Hilbert key of every coordinate, over their bounding box.
+fn hilbert_keys(lat: &[f64], lng: &[f64]) -> Vec<u64> {
+    let bounds = |values: &[f64]| {
+        values
+            .iter()
+            .fold((f64::INFINITY, f64::NEG_INFINITY), |(lo, hi), &v| (lo.min(v), hi.max(v)))
+    };
+    let (lat_min, lat_max) = bounds(lat);
+    let (lng_min, lng_max) = bounds(lng);
+    let cells = ((1u64 << HILBERT_ORDER) - 1) as f64;
+    let cell = |value: f64, min: f64, max: f64| {
+        if max > min {
+            ((value - min) / (max - min) * cells).round() as u64
+        } else {
+            0
+        }
+    };
+    lat.iter()
+        .zip(lng)
+        .map(|(&lat, &lng)| {
+            hilbert_index(HILBERT_ORDER, cell(lng, lng_min, lng_max), cell(lat, lat_min, lat_max))
+        })
+        .collect()
+}
+
+fn read_arcs(arcs_file: &str, num_nodes: usize) -> Result<Vec<(u32, u32, f64)>, Box<dyn Error>> {
+    let file = fs::read_to_string(arcs_file)?;
+    let mut arcs = vec![];
+    for line in file.lines() {
+        let mut split_line = line.split_whitespace();
+        let (source, destination, weight) = match (split_line.next(), split_line.next(), split_line.next()) {
+            (Some(source), Some(destination), Some(weight)) => (source, destination, weight),
+            _ => return Err(format!("Malformed arc line: {}", line).into()),
+        };
+        let source: usize = source.parse()?;
+        let destination: usize = destination.parse()?;
+        if source >= num_nodes || destination >= num_nodes {
+            return Err(format!("Arc {} -> {} references an unknown node", source, destination).into());
+        }
+        arcs.push((source as u32, destination as u32, weight.parse::<f64>()?));
+    }
+    Ok(arcs)
+}
+
+fn mean_arc_gap(arcs: impl Iterator<Item = (u32, u32)>) -> f64 {
+    let (mut total, mut count) = (0u64, 0u64);
+    for (u, v) in arcs {
+        total += u.abs_diff(v) as u64;
+        count += 1;
+    }
+    if count == 0 {
+        0.0
+    } else {
+        total as f64 / count as f64
+    }
+}
+
+/// Reads the text files, renumbers the network and writes the new
+/// coordinates and arcs in the same format, plus an id map with one
+/// `old_id new_id component` line per input node. Dropped nodes have `-`
+/// as new id; component 0 is the largest.
+pub fn preprocess_text_files(
+    coordinates_file: &str,
+    arcs_file: &str,
+    coordinates_output: &str,
+    arcs_output: &str,
+    id_map_output: &str,
+    islands: Islands,
+) -> Result<PreprocessSummary, Box<dyn Error>> {
+    if Snapshot::is_snapshot(coordinates_file) {
+        return Err("Preprocessing reads the text files, not a snapshot".into());
+    }
+    let coordinates = create_id_to_coordinates_hashmap_from_file(coordinates_file)?;
+    let (lat, lng) = (coordinates.latitudes(), coordinates.longitudes());
+    if lat.iter().chain(lng).any(|v| v.is_nan()) {
+        return Err("Node ids in the coordinates file are not contiguous".into());
+    }
+    let num_nodes = coordinates.len();
+    let arcs = read_arcs(arcs_file, num_nodes)?;
+
+    let mut builder = GraphBuilder::new(num_nodes);
+    for &(u, v, w) in &arcs {
+        builder.add_edge(u as usize, v as usize, w);
+    }
+    let components = strongly_connected_components(&builder.build());
+
+    // islands go last, then nodes follow the curve
+    let keys = hilbert_keys(lat, lng);
+    let mut order: Vec<u32> = (0..num_nodes as u32)
+        .filter(|&u| islands == Islands::Tag || components.of(u as usize) == 0)
+        .collect();
+    order.sort_unstable_by_key(|&u| (components.of(u as usize) != 0, keys[u as usize], u));
+    let mut new_id = vec![u32::MAX; num_nodes];
+    for (new, &old) in order.iter().enumerate() {
+        new_id[old as usize] = new as u32;
+    }
+
+    let mut nodes = BufWriter::new(File::create(coordinates_output)?);
+    for &old in &order {
+        let old = old as usize;
+        writeln!(nodes, "{} {} {}", new_id[old], lat[old], lng[old])?;
+    }
+    nodes.flush()?;
+
+    // arcs grouped by new source, in their original order within a node
+    let mut renumbered: Vec<(u32, u32, f64)> = arcs
+        .iter()
+        .filter(|&&(u, v, _)| new_id[u as usize] != u32::MAX && new_id[v as usize] != u32::MAX)
+        .map(|&(u, v, w)| (new_id[u as usize], new_id[v as usize], w))
+        .collect();
+    renumbered.sort_by_key(|&(u, _, _)| u);
+    let mut edges = BufWriter::new(File::create(arcs_output)?);
+    for &(u, v, w) in &renumbered {
+        writeln!(edges, "{} {} {}", u, v, w)?;
+    }
+    edges.flush()?;
+
+    let mut id_map = BufWriter::new(File::create(id_map_output)?);
+    for old in 0..num_nodes {
+        match new_id[old] {
+            u32::MAX => writeln!(id_map, "{} - {}", old, components.of(old))?,
+            new => writeln!(id_map, "{} {} {}", old, new, components.of(old))?,
+        }
+    }
+    id_map.flush()?;
+
+    Ok(PreprocessSummary {
+        nodes: num_nodes,
+        edges: arcs.len(),
+        components: components.count(),
+        largest: components.largest_size(),
+        kept_nodes: order.len(),
+        kept_edges: renumbered.len(),
+        arc_gap_before: mean_arc_gap(arcs.iter().map(|&(u, v, _)| (u, v))),
+        arc_gap_after: mean_arc_gap(renumbered.iter().map(|&(u, v, _)| (u, v))),
+    })
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::algo::shortest_paths::dijkstra;
+    use crate::utils::{create_adjacency_list_from_files, synthetic::SyntheticNetwork};
+    use std::{env, fs::OpenOptions};
+
+    fn temp_path(name: &str) -> String {
+        env::temp_dir()
+            .join(format!("tsp-{}-preprocess-{}", std::process::id(), name))
+            .to_string_lossy()
+            .to_string()
+    }
+
+    #[test]
+    fn test_hilbert_index() {
+        // order 1 visits (0,0), (0,1), (1,1), (1,0)
+        let order_one: Vec<u64> = [(0, 0), (0, 1), (1, 1), (1, 0)]
+            .iter()
+            .map(|&(x, y)| hilbert_index(1, x, y))
+            .collect();
+        assert_eq!(order_one, vec![0, 1, 2, 3]);
+
+        // every cell once, and consecutive cells are neighbours
+        let mut cells = vec![(0, 0); 64];
+        for x in 0..8 {
+            for y in 0..8 {
+                cells[hilbert_index(3, x, y) as usize] = (x, y);
+            }
+        }
+        for pair in cells.windows(2) {
+            let (a, b) = (pair[0], pair[1]);
+            assert_eq!(a.0.abs_diff(b.0) + a.1.abs_diff(b.1), 1);
+        }
+    }
+
+    #[test]
+    fn test_preprocess_keeps_routes() {
+        let net = SyntheticNetwork::geometric(400, 3);
+        let (nodes, edges) = (temp_path("nodes.txt"), temp_path("edges.txt"));
+        net.write_text_files(&nodes, &edges).unwrap();
+        // an island: a new node with an arc into the network only
+        let island = net.coordinates.len();
+        let mut file = OpenOptions::new().append(true).open(&nodes).unwrap();
+        writeln!(file, "{} 4.59 -74.11", island).unwrap();
+        let mut file = OpenOptions::new().append(true).open(&edges).unwrap();
+        writeln!(file, "{} 0 25.5", island).unwrap();
+
+        let (new_nodes, new_edges, id_map) = (temp_path("new-nodes.txt"), temp_path("new-edges.txt"), temp_path("map.txt"));
+        let summary = preprocess_text_files(&nodes, &edges, &new_nodes, &new_edges, &id_map, Islands::Prune).unwrap();
+        assert_eq!(summary.nodes, 401);
+        assert_eq!(summary.kept_nodes, summary.largest);
+        assert!(summary.kept_nodes < 401);
+        assert!(summary.arc_gap_after < summary.arc_gap_before);
+
+        let map: Vec<Option<usize>> = fs::read_to_string(&id_map)
+            .unwrap()
+            .lines()
+            .map(|line| line.split_whitespace().nth(1).unwrap().parse().ok())
+            .collect();
+        assert_eq!(map.len(), 401);
+        assert_eq!(map[island], None);
+
+        // same distances between the kept nodes
+        let graph = create_adjacency_list_from_files(&new_nodes, &new_edges).unwrap();
+        assert_eq!(graph.num_nodes(), summary.kept_nodes);
+        let kept: Vec<usize> = (0..400).filter(|&u| map[u].is_some()).collect();
+        for &target in kept.iter().step_by(37) {
+            let source = kept[0];
+            let (expected, _) = dijkstra(&net.graph, source, target).unwrap();
+            let (distance, _) = dijkstra(&graph, map[source].unwrap(), map[target].unwrap()).unwrap();
+            assert!((distance - expected).abs() < 1e-6);
+        }
+
+        // tagging keeps the island after the largest component
+        preprocess_text_files(&nodes, &edges, &new_nodes, &new_edges, &id_map, Islands::Tag).unwrap();
+        let island_line = fs::read_to_string(&id_map).unwrap().lines().nth(island).unwrap().to_string();
+        let fields: Vec<&str> = island_line.split_whitespace().collect();
+        assert!(fields[1].parse::<usize>().unwrap() >= summary.largest);
+        assert_ne!(fields[2], "0");
+
+        for path in [nodes, edges, new_nodes, new_edges, id_map] {
+            fs::remove_file(path).unwrap();
+        }
+    }
+}
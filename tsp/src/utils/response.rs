@@ -16,3 +16,10 @@ pub struct ErrorResponse {
 pub struct DataResponse<T> {
     pub data: T,
 }
+
+/// One page of a list; `next` is the cursor of the following page, if any.
+#[derive(Serialize, Debug)]
+pub struct PageResponse<T> {
+    pub data: T,
+    pub next: Option<String>,
+}
@@ -0,0 +1,462 @@
+//! Versioned binary container for the road network and derived indexes.
+//!
+//! Layout (all integers little-endian):
+//!
+//! ```text
+//! 0   magic "TSPSNAP\0"
+//! 8   format version (u32)
+//! 12  number of sections (u32)
+//! 16  reserved (u64)
+//! 24  checksum of the header and the section directory (u64)
+//! 32  directory: one 40 byte entry per section
+//!         tag [u8; 8], element size (u32), reserved (u32),
+//!         byte offset (u64), number of elements (u64), payload checksum (u64)
+//! ..  payloads, each aligned to 64 bytes
+//! ```
+//!
+//! Sections are flat arrays that are mapped straight into memory, so opening
+//! a snapshot costs the same regardless of the size of the network.
+
+use crate::{
+    ds::{
+        buffer::{as_bytes, Buffer, Pod},
+        kdtree::KdTree,
+        segment_index::{SegmentIndex, DEFAULT_CELL_SIZE},
+    },
+    utils::{
+        coordinate::Coordinate, create_adjacency_list_from_files,
+        create_id_to_coordinates_hashmap_from_file,
+    },
+};
+use memmap2::Mmap;
+use std::{
+    error::Error,
+    fs::{self, File},
+    io::{BufWriter, Read, Write},
+    mem,
+    sync::Arc,
+};
+
+pub const MAGIC: [u8; 8] = *b"TSPSNAP\0";
+pub const FORMAT_VERSION: u32 = 1;
+
+const HEADER_LEN: usize = 32;
+const ENTRY_LEN: usize = 40;
+const ALIGNMENT: usize = 64;
+
+pub type Tag = [u8; 8];
+
+// Road network sections
+pub const NODE_LATITUDES: Tag = *b"NODE_LAT";
+pub const NODE_LONGITUDES: Tag = *b"NODE_LNG";
+pub const EDGE_OFFSETS: Tag = *b"EDGE_OFF";
+pub const EDGE_TARGETS: Tag = *b"EDGE_TGT";
+pub const EDGE_WEIGHTS: Tag = *b"EDGE_WGT";
+// KD tree arrays in implicit tree order (see `ds::kdtree`). Optional:
+// snapshots written before them build the tree at startup.
+pub const KD_TREE_LATITUDES: Tag = *b"KD_LAT\0\0";
+pub const KD_TREE_LONGITUDES: Tag = *b"KD_LNG\0\0";
+pub const KD_TREE_IDS: Tag = *b"KD_IDS\0\0";
+// Grid over the arcs used for snapping (see `ds::segment_index`). Optional:
+// snapshots written before it build the grid at startup.
+pub const SEGMENT_CELL_SIZE: Tag = *b"SEG_SIZE";
+pub const SEGMENT_CELLS: Tag = *b"SEG_CELL";
+pub const SEGMENT_OFFSETS: Tag = *b"SEG_OFFS";
+pub const SEGMENT_ARCS: Tag = *b"SEG_ARCS";
+
+#[derive(Debug, Clone, Copy)]
+struct SectionEntry {
+    tag: Tag,
+    elem_size: u32,
+    offset: u64,
+    len: u64,
+    checksum: u64,
+}
+
+/// A memory-mapped snapshot file.
+#[derive(Debug)]
+pub struct Snapshot {
+    map: Arc<Mmap>,
+    sections: Vec<SectionEntry>,
+}
+
+impl Snapshot {
+    pub fn open(path: &str) -> Result<Self, Box<dyn Error>> {
+        if cfg!(target_endian = "big") {
+            return Err("Snapshots are only supported on little-endian targets".into());
+        }
+        let file = File::open(path)?;
+        // The file is never written in place (see `write_snapshot`), so the
+        // mapping stays valid for as long as it is alive.
+        let map = unsafe { Mmap::map(&file)? };
+        if map.len() < HEADER_LEN || map[..8] != MAGIC {
+            return Err(format!("{} is not a snapshot file", path).into());
+        }
+        let version = read_u32(&map, 8);
+        if version != FORMAT_VERSION {
+            return Err(format!(
+                "Unsupported snapshot version {} (expected {})",
+                version, FORMAT_VERSION
+            )
+            .into());
+        }
+        let count = read_u32(&map, 12) as usize;
+        let directory_end = HEADER_LEN + count * ENTRY_LEN;
+        if map.len() < directory_end {
+            return Err("Truncated snapshot directory".into());
+        }
+        let mut header = map[..directory_end].to_vec();
+        header[24..32].fill(0);
+        if fnv1a(&header) != read_u64(&map, 24) {
+            return Err("Snapshot header checksum mismatch".into());
+        }
+
+        let mut sections = Vec::with_capacity(count);
+        for i in 0..count {
+            let at = HEADER_LEN + i * ENTRY_LEN;
+            let mut tag = [0u8; 8];
+            tag.copy_from_slice(&map[at..at + 8]);
+            let entry = SectionEntry {
+                tag,
+                elem_size: read_u32(&map, at + 8),
+                offset: read_u64(&map, at + 16),
+                len: read_u64(&map, at + 24),
+                checksum: read_u64(&map, at + 32),
+            };
+            let end = entry.offset + entry.len * entry.elem_size as u64;
+            if end > map.len() as u64 {
+                return Err("Snapshot section is out of bounds".into());
+            }
+            sections.push(entry);
+        }
+
+        Ok(Self {
+            map: Arc::new(map),
+            sections,
+        })
+    }
+
+    /// Checks the magic bytes without mapping the whole file.
+    pub fn is_snapshot(path: &str) -> bool {
+        let mut magic = [0u8; 8];
+        match File::open(path) {
+            Ok(mut file) => file.read_exact(&mut magic).is_ok() && magic == MAGIC,
+            Err(_) => false,
+        }
+    }
+
+    pub fn has_section(&self, tag: &Tag) -> bool {
+        self.sections.iter().any(|s| &s.tag == tag)
+    }
+
+    pub fn section<T: Pod>(&self, tag: &Tag) -> Result<Buffer<T>, Box<dyn Error>> {
+        let entry = self
+            .sections
+            .iter()
+            .find(|s| &s.tag == tag)
+            .ok_or_else(|| format!("Missing snapshot section {}", tag_name(tag)))?;
+        if entry.elem_size as usize != mem::size_of::<T>() {
+            return Err(format!("Unexpected element size in section {}", tag_name(tag)).into());
+        }
+        Buffer::mapped(
+            Arc::clone(&self.map),
+            entry.offset as usize,
+            entry.len as usize,
+        )
+    }
+
+    /// Recomputes every payload checksum. This reads the whole file, so it is
+    /// meant for conversion tools rather than for server startup.
+    pub fn verify(&self) -> Result<(), Box<dyn Error>> {
+        for entry in &self.sections {
+            let start = entry.offset as usize;
+            let end = start + (entry.len * entry.elem_size as u64) as usize;
+            if fnv1a(&self.map[start..end]) != entry.checksum {
+                return Err(format!("Checksum mismatch in section {}", tag_name(&entry.tag)).into());
+            }
+        }
+        Ok(())
+    }
+}
+
+/// One array to be written into a snapshot.
+pub struct Section<'a> {
+    pub tag: Tag,
+    pub elem_size: usize,
+    pub bytes: &'a [u8],
+}
+
+impl<'a> Section<'a> {
+    pub fn new<T: Pod>(tag: Tag, data: &'a [T]) -> Self {
+        Self {
+            tag,
+            elem_size: mem::size_of::<T>(),
+            bytes: as_bytes(data),
+        }
+    }
+}
+
+/// Writes the sections to `path`. The data goes to a temporary file that is
+/// renamed over the destination, so processes that still map the previous
+/// snapshot keep reading consistent pages.
+pub fn write_snapshot(path: &str, sections: &[Section]) -> Result<(), Box<dyn Error>> {
+    if cfg!(target_endian = "big") {
+        return Err("Snapshots are only supported on little-endian targets".into());
+    }
+    let mut header = Vec::with_capacity(HEADER_LEN + sections.len() * ENTRY_LEN);
+    header.extend_from_slice(&MAGIC);
+    header.extend_from_slice(&FORMAT_VERSION.to_le_bytes());
+    header.extend_from_slice(&(sections.len() as u32).to_le_bytes());
+    header.extend_from_slice(&0u64.to_le_bytes());
+    header.extend_from_slice(&0u64.to_le_bytes());
+
+    let mut offset = align(HEADER_LEN + sections.len() * ENTRY_LEN);
+    for section in sections {
+        header.extend_from_slice(&section.tag);
+        header.extend_from_slice(&(section.elem_size as u32).to_le_bytes());
+        header.extend_from_slice(&0u32.to_le_bytes());
+        header.extend_from_slice(&(offset as u64).to_le_bytes());
+        header.extend_from_slice(&((section.bytes.len() / section.elem_size) as u64).to_le_bytes());
+        header.extend_from_slice(&fnv1a(section.bytes).to_le_bytes());
+        offset = align(offset + section.bytes.len());
+    }
+    let checksum = fnv1a(&header);
+    header[24..32].copy_from_slice(&checksum.to_le_bytes());
+
+    let tmp_path = format!("{}.tmp", path);
+    {
+        let mut out = BufWriter::new(File::create(&tmp_path)?);
+        out.write_all(&header)?;
+        let mut written = header.len();
+        for section in sections {
+            let padding = align(written) - written;
+            out.write_all(&vec![0u8; padding])?;
+            out.write_all(section.bytes)?;
+            written += padding + section.bytes.len();
+        }
+        out.flush()?;
+        out.get_ref().sync_all()?;
+    }
+    fs::rename(&tmp_path, path)?;
+    Ok(())
+}
+
+#[derive(Debug)]
+pub struct ConversionSummary {
+    pub nodes: usize,
+    pub edges: usize,
+}
+
+/// Converts the `nodes.txt`/`edges.txt` pair into a road network snapshot:
+/// coordinates, the adjacency list in CSR form, the kd-tree point order and
+/// the segment grid.
+pub fn convert_text_files(
+    coordinates_file: &str,
+    arcs_file: &str,
+    output: &str,
+) -> Result<ConversionSummary, Box<dyn Error>> {
+    let coordinates = create_id_to_coordinates_hashmap_from_file(coordinates_file)?;
+    let graph =
+        create_adjacency_list_from_files(&coordinates_file.to_string(), &arcs_file.to_string())?;
+    graph.validate()?;
+    if coordinates.len() != graph.num_nodes() {
+        return Err("Node ids in the coordinates file are not contiguous".into());
+    }
+    let lat = coordinates.latitudes();
+    let lng = coordinates.longitudes();
+
+    let points = (0..graph.num_nodes())
+        .filter(|&id| !lat[id].is_nan())
+        .map(|id| Coordinate {
+            lat: lat[id],
+            lng: lng[id],
+            id,
+        })
+        .collect();
+    let kd_tree = KdTree::new(points);
+    let segments = SegmentIndex::build(&graph, &coordinates, DEFAULT_CELL_SIZE);
+
+    write_snapshot(
+        output,
+        &[
+            Section::new(NODE_LATITUDES, lat),
+            Section::new(NODE_LONGITUDES, lng),
+            Section::new(EDGE_OFFSETS, graph.offsets()),
+            Section::new(EDGE_TARGETS, graph.targets()),
+            Section::new(EDGE_WEIGHTS, graph.weights()),
+            Section::new(KD_TREE_LATITUDES, kd_tree.latitudes()),
+            Section::new(KD_TREE_LONGITUDES, kd_tree.longitudes()),
+            Section::new(KD_TREE_IDS, kd_tree.ids()),
+            Section::new(SEGMENT_CELL_SIZE, &[segments.cell_size()]),
+            Section::new(SEGMENT_CELLS, segments.cells()),
+            Section::new(SEGMENT_OFFSETS, segments.offsets()),
+            Section::new(SEGMENT_ARCS, segments.arcs()),
+        ],
+    )?;
+
+    Ok(ConversionSummary {
+        nodes: graph.num_nodes(),
+        edges: graph.num_edges(),
+    })
+}
+
+fn align(offset: usize) -> usize {
+    (offset + ALIGNMENT - 1) / ALIGNMENT * ALIGNMENT
+}
+
+fn read_u32(bytes: &[u8], at: usize) -> u32 {
+    u32::from_le_bytes(bytes[at..at + 4].try_into().unwrap())
+}
+
+fn read_u64(bytes: &[u8], at: usize) -> u64 {
+    u64::from_le_bytes(bytes[at..at + 8].try_into().unwrap())
+}
+
+fn tag_name(tag: &Tag) -> String {
+    String::from_utf8_lossy(tag).trim_end_matches('\0').to_string()
+}
+
+// 64 bit FNV-1a
+fn fnv1a(bytes: &[u8]) -> u64 {
+    let mut hash: u64 = 0xcbf29ce484222325;
+    for &b in bytes {
+        hash ^= b as u64;
+        hash = hash.wrapping_mul(0x100000001b3);
+    }
+    hash
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use std::env;
+
+    fn temp_path(name: &str) -> String {
+        env::temp_dir()
+            .join(format!("tsp-{}-{}", std::process::id(), name))
+            .to_string_lossy()
+            .to_string()
+    }
+
+    #[test]
+    fn test_snapshot_round_trip() {
+        let path = temp_path("round-trip.snap");
+        let offsets: Vec<u32> = vec![0, 2, 3];
+        let weights: Vec<f32> = vec![1.5, 2.5, 3.5];
+        write_snapshot(
+            &path,
+            &[
+                Section::new(EDGE_OFFSETS, &offsets),
+                Section::new(EDGE_WEIGHTS, &weights),
+            ],
+        )
+        .unwrap();
+
+        assert!(Snapshot::is_snapshot(&path));
+        let snapshot = Snapshot::open(&path).unwrap();
+        snapshot.verify().unwrap();
+        assert_eq!(&*snapshot.section::<u32>(&EDGE_OFFSETS).unwrap(), &offsets[..]);
+        assert_eq!(&*snapshot.section::<f32>(&EDGE_WEIGHTS).unwrap(), &weights[..]);
+        assert!(snapshot.section::<f64>(&EDGE_WEIGHTS).is_err());
+        assert!(!snapshot.has_section(&NODE_LATITUDES));
+        fs::remove_file(&path).unwrap();
+    }
+
+    #[test]
+    fn test_snapshot_rejects_corrupted_header() {
+        let path = temp_path("corrupted.snap");
+        let data: Vec<u64> = vec![7, 8, 9];
+        write_snapshot(&path, &[Section::new(KD_TREE_IDS, &data)]).unwrap();
+        let mut bytes = fs::read(&path).unwrap();
+        bytes[HEADER_LEN + 16] ^= 0xff;
+        fs::write(&path, bytes).unwrap();
+        assert!(Snapshot::open(&path).is_err());
+        fs::remove_file(&path).unwrap();
+    }
+
+    #[test]
+    fn test_convert_text_files() {
+        let nodes = temp_path("nodes.txt");
+        let edges = temp_path("edges.txt");
+        let output = temp_path("converted.snap");
+        fs::write(&nodes, "0 4.60 -74.08\n1 4.61 -74.07\n2 4.62 -74.06\n").unwrap();
+        fs::write(&edges, "1 2 3.0\n0 1 1.0\n0 2 5.0\n").unwrap();
+
+        let summary = convert_text_files(&nodes, &edges, &output).unwrap();
+        assert_eq!(summary.nodes, 3);
+        assert_eq!(summary.edges, 3);
+
+        let snapshot = Snapshot::open(&output).unwrap();
+        snapshot.verify().unwrap();
+        assert_eq!(&*snapshot.section::<u32>(&EDGE_OFFSETS).unwrap(), &[0, 2, 3, 3]);
+        assert_eq!(&*snapshot.section::<u32>(&EDGE_TARGETS).unwrap(), &[1, 2, 2]);
+        assert_eq!(&*snapshot.section::<f32>(&EDGE_WEIGHTS).unwrap(), &[1.0, 5.0, 3.0]);
+        assert_eq!(snapshot.section::<u32>(&KD_TREE_IDS).unwrap().len(), 3);
+        assert!(!snapshot.section::<u32>(&SEGMENT_ARCS).unwrap().is_empty());
+        for path in [nodes, edges, output] {
+            fs::remove_file(path).unwrap();
+        }
+    }
+
+    #[test]
+    fn test_snapshot_without_kd_tree_still_loads() {
+        // the layout written before the flat KD tree: coordinates, arcs and
+        // the old KD_ORDER section, which is now ignored
+        let path = temp_path("old-layout.snap");
+        let lat: Vec<f64> = vec![4.60, 4.61, 4.62];
+        let lng: Vec<f64> = vec![-74.08, -74.07, -74.06];
+        write_snapshot(
+            &path,
+            &[
+                Section::new(NODE_LATITUDES, &lat),
+                Section::new(NODE_LONGITUDES, &lng),
+                Section::new(*b"KD_ORDER", &[2u32, 0, 1]),
+            ],
+        )
+        .unwrap();
+
+        let tree = crate::utils::create_kd_tree_from_snapshot(&Snapshot::open(&path).unwrap()).unwrap();
+        assert_eq!(tree.nearest(4.611, -74.069), Some(1));
+        fs::remove_file(&path).unwrap();
+    }
+
+    #[test]
+    fn test_snapshot_without_segment_grid_still_loads() {
+        let (nodes, edges) = (temp_path("grid-nodes.txt"), temp_path("grid-edges.txt"));
+        let (output, old) = (temp_path("grid.snap"), temp_path("no-grid.snap"));
+        fs::write(&nodes, "0 4.60 -74.08\n1 4.61 -74.07\n2 4.62 -74.06\n").unwrap();
+        fs::write(&edges, "1 2 3.0\n0 1 1.0\n").unwrap();
+        convert_text_files(&nodes, &edges, &output).unwrap();
+
+        // the same snapshot without the SEG_* sections
+        let snapshot = Snapshot::open(&output).unwrap();
+        let lat = snapshot.section::<f64>(&NODE_LATITUDES).unwrap();
+        let lng = snapshot.section::<f64>(&NODE_LONGITUDES).unwrap();
+        let offsets = snapshot.section::<u32>(&EDGE_OFFSETS).unwrap();
+        let targets = snapshot.section::<u32>(&EDGE_TARGETS).unwrap();
+        let weights = snapshot.section::<f32>(&EDGE_WEIGHTS).unwrap();
+        write_snapshot(
+            &old,
+            &[
+                Section::new(NODE_LATITUDES, &lat),
+                Section::new(NODE_LONGITUDES, &lng),
+                Section::new(EDGE_OFFSETS, &offsets),
+                Section::new(EDGE_TARGETS, &targets),
+                Section::new(EDGE_WEIGHTS, &weights),
+            ],
+        )
+        .unwrap();
+
+        let load = |path: &str| {
+            let snapshot = Snapshot::open(path).unwrap();
+            let graph = crate::utils::create_adjacency_list_from_snapshot(&snapshot).unwrap();
+            let coordinates = crate::utils::create_coordinate_table_from_snapshot(&snapshot).unwrap();
+            let index = crate::utils::create_segment_index_from_snapshot(&snapshot, &graph, &coordinates).unwrap();
+            (index.cells().to_vec(), index.arcs().to_vec())
+        };
+        assert_eq!(load(&old), load(&output));
+        for path in [nodes, edges, output, old] {
+            fs::remove_file(path).unwrap();
+        }
+    }
+}
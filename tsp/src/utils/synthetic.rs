@@ -0,0 +1,193 @@
+//! Deterministic synthetic road networks for benchmarks and tests.
+//!
+//! Both generators place nodes around Bogotá with about 100 m between
+//! neighbours and weight every arc with its straight-line length in meters
+//! times a detour factor of at least 1, so the haversine heuristic stays
+//! admissible. The same seed always gives the same network.
+
+use crate::ds::{coordinates::CoordinateTable, graph::{Graph, GraphBuilder}, kdtree::KdTree};
+use crate::utils::coordinate::Coordinate;
+use geoutils::Location;
+use rand::{rngs::StdRng, Rng, SeedableRng};
+use std::{
+    error::Error,
+    fs::File,
+    io::{BufWriter, Write},
+};
+
+const ORIGIN: (f64, f64) = (4.60, -74.10);
+const SPACING_METERS: f64 = 100.0;
+const METERS_PER_DEGREE: f64 = 111_320.0;
+// Arcs are up to this much longer than the straight line
+const MAX_DETOUR: f64 = 1.3;
+// Neighbours each node of a geometric network is joined to
+const GEOMETRIC_DEGREE: usize = 4;
+
+pub struct SyntheticNetwork {
+    pub graph: Graph,
+    pub coordinates: Vec<Coordinate>,
+}
+
+impl SyntheticNetwork {
+    /// City-like lattice of `rows` x `cols` jittered intersections. Streets
+    /// are two-way except every fourth one, which is one-way in alternating
+    /// directions.
+    pub fn grid(rows: usize, cols: usize, seed: u64) -> Self {
+        let mut rng = StdRng::seed_from_u64(seed);
+        let coordinates: Vec<Coordinate> = (0..rows * cols)
+            .map(|id| {
+                let jitter = SPACING_METERS / 5.0;
+                let north = (id / cols) as f64 * SPACING_METERS + rng.gen_range(-jitter..jitter);
+                let east = (id % cols) as f64 * SPACING_METERS + rng.gen_range(-jitter..jitter);
+                offset(id, north, east)
+            })
+            .collect();
+
+        let mut builder = GraphBuilder::new(coordinates.len());
+        let connect = |builder: &mut GraphBuilder, rng: &mut StdRng, u: usize, v: usize, one_way: Option<bool>| {
+            let w = length(&coordinates[u], &coordinates[v]) * rng.gen_range(1.0..MAX_DETOUR);
+            match one_way {
+                Some(true) => builder.add_edge(u, v, w),
+                Some(false) => builder.add_edge(v, u, w),
+                None => {
+                    builder.add_edge(u, v, w);
+                    builder.add_edge(v, u, w);
+                }
+            }
+        };
+        for r in 0..rows {
+            for c in 0..cols {
+                let u = r * cols + c;
+                if c + 1 < cols {
+                    let one_way = (r % 4 == 3).then_some(r % 8 == 3);
+                    connect(&mut builder, &mut rng, u, u + 1, one_way);
+                }
+                if r + 1 < rows {
+                    let one_way = (c % 4 == 3).then_some(c % 8 == 3);
+                    connect(&mut builder, &mut rng, u, u + cols, one_way);
+                }
+            }
+        }
+        Self {
+            graph: builder.build(),
+            coordinates,
+        }
+    }
+
+    /// `nodes` points scattered uniformly over a square, each joined both
+    /// ways to its nearest neighbours, like the irregular streets of older
+    /// neighbourhoods.
+    pub fn geometric(nodes: usize, seed: u64) -> Self {
+        let mut rng = StdRng::seed_from_u64(seed);
+        let side = (nodes as f64).sqrt() * SPACING_METERS;
+        let coordinates: Vec<Coordinate> = (0..nodes)
+            .map(|id| offset(id, rng.gen_range(0.0..side), rng.gen_range(0.0..side)))
+            .collect();
+
+        // neighbourhoods are not symmetric; every pair is joined once
+        let tree = KdTree::new(coordinates.clone());
+        let mut pairs = vec![];
+        for (u, c) in coordinates.iter().enumerate() {
+            for v in tree.k_nearest(c.lat, c.lng, GEOMETRIC_DEGREE + 1) {
+                if v != u {
+                    pairs.push((u.min(v), u.max(v)));
+                }
+            }
+        }
+        pairs.sort_unstable();
+        pairs.dedup();
+
+        let mut builder = GraphBuilder::new(nodes);
+        for (u, v) in pairs {
+            let w = length(&coordinates[u], &coordinates[v]) * rng.gen_range(1.0..MAX_DETOUR);
+            builder.add_edge(u, v, w);
+            builder.add_edge(v, u, w);
+        }
+        Self {
+            graph: builder.build(),
+            coordinates,
+        }
+    }
+
+    pub fn coordinate_table(&self) -> CoordinateTable {
+        CoordinateTable::from(self.coordinates.clone())
+    }
+
+    /// Writes the network in the `nodes.txt` / `edges.txt` text format.
+    pub fn write_text_files(&self, coordinates_file: &str, arcs_file: &str) -> Result<(), Box<dyn Error>> {
+        let mut nodes = BufWriter::new(File::create(coordinates_file)?);
+        for c in &self.coordinates {
+            writeln!(nodes, "{} {} {}", c.id, c.lat, c.lng)?;
+        }
+        nodes.flush()?;
+
+        let mut arcs = BufWriter::new(File::create(arcs_file)?);
+        for u in 0..self.graph.num_nodes() {
+            for (v, w) in self.graph.neighbours(u) {
+                writeln!(arcs, "{} {} {}", u, v, w)?;
+            }
+        }
+        arcs.flush()?;
+        Ok(())
+    }
+}
+
+fn offset(id: usize, north: f64, east: f64) -> Coordinate {
+    Coordinate {
+        lat: ORIGIN.0 + north / METERS_PER_DEGREE,
+        lng: ORIGIN.1 + east / (METERS_PER_DEGREE * ORIGIN.0.to_radians().cos()),
+        id,
+    }
+}
+
+fn length(a: &Coordinate, b: &Coordinate) -> f64 {
+    Location::new(a.lat, a.lng)
+        .haversine_distance_to(&Location::new(b.lat, b.lng))
+        .meters()
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::algo::shortest_paths::{astar, dijkstra, harvesine_heuristic};
+    use crate::utils::{create_adjacency_list_from_files, create_id_to_coordinates_hashmap_from_file};
+    use std::{env, fs};
+
+    #[test]
+    fn test_grid_network() {
+        let net = SyntheticNetwork::grid(10, 12, 1);
+        assert_eq!(net.graph.num_nodes(), 120);
+        net.graph.validate().unwrap();
+        // the same seed gives the same network
+        let again = SyntheticNetwork::grid(10, 12, 1);
+        assert_eq!(net.graph.targets(), again.graph.targets());
+        assert_eq!(net.graph.weights(), again.graph.weights());
+
+        // every intersection reaches every other, and A* stays exact
+        let map = net.coordinate_table();
+        for dest in (0..120).step_by(7) {
+            let (expected, _) = dijkstra(&net.graph, 0, dest).unwrap();
+            let (distance, _) = astar(&net.graph, &map, 0, dest, &harvesine_heuristic).unwrap();
+            assert!((distance - expected).abs() < 1e-6);
+        }
+    }
+
+    #[test]
+    fn test_geometric_network_text_files() {
+        let net = SyntheticNetwork::geometric(300, 4);
+        assert_eq!(net.graph.num_nodes(), 300);
+        assert!(net.graph.num_edges() >= 300 * GEOMETRIC_DEGREE);
+
+        let dir = env::temp_dir();
+        let nodes = dir.join(format!("tsp-{}-synthetic-nodes.txt", std::process::id()));
+        let arcs = dir.join(format!("tsp-{}-synthetic-arcs.txt", std::process::id()));
+        let (nodes, arcs) = (nodes.to_string_lossy().to_string(), arcs.to_string_lossy().to_string());
+        net.write_text_files(&nodes, &arcs).unwrap();
+        let graph = create_adjacency_list_from_files(&nodes, &arcs).unwrap();
+        let map = create_id_to_coordinates_hashmap_from_file(&nodes).unwrap();
+        assert_eq!(graph.num_edges(), net.graph.num_edges());
+        assert_eq!(map.get(17).unwrap().lat, net.coordinates[17].lat);
+        fs::remove_file(&nodes).unwrap();
+        fs::remove_file(&arcs).unwrap();
+    }
+}
@@ -0,0 +1,212 @@
+//! Request-scoped traces: the timed stages of one request and a few counters
+//! about its work, for the `Server-Timing` header and the slow request log.
+//!
+//! A trace is made current on a thread with `scope`. Anything timed with
+//! `METRICS.time` while it is current becomes one of its spans. Parallel
+//! work on other threads has to be scoped to the same trace explicitly.
+//! With no current trace, recording is a thread-local read.
+
+use serde::Serialize;
+use std::{
+    cell::RefCell,
+    fmt::Write,
+    sync::{Arc, Mutex},
+    time::{Duration, Instant},
+};
+
+#[derive(Serialize, Debug, Clone, PartialEq)]
+pub struct Span {
+    pub name: &'static str,
+    /// Microseconds since the request arrived.
+    pub start_us: u64,
+    pub duration_us: u64,
+}
+
+struct TraceInner {
+    start: Instant,
+    // request-scoped, so only the request's own parallel legs contend
+    spans: Mutex<Vec<Span>>,
+    counters: Mutex<Vec<(&'static str, u64)>>,
+}
+
+/// Shared handle to the trace of one request.
+#[derive(Clone)]
+pub struct Trace(Arc<TraceInner>);
+
+impl Trace {
+    pub fn new() -> Self {
+        Self::starting_at(Instant::now())
+    }
+
+    pub fn starting_at(start: Instant) -> Self {
+        Trace(Arc::new(TraceInner {
+            start,
+            spans: Mutex::new(vec![]),
+            counters: Mutex::new(vec![]),
+        }))
+    }
+
+    pub fn elapsed(&self) -> Duration {
+        self.0.start.elapsed()
+    }
+
+    pub fn record(&self, name: &'static str, start: Instant, duration: Duration) {
+        let span = Span {
+            name,
+            start_us: start.saturating_duration_since(self.0.start).as_micros() as u64,
+            duration_us: duration.as_micros() as u64,
+        };
+        self.0.spans.lock().unwrap().push(span);
+    }
+
+    /// Adds `delta` to the counter `name`, e.g. nodes settled.
+    pub fn add(&self, name: &'static str, delta: u64) {
+        let mut counters = self.0.counters.lock().unwrap();
+        match counters.iter_mut().find(|(counter, _)| *counter == name) {
+            Some((_, value)) => *value += delta,
+            None => counters.push((name, delta)),
+        }
+    }
+
+    /// Spans in the order they started.
+    pub fn spans(&self) -> Vec<Span> {
+        let mut spans = self.0.spans.lock().unwrap().clone();
+        spans.sort_by_key(|span| span.start_us);
+        spans
+    }
+
+    pub fn counters(&self) -> Vec<(&'static str, u64)> {
+        self.0.counters.lock().unwrap().clone()
+    }
+
+    /// `Server-Timing` value: the total time of each span name, in order of
+    /// first appearance, then the whole request as `total`. Names that ran
+    /// more than once, like the route searches of parallel legs, say how
+    /// many times; their total can exceed the wall time.
+    pub fn server_timing(&self, total: Duration) -> String {
+        let mut stages: Vec<(&'static str, u64, usize)> = vec![];
+        for span in self.spans() {
+            match stages.iter_mut().find(|(name, _, _)| *name == span.name) {
+                Some((_, duration, count)) => {
+                    *duration += span.duration_us;
+                    *count += 1;
+                }
+                None => stages.push((span.name, span.duration_us, 1)),
+            }
+        }
+        let mut value = String::new();
+        for (name, duration, count) in stages {
+            let _ = write!(value, "{};dur={:.3}", name, duration as f64 / 1000.0);
+            if count > 1 {
+                let _ = write!(value, ";desc=\"x{}\"", count);
+            }
+            value.push_str(", ");
+        }
+        let _ = write!(value, "total;dur={:.3}", total.as_secs_f64() * 1000.0);
+        value
+    }
+}
+
+impl Default for Trace {
+    fn default() -> Self {
+        Self::new()
+    }
+}
+
+thread_local! {
+    static CURRENT: RefCell<Option<Trace>> = RefCell::new(None);
+}
+
+// Restores the previous current trace, even if the scoped code panicked.
+struct Restore(Option<Trace>);
+
+impl Drop for Restore {
+    fn drop(&mut self) {
+        let previous = self.0.take();
+        CURRENT.with(|current| *current.borrow_mut() = previous);
+    }
+}
+
+/// Runs `f` with `trace` as the current trace of this thread.
+pub fn scope<R>(trace: Option<Trace>, f: impl FnOnce() -> R) -> R {
+    let previous = CURRENT.with(|current| current.replace(trace));
+    let _restore = Restore(previous);
+    f()
+}
+
+/// The current trace, to hand to work on other threads.
+pub fn current() -> Option<Trace> {
+    CURRENT.with(|current| current.borrow().clone())
+}
+
+/// Records a span in the current trace, if any.
+pub fn record(name: &'static str, start: Instant, duration: Duration) {
+    CURRENT.with(|current| {
+        if let Some(trace) = current.borrow().as_ref() {
+            trace.record(name, start, duration);
+        }
+    });
+}
+
+/// Adds to a counter of the current trace, if any.
+pub fn add(name: &'static str, delta: u64) {
+    CURRENT.with(|current| {
+        if let Some(trace) = current.borrow().as_ref() {
+            trace.add(name, delta);
+        }
+    });
+}
+
+/// Runs `f` as a span of the current trace, without metrics.
+pub fn span<R>(name: &'static str, f: impl FnOnce() -> R) -> R {
+    let start = Instant::now();
+    let result = f();
+    record(name, start, start.elapsed());
+    result
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use std::thread;
+
+    #[test]
+    fn test_spans_follow_the_scope() {
+        let trace = Trace::new();
+        span("ignored", || ());
+        scope(Some(trace.clone()), || {
+            span("snap", || thread::sleep(Duration::from_millis(2)));
+            add("settled_nodes", 10);
+            // work on another thread joins explicitly
+            let handle = current();
+            thread::spawn(move || scope(handle, || {
+                span("route_search", || ());
+                add("settled_nodes", 5);
+            }))
+            .join()
+            .unwrap();
+            span("route_search", || ());
+        });
+        span("after", || ());
+        assert!(current().is_none());
+
+        let names: Vec<_> = trace.spans().iter().map(|span| span.name).collect();
+        assert_eq!(names, vec!["snap", "route_search", "route_search"]);
+        assert!(trace.spans()[0].duration_us >= 2000);
+        assert_eq!(trace.counters(), vec![("settled_nodes", 15)]);
+    }
+
+    #[test]
+    fn test_server_timing() {
+        let trace = Trace::new();
+        let start = Instant::now();
+        trace.record("snap", start, Duration::from_micros(1500));
+        trace.record("route_search", start, Duration::from_micros(250));
+        trace.record("route_search", start, Duration::from_micros(250));
+        assert_eq!(
+            trace.server_timing(Duration::from_millis(4)),
+            "snap;dur=1.500, route_search;dur=0.500;desc=\"x2\", total;dur=4.000"
+        );
+        assert_eq!(Trace::new().server_timing(Duration::ZERO), "total;dur=0.000");
+    }
+}
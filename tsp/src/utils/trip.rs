@@ -11,10 +11,23 @@ pub struct Location {
     pub id: usize,
 }
 
+/// Tour solver requested for a trip. `Auto` uses the exact solver while the
+/// trip is small enough for it and local search beyond that.
+#[derive(Deserialize, Serialize, Clone, Copy, Debug, Default, PartialEq)]
+#[serde(crate = "rocket::serde", rename_all = "lowercase")]
+pub enum Solver {
+    #[default]
+    Auto,
+    Exact,
+    Heuristic,
+}
+
 #[derive(Deserialize, Serialize, Debug)]
 #[serde(crate = "rocket::serde")]
 pub struct Trip {
     pub back_to_start: bool,
     pub title: String,
     pub locations: Vec<Location>,
+    #[serde(default)]
+    pub solver: Solver,
 }
\ No newline at end of file